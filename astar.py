@@ -2,6 +2,8 @@
 Module pour le calcul de chemin dans une grille en utilisant l'algorithme A*.
 """
 
+import heapq
+import math
 import numpy as np
 
 
@@ -29,6 +31,29 @@ def calculate_h(x, y, goal_x, goal_y):
     return np.sqrt((x - goal_x)**2 + (y - goal_y)**2)
 
 
+def calculate_h_fast(x, y, goal_x, goal_y):
+    """
+    Calcule la distance heuristique entre deux points sans passer par NumPy.
+
+    Parameters
+    ----------
+    x : int
+        Position x du point actuel.
+    y : int
+        Position y du point actuel.
+    goal_x : int
+        Position x du point de destination.
+    goal_y : int
+        Position y du point de destination.
+
+    Returns
+    -------
+    float
+        La distance heuristique entre les deux points.
+    """
+    return math.hypot(x-goal_x, y-goal_y)
+
+
 class Cell:
     """
     Classe représentant une cellule dans la grille pour l'algorithme A*.
@@ -106,7 +131,7 @@ def get_last_two_cells(cell):
             if cell2 == None:
                 return cell0, cell1
             cell0 = cell0.parent
-    except TypeError:
+    except (TypeError, AttributeError):
         return None
 
 
@@ -161,6 +186,9 @@ def find_path(grid, x1, y1, x2, y2):
     """
     Trouve le chemin optimal entre deux points dans la grille.
 
+    La liste ouverte est un tas binaire, les entrées devenues obsolètes
+    sont ignorées au moment où elles sont retirées du tas.
+
     Parameters
     ----------
     grid : numpy.ndarray
@@ -181,31 +209,1096 @@ def find_path(grid, x1, y1, x2, y2):
     """
 
     closedl = np.zeros((len(grid), len(grid[0])))
-    openl = [Cell(x1, y1, 0, None, None, None, 0)]
+    openl = [(0, 0, Cell(x1, y1, 0, None, None, None, 0))]
     opena = np.full((len(grid), len(grid[0])), float('inf'))
+    counter = 1
 
     while len(openl) > 0:
-        q = openl.pop(find_smallest(openl))
+        f, _, q = heapq.heappop(openl)
+        # Suppression paresseuse : on ignore les entrées périmées du tas
+        if closedl[q.x][q.y] or f > opena[q.x][q.y]:
+            continue
+        # L'arrivée est testée à la sortie du tas pour garantir un chemin optimal
+        if q.x == x2 and q.y == y2:
+            return q
         closedl[q.x][q.y] = True
         nexts = (
             Cell(q.x, q.y-1, q.g+1, x2, y2, q), Cell(q.x+1, q.y, q.g+1, x2, y2, q),
-            Cell(q.x, q.y-1, q.g+1, x2, y2, q), Cell(q.x-1, q.y, q.g+1, x2, y2, q),
+            Cell(q.x, q.y+1, q.g+1, x2, y2, q), Cell(q.x-1, q.y, q.g+1, x2, y2, q),
             Cell(q.x+1, q.y-1, q.g+1.4142135623730951, x2, y2, q), Cell(q.x+1, q.y+1, q.g+1.4142135623730951, x2, y2, q),
             Cell(q.x-1, q.y+1, q.g+1.4142135623730951, x2, y2, q), Cell(q.x-1, q.y-1, q.g+1.4142135623730951, x2, y2, q)
         )
         for cell in nexts:
             #print(cell)
-            if cell.x == x2 and cell.y == y2:
-                return cell
-            if inside(grid, cell.x, cell.y) and not grid[cell.x][cell.y] and not closedl[cell.x][cell.y]:
-                if opena[cell.x][cell.y] == float('inf') or opena[cell.x][cell.y] > cell.f:
+            is_goal = cell.x == x2 and cell.y == y2
+            if inside(grid, cell.x, cell.y) and (not grid[cell.x][cell.y] or is_goal) and not closedl[cell.x][cell.y]:
+                if opena[cell.x][cell.y] > cell.f:
                     #print("b")
                     opena[cell.x][cell.y] = cell.f
-                    openl.append(cell)
+                    heapq.heappush(openl, (cell.f, counter, cell))
+                    counter += 1
             #print("a")
     return False
 
 
+SQRT2 = 1.4142135623730951
+NEIGHBOURS = (
+    (0, -1, 1.0), (1, 0, 1.0), (0, 1, 1.0), (-1, 0, 1.0),
+    (1, -1, SQRT2), (1, 1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2)
+)
+
+
+class GridSearch:
+    """
+    Recherche A* sur une grille de taille fixe, sans objet Cell : les coûts,
+    les parents et l'état fermé de chaque case sont stockés dans des tableaux
+    NumPy alloués une seule fois et réutilisés d'un appel à l'autre.
+    """
+
+    def __init__(self, size_x, size_y):
+        """
+        Alloue les tableaux de recherche pour une grille donnée.
+
+        Les tableaux ont une bordure d'une case considérée comme occupée,
+        ce qui évite de tester les limites de la grille pour chaque voisin.
+
+        Parameters
+        ----------
+        size_x : int
+            Nombre de lignes de la grille.
+        size_y : int
+            Nombre de colonnes de la grille.
+
+        Returns
+        -------
+        None.
+        """
+        self.size_x = size_x
+        self.size_y = size_y
+        self.width = size_y+2
+        self.blocked = np.ones((size_x+2, size_y+2), dtype=bool)
+        self.g = np.full((size_x+2)*(size_y+2), float('inf'))
+        self.parent = np.full((size_x+2)*(size_y+2), -1, dtype=np.int32)
+        self.closed = np.zeros((size_x+2)*(size_y+2), dtype=bool)
+        self.offsets = tuple((dx*self.width + dy, cost) for dx, dy, cost in NEIGHBOURS)
+        # Nombre de cases développées par la dernière recherche
+        self.expanded = 0
+
+    def reset(self, grid):
+        """
+        Réinitialise les tableaux de recherche et copie la grille d'obstacles.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille de la carte.
+
+        Returns
+        -------
+        None.
+        """
+        self.blocked[1:-1, 1:-1] = np.asarray(grid) != 0
+        self.g.fill(float('inf'))
+        self.parent.fill(-1)
+        self.closed.fill(False)
+        self.expanded = 0
+
+    def to_index(self, x, y):
+        """
+        Convertit des coordonnées de la grille en indice dans les tableaux.
+
+        Parameters
+        ----------
+        x : int
+            Coordonnée x.
+        y : int
+            Coordonnée y.
+
+        Returns
+        -------
+        int
+            Indice à plat dans les tableaux avec bordure.
+        """
+        return (x+1)*self.width + (y+1)
+
+    def build_path(self, index):
+        """
+        Reconstruit le chemin en remontant les parents jusqu'au départ.
+
+        Parameters
+        ----------
+        index : int
+            Indice de la case d'arrivée.
+
+        Returns
+        -------
+        numpy.ndarray
+            Tableau d'entiers (n, 2) des cases du chemin, du départ à l'arrivée.
+        """
+        indices = []
+        while index != -1:
+            indices.append(index)
+            index = self.parent[index]
+        indices = np.array(indices[::-1], dtype=np.int32)
+        path = np.empty((len(indices), 2), dtype=np.int32)
+        path[:, 0] = indices//self.width - 1
+        path[:, 1] = indices%self.width - 1
+        return path
+
+    def distance_map(self, grid, x, y):
+        """
+        Calcule la distance de chaque case de la grille jusqu'à un point
+        (algorithme de Dijkstra).
+
+        La case cible est atteignable même si elle est occupée, comme
+        l'arrivée de find_path.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille représentant la carte.
+        x : int
+            Position x du point cible.
+        y : int
+            Position y du point cible.
+
+        Returns
+        -------
+        numpy.ndarray
+            Distances (size_x, size_y), inf pour les cases inatteignables.
+        """
+        self.reset(grid)
+        if not inside(grid, x, y):
+            return np.full((self.size_x, self.size_y), float('inf'))
+        blocked = self.blocked
+        g = self.g
+        closed = self.closed
+        target = self.to_index(x, y)
+        blocked.flat[target] = False
+        g[target] = 0
+        openl = [(0.0, target)]
+
+        while len(openl) > 0:
+            g_index, index = heapq.heappop(openl)
+            if closed[index]:
+                continue
+            closed[index] = True
+            self.expanded += 1
+            for offset, cost in self.offsets:
+                neighbour = index+offset
+                if blocked.flat[neighbour] or closed[neighbour]:
+                    continue
+                new_g = g_index+cost
+                if new_g < g[neighbour]:
+                    g[neighbour] = new_g
+                    heapq.heappush(openl, (new_g, neighbour))
+        return g.reshape(self.size_x+2, self.size_y+2)[1:-1, 1:-1].copy()
+
+    def find_path(self, grid, x1, y1, x2, y2):
+        """
+        Trouve le chemin optimal entre deux points de la grille.
+
+        Comme pour find_path, la case de départ n'est pas testée et la case
+        d'arrivée est atteignable même si elle est occupée.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille représentant la carte.
+        x1 : int
+            Position x du point de départ.
+        y1 : int
+            Position y du point de départ.
+        x2 : int
+            Position x du point de destination.
+        y2 : int
+            Position y du point de destination.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            Tableau d'entiers (n, 2) des cases du chemin, du départ à
+            l'arrivée, ou None si aucun chemin n'existe.
+        """
+        self.reset(grid)
+        if not inside(grid, x1, y1) or not inside(grid, x2, y2):
+            return None
+        blocked = self.blocked
+        g = self.g
+        parent = self.parent
+        closed = self.closed
+        width = self.width
+        start = self.to_index(x1, y1)
+        goal = self.to_index(x2, y2)
+        blocked.flat[goal] = False
+        g[start] = 0
+        openl = [(calculate_h_fast(x1, y1, x2, y2), start)]
+
+        while len(openl) > 0:
+            _, index = heapq.heappop(openl)
+            if closed[index]:
+                continue
+            if index == goal:
+                return self.build_path(index)
+            closed[index] = True
+            self.expanded += 1
+            g_index = g[index]
+            for offset, cost in self.offsets:
+                neighbour = index+offset
+                if blocked.flat[neighbour] or closed[neighbour]:
+                    continue
+                new_g = g_index+cost
+                if new_g < g[neighbour]:
+                    g[neighbour] = new_g
+                    parent[neighbour] = index
+                    h = calculate_h_fast(neighbour//width, neighbour%width, x2+1, y2+1)
+                    heapq.heappush(openl, (new_g+h, neighbour))
+        return None
+
+    def jump(self, index, dx, dy, goal):
+        """
+        Avance en ligne droite depuis une case jusqu'au prochain point de
+        saut : l'arrivée, ou une case ayant un voisin forcé par un obstacle.
+
+        Parameters
+        ----------
+        index : int
+            Indice de la case de départ du saut.
+        dx : int
+            Direction x du saut (-1, 0 ou 1).
+        dy : int
+            Direction y du saut (-1, 0 ou 1).
+        goal : int
+            Indice de la case d'arrivée.
+
+        Returns
+        -------
+        int
+            Indice du point de saut, -1 si le saut bute sur un obstacle.
+        """
+        blocked = self.blocked.flat
+        width = self.width
+        step_x = dx*width
+        while 1:
+            index += step_x+dy
+            if blocked[index]:
+                return -1
+            if index == goal:
+                return index
+            if dx and dy:
+                if (not blocked[index-step_x+dy] and blocked[index-step_x]) or (not blocked[index+step_x-dy] and blocked[index-dy]):
+                    return index
+                if self.jump(index, dx, 0, goal) != -1 or self.jump(index, 0, dy, goal) != -1:
+                    return index
+            elif dx:
+                if (not blocked[index+step_x+1] and blocked[index+1]) or (not blocked[index+step_x-1] and blocked[index-1]):
+                    return index
+            else:
+                if (not blocked[index+width+dy] and blocked[index+width]) or (not blocked[index-width+dy] and blocked[index-width]):
+                    return index
+
+    def jump_directions(self, index):
+        """
+        Renvoie les directions à explorer depuis une case, en élaguant celles
+        qui passent déjà par un chemin au moins aussi court depuis le parent.
+
+        Parameters
+        ----------
+        index : int
+            Indice de la case.
+
+        Returns
+        -------
+        list
+            Liste de directions (dx, dy).
+        """
+        parent = self.parent[index]
+        if parent == -1:
+            return [(dx, dy) for dx, dy, _ in NEIGHBOURS]
+        blocked = self.blocked.flat
+        width = self.width
+        x, y = index//width, index%width
+        dx = int(np.sign(x - parent//width))
+        dy = int(np.sign(y - parent%width))
+        directions = []
+        if dx and dy:
+            directions += [(0, dy), (dx, 0), (dx, dy)]
+            if blocked[index-dx*width]:
+                directions.append((-dx, dy))
+            if blocked[index-dy]:
+                directions.append((dx, -dy))
+        elif dx:
+            directions.append((dx, 0))
+            if blocked[index+1]:
+                directions.append((dx, 1))
+            if blocked[index-1]:
+                directions.append((dx, -1))
+        else:
+            directions.append((0, dy))
+            if blocked[index+width]:
+                directions.append((1, dy))
+            if blocked[index-width]:
+                directions.append((-1, dy))
+        return directions
+
+    def build_jump_path(self, index):
+        """
+        Reconstruit le chemin case par case à partir des points de saut.
+
+        Parameters
+        ----------
+        index : int
+            Indice de la case d'arrivée.
+
+        Returns
+        -------
+        numpy.ndarray
+            Tableau d'entiers (n, 2) des cases du chemin, du départ à l'arrivée.
+        """
+        jump_points = self.build_path(index)
+        path = [jump_points[0]]
+        for point in jump_points[1:]:
+            step = np.sign(point-path[-1])
+            while (path[-1] != point).any():
+                path.append(path[-1]+step)
+        return np.array(path, dtype=np.int32)
+
+    def find_path_jps(self, grid, x1, y1, x2, y2):
+        """
+        Trouve le chemin optimal entre deux points de la grille par Jump
+        Point Search. Le coût du chemin est le même qu'avec find_path, mais
+        les lignes droites sans obstacle sont parcourues sans développer
+        chaque case.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille représentant la carte.
+        x1 : int
+            Position x du point de départ.
+        y1 : int
+            Position y du point de départ.
+        x2 : int
+            Position x du point de destination.
+        y2 : int
+            Position y du point de destination.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            Tableau d'entiers (n, 2) des cases du chemin, du départ à
+            l'arrivée, ou None si aucun chemin n'existe.
+        """
+        self.reset(grid)
+        if not inside(grid, x1, y1) or not inside(grid, x2, y2):
+            return None
+        g = self.g
+        parent = self.parent
+        closed = self.closed
+        width = self.width
+        start = self.to_index(x1, y1)
+        goal = self.to_index(x2, y2)
+        self.blocked.flat[goal] = False
+        g[start] = 0
+        openl = [(calculate_h_fast(x1, y1, x2, y2), start)]
+
+        while len(openl) > 0:
+            _, index = heapq.heappop(openl)
+            if closed[index]:
+                continue
+            if index == goal:
+                return self.build_jump_path(index)
+            closed[index] = True
+            self.expanded += 1
+            x, y = index//width, index%width
+            for dx, dy in self.jump_directions(index):
+                jump_point = self.jump(index, dx, dy, goal)
+                if jump_point == -1 or closed[jump_point]:
+                    continue
+                distance = max(abs(jump_point//width - x), abs(jump_point%width - y))
+                new_g = g[index] + distance*(SQRT2 if dx and dy else 1.0)
+                if new_g < g[jump_point]:
+                    g[jump_point] = new_g
+                    parent[jump_point] = index
+                    h = calculate_h_fast(jump_point//width, jump_point%width, x2+1, y2+1)
+                    heapq.heappush(openl, (new_g+h, jump_point))
+        return None
+
+
+_grid_searches = {}
+
+
+def find_path_array(grid, x1, y1, x2, y2, method="astar"):
+    """
+    Trouve le chemin optimal entre deux points dans la grille, en réutilisant
+    les tableaux d'une GridSearch de même taille.
+
+    Parameters
+    ----------
+    grid : numpy.ndarray
+        Grille représentant la carte.
+    x1 : int
+        Position x du point de départ.
+    y1 : int
+        Position y du point de départ.
+    x2 : int
+        Position x du point de destination.
+    y2 : int
+        Position y du point de destination.
+    method : str, optional
+        "astar" pour A*, "jps" pour Jump Point Search. The default is "astar".
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Tableau d'entiers (n, 2) des cases du chemin, du départ à l'arrivée,
+        ou None si aucun chemin n'existe.
+    """
+    search = get_grid_search(grid)
+    if method == "jps":
+        return search.find_path_jps(grid, x1, y1, x2, y2)
+    return search.find_path(grid, x1, y1, x2, y2)
+
+
+def get_grid_search(grid):
+    """
+    Renvoie la GridSearch partagée pour les grilles de la taille donnée,
+    dont l'attribut expanded donne le nombre de cases développées par la
+    dernière recherche.
+
+    Parameters
+    ----------
+    grid : numpy.ndarray
+        Grille de la carte.
+
+    Returns
+    -------
+    GridSearch
+        La recherche associée à la taille de la grille.
+    """
+    shape = (len(grid), len(grid[0]))
+    if shape not in _grid_searches:
+        _grid_searches[shape] = GridSearch(shape[0], shape[1])
+    return _grid_searches[shape]
+
+
+class FlowField:
+    """
+    Champ de direction vers un point unique, partagé par tous les NPC qui
+    se dirigent vers ce point : chaque case indique le pas à faire pour se
+    rapprocher de la cible.
+    """
+
+    def __init__(self, grid, x, y):
+        """
+        Calcule la carte des distances puis la direction de chaque case.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille représentant la carte.
+        x : int
+            Position x du point cible.
+        y : int
+            Position y du point cible.
+
+        Returns
+        -------
+        None.
+        """
+        shape = (len(grid), len(grid[0]))
+        self.distances = get_grid_search(grid).distance_map(grid, x, y)
+        padded = np.full((shape[0]+2, shape[1]+2), float('inf'))
+        padded[1:-1, 1:-1] = self.distances
+        candidates = np.stack([
+            padded[1+dx:shape[0]+1+dx, 1+dy:shape[1]+1+dy] + cost for dx, dy, cost in NEIGHBOURS
+        ])
+        best = np.argmin(candidates, axis=0)
+        steps = np.array([(dx, dy) for dx, dy, _ in NEIGHBOURS], dtype=np.int32)
+        self.dir_x = steps[best, 0]
+        self.dir_y = steps[best, 1]
+        # Pas de déplacement sur la cible et depuis les cases isolées
+        best_distance = np.min(candidates, axis=0)
+        closer = np.isfinite(best_distance) & (best_distance <= self.distances) & (self.distances > 0)
+        self.dir_x[~closer] = 0
+        self.dir_y[~closer] = 0
+
+    def direction(self, x, y):
+        """
+        Renvoie le pas à faire depuis une case pour se rapprocher de la cible.
+
+        Parameters
+        ----------
+        x : int
+            Position x de la case.
+        y : int
+            Position y de la case.
+
+        Returns
+        -------
+        tuple
+            Pas (dir_x, dir_y) entre -1 et 1, (0, 0) si la cible est
+            inatteignable depuis cette case.
+        """
+        if not inside(self.distances, x, y):
+            return 0, 0
+        return int(self.dir_x[x][y]), int(self.dir_y[x][y])
+
+
+class ConnectivityIndex:
+    """
+    Étiquetage des zones connexes de la grille : deux cases libres de même
+    étiquette sont reliées par un chemin. Permet de savoir sans recherche si
+    une destination est atteignable.
+    """
+
+    def __init__(self, grid):
+        """
+        Étiquette les zones de cases libres reliées par les 8 voisins.
+
+        L'étiquetage est fait en NumPy, sans parcours case par case : chaque
+        case libre prend le plus petit indice parmi elle et ses voisines
+        libres, puis suit l'indice ainsi trouvé (saut de pointeurs), jusqu'à
+        ce que plus rien ne change. Chaque zone finit étiquetée par l'indice
+        de sa première case, et les zones sont numérotées dans cet ordre.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille de la carte.
+
+        Returns
+        -------
+        None.
+        """
+        size_x, size_y = len(grid), len(grid[0])
+        free = np.asarray(grid) == 0
+        cells = size_x*size_y
+        # Indices avec une bordure d'indices hors grille, jamais retenus
+        roots = np.full((size_x+2, size_y+2), cells, dtype=np.int64)
+        roots[1:-1, 1:-1] = np.where(free, np.arange(cells).reshape(size_x, size_y), cells)
+        inner = roots[1:-1, 1:-1]
+        while 1:
+            lowest = inner.copy()
+            for dx, dy, _ in NEIGHBOURS:
+                np.minimum(lowest, roots[1+dx:size_x+1+dx, 1+dy:size_y+1+dy], out=lowest)
+            lowest[~free] = cells
+            # Saut de pointeurs : chaque case suit l'indice de la case qu'elle désigne
+            flat = np.append(lowest.ravel(), cells)
+            lowest = flat[flat[:-1]].reshape(size_x, size_y)
+            if np.array_equal(lowest, inner):
+                break
+            inner[:] = lowest
+        self.labels = np.zeros((size_x, size_y), dtype=np.int32)
+        _, numbers = np.unique(inner[free], return_inverse=True)
+        self.labels[free] = numbers.ravel()+1
+        self.count = int(numbers.max())+1 if len(numbers) > 0 else 0
+
+    def entry_labels(self, x, y):
+        """
+        Renvoie les étiquettes des zones touchant une case : la sienne si elle
+        est libre, celles de ses voisines libres sinon.
+
+        Parameters
+        ----------
+        x : int
+            Position x de la case.
+        y : int
+            Position y de la case.
+
+        Returns
+        -------
+        set
+            Étiquettes des zones touchant la case.
+        """
+        if not inside(self.labels, x, y):
+            return set()
+        if self.labels[x][y]:
+            return {int(self.labels[x][y])}
+        labels = set()
+        for dx, dy, _ in NEIGHBOURS:
+            if inside(self.labels, x+dx, y+dy) and self.labels[x+dx][y+dy]:
+                labels.add(int(self.labels[x+dx][y+dy]))
+        return labels
+
+    def reachable(self, x1, y1, x2, y2):
+        """
+        Vérifie si find_path peut relier deux cases, avec les mêmes règles :
+        la case de départ n'est pas testée et l'arrivée est toujours
+        atteignable depuis une case voisine.
+
+        Parameters
+        ----------
+        x1 : int
+            Position x du point de départ.
+        y1 : int
+            Position y du point de départ.
+        x2 : int
+            Position x du point de destination.
+        y2 : int
+            Position y du point de destination.
+
+        Returns
+        -------
+        bool
+            True si un chemin existe, False sinon.
+        """
+        if max(abs(x1-x2), abs(y1-y2)) <= 1:
+            return inside(self.labels, x2, y2)
+        return len(self.entry_labels(x1, y1) & self.entry_labels(x2, y2)) > 0
+
+    def nearest_reachable(self, x1, y1, x2, y2):
+        """
+        Trouve la case atteignable depuis le départ la plus proche de la
+        destination, pour remplacer une destination inatteignable.
+
+        Parameters
+        ----------
+        x1 : int
+            Position x du point de départ.
+        y1 : int
+            Position y du point de départ.
+        x2 : int
+            Position x du point de destination.
+        y2 : int
+            Position y du point de destination.
+
+        Returns
+        -------
+        tuple or None
+            La case (x, y) de remplacement, None si aucune case n'est
+            atteignable depuis le départ.
+        """
+        if self.reachable(x1, y1, x2, y2):
+            return x2, y2
+        labels = self.entry_labels(x1, y1)
+        if len(labels) == 0:
+            return None
+        mask = np.isin(self.labels, list(labels))
+        xs, ys = np.nonzero(mask)
+        best = np.argmin((xs-x2)**2 + (ys-y2)**2)
+        return int(xs[best]), int(ys[best])
+
+
+def octile_h(x1, y1, x2, y2):
+    """
+    Calcule la distance entre deux points sur une grille à 8 voisins sans
+    obstacle.
+
+    Parameters
+    ----------
+    x1 : int
+        Position x du premier point.
+    y1 : int
+        Position y du premier point.
+    x2 : int
+        Position x du second point.
+    y2 : int
+        Position y du second point.
+
+    Returns
+    -------
+    float
+        La distance entre les deux points.
+    """
+    dx, dy = abs(x1-x2), abs(y1-y2)
+    return max(dx, dy) + (SQRT2-1)*min(dx, dy)
+
+
+class IncrementalPlanner:
+    """
+    Calcul de chemin incrémental (D* Lite) sur la fenêtre de la carte de
+    tuilage.
+
+    La recherche part de l'arrivée, si bien que ses résultats restent valables
+    quand le point de départ se déplace. L'état de la recherche est gardé d'une
+    image à l'autre : quand la fenêtre défile, les valeurs sont décalées avec
+    elle et seules les cases touchées par les lignes et colonnes apparues ou
+    disparues, ou par les obstacles modifiés, sont réparées au lieu de relancer
+    une recherche complète.
+
+    Comme dans GridSearch, les cases sont repérées par leur indice à plat dans
+    des listes avec une bordure d'une case occupée.
+    """
+
+    def __init__(self, size_x, size_y):
+        """
+        Initialise le planificateur pour une fenêtre de taille donnée.
+
+        Parameters
+        ----------
+        size_x : int
+            Nombre de lignes de la fenêtre.
+        size_y : int
+            Nombre de colonnes de la fenêtre.
+
+        Returns
+        -------
+        None.
+        """
+        self.size_x = size_x
+        self.size_y = size_y
+        self.width = size_y+2
+        cells = (size_x+2)*(size_y+2)
+        border = np.ones((size_x+2, size_y+2), dtype=bool)
+        border[1:-1, 1:-1] = False
+        self.border = border.ravel().tolist()
+        self.grid = np.zeros((size_x, size_y), dtype=bool)
+        self.blocked = [True]*cells
+        self.g = [float('inf')]*cells
+        self.rhs = [float('inf')]*cells
+        self.offsets = tuple((dx*self.width + dy, cost) for dx, dy, cost in NEIGHBOURS)
+        self.origin = None
+        self.goal = None
+        self.goal_index = None
+        self.start = None
+        self.start_index = None
+        self.km = 0.0
+        self.openl = []
+        self.queued = {}
+        self.expanded = 0
+
+    def to_index(self, x, y):
+        """
+        Convertit une case du monde en indice dans les listes.
+
+        Parameters
+        ----------
+        x : int
+            Position x de la case dans le monde.
+        y : int
+            Position y de la case dans le monde.
+
+        Returns
+        -------
+        int
+            Indice à plat dans les listes avec bordure.
+        """
+        return (x-self.origin[0]+1)*self.width + (y-self.origin[1]+1)
+
+    def set_grid(self, grid):
+        """
+        Copie la grille de la fenêtre dans la liste des cases occupées,
+        l'arrivée étant toujours atteignable comme dans find_path.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille de la fenêtre.
+
+        Returns
+        -------
+        None.
+        """
+        self.grid[:] = np.asarray(grid) != 0
+        blocked = np.ones((self.size_x+2, self.size_y+2), dtype=bool)
+        blocked[1:-1, 1:-1] = self.grid
+        self.blocked = blocked.ravel().tolist()
+        self.blocked[self.to_index(self.goal[0], self.goal[1])] = False
+
+    def reset(self, grid, origin_x, origin_y, goal_x, goal_y):
+        """
+        Oublie l'état de la recherche et repart d'une nouvelle arrivée.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille de la fenêtre.
+        origin_x : int
+            Position x dans le monde de la case (0, 0) de la fenêtre.
+        origin_y : int
+            Position y dans le monde de la case (0, 0) de la fenêtre.
+        goal_x : int
+            Position x de l'arrivée dans le monde.
+        goal_y : int
+            Position y de l'arrivée dans le monde.
+
+        Returns
+        -------
+        None.
+        """
+        self.origin = (origin_x, origin_y)
+        self.goal = (goal_x, goal_y)
+        self.set_grid(grid)
+        self.g = [float('inf')]*len(self.g)
+        self.rhs = [float('inf')]*len(self.rhs)
+        self.start = None
+        self.start_index = None
+        self.km = 0.0
+        self.queued = {}
+        goal = self.goal_index = self.to_index(goal_x, goal_y)
+        self.rhs[goal] = 0.0
+        self.queued[goal] = (0.0, 0.0)
+        self.openl = [(0.0, 0.0, goal)]
+
+    def in_window(self, x, y):
+        """
+        Vérifie si une case du monde est dans la fenêtre.
+
+        Parameters
+        ----------
+        x : int
+            Position x de la case dans le monde.
+        y : int
+            Position y de la case dans le monde.
+
+        Returns
+        -------
+        bool
+            True si la case est dans la fenêtre, False sinon.
+        """
+        return 0 <= x-self.origin[0] < self.size_x and 0 <= y-self.origin[1] < self.size_y
+
+    def calculate_key(self, index):
+        """
+        Calcule la clé de priorité d'une case.
+
+        Parameters
+        ----------
+        index : int
+            Indice de la case.
+
+        Returns
+        -------
+        tuple
+            Clé (k1, k2) de la case.
+        """
+        g, rhs = self.g[index], self.rhs[index]
+        value = g if g < rhs else rhs
+        if self.start_index == None:
+            return (value, value)
+        dx = abs(index//self.width - self.start_row)
+        dy = abs(index%self.width - self.start_column)
+        if dx < dy:
+            dx, dy = dy, dx
+        return (value + dx + (SQRT2-1)*dy + self.km, value)
+
+    def update_vertex(self, index):
+        """
+        Recalcule la valeur rhs d'une case et la replace dans la file si elle
+        est incohérente.
+
+        Parameters
+        ----------
+        index : int
+            Indice de la case.
+
+        Returns
+        -------
+        None.
+        """
+        g, rhs, blocked = self.g, self.rhs, self.blocked
+        if index != self.goal_index:
+            best = float('inf')
+            for offset, cost in self.offsets:
+                neighbour = index+offset
+                if not blocked[neighbour]:
+                    value = cost + g[neighbour]
+                    if value < best:
+                        best = value
+            rhs[index] = best
+        if g[index] != rhs[index]:
+            key = self.calculate_key(index)
+            self.queued[index] = key
+            heapq.heappush(self.openl, (key[0], key[1], index))
+        else:
+            self.queued.pop(index, None)
+
+    def compute_shortest_path(self):
+        """
+        Développe les cases incohérentes jusqu'à ce que la valeur du départ
+        soit exacte.
+
+        Returns
+        -------
+        None.
+        """
+        g, rhs, openl, queued = self.g, self.rhs, self.openl, self.queued
+        border, blocked, offsets = self.border, self.blocked, self.offsets
+        start, goal = self.start_index, self.goal_index
+        while len(openl) > 0:
+            k1, k2, index = openl[0]
+            if queued.get(index) != (k1, k2):
+                heapq.heappop(openl)
+                continue
+            if (k1, k2) >= self.calculate_key(start) and rhs[start] == g[start]:
+                return
+            heapq.heappop(openl)
+            del queued[index]
+            self.expanded += 1
+            new_key = self.calculate_key(index)
+            if (k1, k2) < new_key:
+                queued[index] = new_key
+                heapq.heappush(openl, (new_key[0], new_key[1], index))
+                continue
+            # Les prédécesseurs d'une case occupée ne passent pas par elle
+            if g[index] > rhs[index]:
+                value = g[index] = rhs[index]
+                if blocked[index]:
+                    continue
+                # La valeur a baissé : il suffit de comparer le passage par
+                # cette case à la valeur rhs de chaque prédécesseur
+                for offset, cost in offsets:
+                    neighbour = index+offset
+                    if border[neighbour] or neighbour == goal or cost+value >= rhs[neighbour]:
+                        continue
+                    rhs[neighbour] = cost+value
+                    if g[neighbour] != rhs[neighbour]:
+                        key = self.calculate_key(neighbour)
+                        queued[neighbour] = key
+                        heapq.heappush(openl, (key[0], key[1], neighbour))
+                    else:
+                        queued.pop(neighbour, None)
+            else:
+                g[index] = float('inf')
+                self.update_vertex(index)
+                if blocked[index]:
+                    continue
+                for offset, _ in offsets:
+                    if not border[index+offset]:
+                        self.update_vertex(index+offset)
+
+    def shift(self, grid, origin_x, origin_y):
+        """
+        Déplace la fenêtre et répare les cases touchées par les lignes et
+        colonnes apparues ou disparues, ainsi que par les obstacles modifiés.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Nouvelle grille de la fenêtre.
+        origin_x : int
+            Nouvelle position x dans le monde de la case (0, 0).
+        origin_y : int
+            Nouvelle position y dans le monde de la case (0, 0).
+
+        Returns
+        -------
+        None.
+        """
+        dx, dy = origin_x-self.origin[0], origin_y-self.origin[1]
+        size_x, size_y, width = self.size_x, self.size_y, self.width
+        new_grid = np.asarray(grid) != 0
+        # Cases (en coordonnées de la nouvelle fenêtre, avec une bordure)
+        # dont le statut a changé : apparues, disparues ou modifiées
+        old_inside = np.zeros((size_x+2, size_y+2), dtype=bool)
+        old_inside[max(0, 1-dx):max(0, min(size_x+2, size_x+1-dx)), max(0, 1-dy):max(0, min(size_y+2, size_y+1-dy))] = True
+        new_inside = np.zeros((size_x+2, size_y+2), dtype=bool)
+        new_inside[1:-1, 1:-1] = True
+        changed = old_inside != new_inside
+        ox0, ox1 = max(0, -dx), min(size_x, size_x-dx)
+        oy0, oy1 = max(0, -dy), min(size_y, size_y-dy)
+        g = [float('inf')]*len(self.g)
+        rhs = [float('inf')]*len(self.rhs)
+        if ox0 < ox1 and oy0 < oy1:
+            # Copie ligne par ligne des valeurs des cases restées dans la fenêtre
+            for i in range(1+ox0, 1+ox1):
+                new, old = i*width, (i+dx)*width + dy
+                g[new+1+oy0:new+1+oy1] = self.g[old+1+oy0:old+1+oy1]
+                rhs[new+1+oy0:new+1+oy1] = self.rhs[old+1+oy0:old+1+oy1]
+            changed[1+ox0:1+ox1, 1+oy0:1+oy1] |= self.grid[ox0+dx:ox1+dx, oy0+dy:oy1+dy] != new_grid[ox0:ox1, oy0:oy1]
+        self.g, self.rhs = g, rhs
+        self.origin = (origin_x, origin_y)
+        self.goal_index = self.to_index(self.goal[0], self.goal[1])
+        if self.start != None:
+            self.start_index = self.to_index(self.start[0], self.start[1])
+            self.start_row, self.start_column = divmod(self.start_index, self.width)
+        self.set_grid(new_grid)
+        # Les entrées de la file suivent la fenêtre, celles qui en sortent
+        # sont oubliées
+        queued = {}
+        for index, key in self.queued.items():
+            i, j = index//width - dx, index%width - dy
+            if 1 <= i <= size_x and 1 <= j <= size_y:
+                queued[i*width + j] = key
+        self.queued = queued
+        self.openl = [(key[0], key[1], index) for index, key in queued.items()]
+        heapq.heapify(self.openl)
+        # Les cases voisines d'un changement, et les cases changées, sont à réparer
+        touched = np.zeros((size_x+2, size_y+2), dtype=bool)
+        touched[1:-1, 1:-1] = changed[1:-1, 1:-1]
+        for ddx, ddy, _ in NEIGHBOURS:
+            touched[1:-1, 1:-1] |= changed[1+ddx:size_x+1+ddx, 1+ddy:size_y+1+ddy]
+        for index in np.flatnonzero(touched).tolist():
+            self.update_vertex(index)
+
+    def update(self, grid, origin_x, origin_y, start_x, start_y, goal_x, goal_y):
+        """
+        Trouve le chemin optimal entre deux cases du monde dans la fenêtre,
+        en réutilisant la recherche précédente quand l'arrivée n'a pas changé.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille de la fenêtre.
+        origin_x : int
+            Position x dans le monde de la case (0, 0) de la fenêtre.
+        origin_y : int
+            Position y dans le monde de la case (0, 0) de la fenêtre.
+        start_x : int
+            Position x du départ dans le monde.
+        start_y : int
+            Position y du départ dans le monde.
+        goal_x : int
+            Position x de l'arrivée dans le monde.
+        goal_y : int
+            Position y de l'arrivée dans le monde.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            Tableau d'entiers (n, 2) des cases du chemin dans la fenêtre, du
+            départ à l'arrivée, ou None si aucun chemin n'existe.
+        """
+        self.expanded = 0
+        if not 0 <= goal_x-origin_x < self.size_x or not 0 <= goal_y-origin_y < self.size_y:
+            self.origin = None
+            return None
+        if self.origin == None or self.goal != (goal_x, goal_y):
+            self.reset(grid, origin_x, origin_y, goal_x, goal_y)
+        elif (origin_x, origin_y) != self.origin or not np.array_equal(self.grid, np.asarray(grid) != 0):
+            self.shift(grid, origin_x, origin_y)
+        if not self.in_window(start_x, start_y):
+            return None
+        if self.start != None:
+            self.km += octile_h(self.start[0], self.start[1], start_x, start_y)
+        self.start = (start_x, start_y)
+        self.start_index = self.to_index(start_x, start_y)
+        self.start_row, self.start_column = divmod(self.start_index, self.width)
+        self.compute_shortest_path()
+        return self.build_path()
+
+    def build_path(self):
+        """
+        Suit les valeurs g depuis le départ pour construire le chemin.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            Tableau d'entiers (n, 2) des cases du chemin dans la fenêtre, du
+            départ à l'arrivée, ou None si aucun chemin n'existe.
+        """
+        g, blocked, width = self.g, self.blocked, self.width
+        index, goal = self.start_index, self.goal_index
+        if self.rhs[index] == float('inf') and index != goal:
+            return None
+        path = [index]
+        while index != goal and len(path) <= self.size_x*self.size_y:
+            best, best_index = float('inf'), -1
+            for offset, cost in self.offsets:
+                neighbour = index+offset
+                if not blocked[neighbour] and cost + g[neighbour] < best:
+                    best, best_index = cost + g[neighbour], neighbour
+            if best_index == -1:
+                return None
+            index = best_index
+            path.append(index)
+        if index != goal:
+            return None
+        indices = np.array(path, dtype=np.int32)
+        return np.stack((indices//width - 1, indices%width - 1), axis=1).astype(np.int32)
+
+
 if __name__ == "__main__":
     # TEST
     grid = np.zeros((5, 4))
@@ -225,3 +1318,4 @@ if __name__ == "__main__":
     """
     #print(grid[2][0])
     print(find_path(grid, 0, 0, 0, 3))
+    print(find_path_array(grid, 0, 0, 0, 3))
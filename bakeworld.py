@@ -0,0 +1,178 @@
+"""
+Module pour le précalcul de l'occupation des cellules de tout le monde.
+
+Le script calcule une fois pour toutes l'occupation des 1248x2352 cellules
+du monde et l'écrit dans un fichier, à raison d'un bit par cellule. Le jeu
+ouvre ensuite ce fichier en mémoire projetée : lire l'occupation d'un bloc
+ne demande plus aucun calcul.
+
+Le monde couvre les cellules 0 <= x < WORLD_WIDTH et -WORLD_HEIGHT < y <= 0.
+La ligne -y du fichier contient les bits des cellules x de la ligne y.
+"""
+
+import argparse
+import struct
+import numpy as np
+import worldmap
+
+
+WORLD_WIDTH = 1248
+WORLD_HEIGHT = 2352
+BAKE_FILE = "map/obstacles.bin"
+# Signature, largeur, hauteur, graine du monde
+HEADER = struct.Struct("<4siiq")
+MAGIC = b"OBST"
+# Nombre de lignes calculées à la fois pendant le précalcul
+BAKE_ROWS = 64
+
+
+def bake(path, seed=worldmap.DEFAULT_SEED, threshhold=worldmap.OBSTACLE_THRESHHOLD):
+    """
+    Calcule l'occupation de tout le monde et l'écrit dans un fichier.
+
+    Parameters
+    ----------
+    path : str
+        Chemin du fichier à écrire.
+    seed : int, optional
+        Graine du monde. The default is worldmap.DEFAULT_SEED.
+    threshhold : float, optional
+        Seuil de probabilité pour générer des obstacles.
+        The default is worldmap.OBSTACLE_THRESHHOLD.
+
+    Returns
+    -------
+    None.
+    """
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, WORLD_WIDTH, WORLD_HEIGHT, seed))
+        for row in range(0, WORLD_HEIGHT, BAKE_ROWS):
+            rows = min(BAKE_ROWS, WORLD_HEIGHT-row)
+            # Cellules y = -row ... -(row+rows-1), dans l'ordre des lignes
+            block = worldmap.obstacle_block(0, -(row+rows-1), WORLD_WIDTH, rows, threshhold, seed)
+            file.write(np.packbits(block[:, ::-1].T, axis=1, bitorder="little").tobytes())
+
+
+class BakedWorld:
+    """
+    Classe pour lire l'occupation précalculée du monde.
+    """
+
+    def __init__(self, path, seed=worldmap.DEFAULT_SEED, threshhold=worldmap.OBSTACLE_THRESHHOLD):
+        """
+        Ouvre un fichier d'occupation précalculée en mémoire projetée.
+
+        Parameters
+        ----------
+        path : str
+            Chemin du fichier.
+        seed : int, optional
+            Graine du monde, pour calculer les cellules hors du monde.
+            The default is worldmap.DEFAULT_SEED.
+        threshhold : float, optional
+            Seuil de probabilité des obstacles hors du monde.
+            The default is worldmap.OBSTACLE_THRESHHOLD.
+
+        Returns
+        -------
+        None.
+        """
+        with open(path, "rb") as file:
+            magic, self.width, self.height, self.seed = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} n'est pas un fichier d'occupation du monde")
+        self.threshhold = threshhold
+        self.bits = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size, shape=(self.height, (self.width+7)//8))
+
+    def block(self, x, y, size_x, size_y):
+        """
+        Renvoie l'occupation d'un bloc de cellules du monde, de même forme
+        que worldmap.obstacle_block. Les cellules hors du monde sont
+        calculées.
+
+        Parameters
+        ----------
+        x : int
+            Position x de la première cellule du bloc.
+        y : int
+            Position y de la première cellule du bloc.
+        size_x : int
+            Largeur du bloc.
+        size_y : int
+            Hauteur du bloc.
+
+        Returns
+        -------
+        numpy.ndarray
+            Tableau booléen (size_x, size_y), vrai pour les cellules occupées.
+        """
+        x0, x1 = max(x, 0), min(x+size_x, self.width)
+        y0, y1 = max(y, 1-self.height), min(y+size_y, 1)
+        if x0 == x and x1 == x+size_x and y0 == y and y1 == y+size_y:
+            block = np.empty((size_x, size_y), dtype=bool)
+        else:
+            block = worldmap.obstacle_block(x, y, size_x, size_y, self.threshhold, self.seed)
+        if x0 >= x1 or y0 >= y1:
+            return block
+        # Lignes -(y1-1) ... -y0, octets contenant les colonnes x0 ... x1-1
+        rows = self.bits[-(y1-1):-y0+1, x0//8:(x1-1)//8+1]
+        cells = np.unpackbits(rows, axis=1, bitorder="little")[:, x0-(x0//8)*8:x1-(x0//8)*8]
+        block[x0-x:x1-x, y0-y:y1-y] = cells.T[:, ::-1] != 0
+        return block
+
+    def is_blocked(self, x, y):
+        """
+        Indique si une cellule du monde est occupée.
+
+        Parameters
+        ----------
+        x : int
+            Position x de la cellule.
+        y : int
+            Position y de la cellule.
+
+        Returns
+        -------
+        bool
+            Vrai si la cellule est occupée.
+        """
+        if 0 <= x < self.width and 1-self.height <= y <= 0:
+            return bool((self.bits[-y][x//8] >> (x % 8)) & 1)
+        return bool(worldmap.obstacle_block(x, y, 1, 1, self.threshhold, self.seed)[0][0])
+
+
+def load_baked_world(path=BAKE_FILE, seed=worldmap.DEFAULT_SEED):
+    """
+    Ouvre le fichier d'occupation précalculée s'il existe et s'il a été
+    calculé avec la même graine.
+
+    Parameters
+    ----------
+    path : str, optional
+        Chemin du fichier. The default is BAKE_FILE.
+    seed : int, optional
+        Graine du monde. The default is worldmap.DEFAULT_SEED.
+
+    Returns
+    -------
+    BakedWorld or None
+        L'occupation précalculée, None si elle n'est pas disponible.
+    """
+    try:
+        baked_world = BakedWorld(path, seed)
+    except (OSError, ValueError, struct.error):
+        return None
+    if baked_world.seed != seed or baked_world.width != WORLD_WIDTH or baked_world.height != WORLD_HEIGHT:
+        return None
+    return baked_world
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="bakeworld")
+
+    parser.add_argument('--seed', type=int, default=worldmap.DEFAULT_SEED)
+    parser.add_argument('--output', type=str, default=BAKE_FILE)
+
+    args = parser.parse_args()
+
+    bake(args.output, args.seed)
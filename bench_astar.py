@@ -0,0 +1,549 @@
+"""
+Module de mesure des performances et de vérification du calcul de chemin.
+
+Chaque solveur est lancé sur des grilles aléatoires de tailles et de densités
+d'obstacles variées ainsi que sur les fenêtres centrées sur les villes. Pour
+chaque cas on relève le temps de calcul, le nombre de cases développées et le
+coût du chemin, et on vérifie que le chemin est valide et optimal en le
+comparant à une recherche de Dijkstra complète. Les résultats sont écrits
+dans un fichier JSON pour suivre les régressions d'une version à l'autre.
+
+Avec --repair, on mesure à la place le cas pour lequel D* Lite est fait : un
+départ qui avance case par case vers une arrivée fixe pendant que la fenêtre
+défile.
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+import astar
+import worldmap
+from city import cities
+
+
+def find_path_linear(grid, x1, y1, x2, y2):
+    """
+    Ancienne version de astar.find_path, avec une liste ouverte parcourue
+    entièrement à chaque itération. Sert de référence pour la comparaison.
+
+    Parameters
+    ----------
+    grid : numpy.ndarray
+        Grille représentant la carte.
+    x1 : int
+        Position x du point de départ.
+    y1 : int
+        Position y du point de départ.
+    x2 : int
+        Position x du point de destination.
+    y2 : int
+        Position y du point de destination.
+
+    Returns
+    -------
+    Cell or bool
+        La cellule représentant le chemin s'il est trouvé, False sinon.
+    """
+    closedl = np.zeros((len(grid), len(grid[0])))
+    openl = [astar.Cell(x1, y1, 0, None, None, None, 0)]
+    opena = np.full((len(grid), len(grid[0])), float('inf'))
+
+    while len(openl) > 0:
+        q = openl.pop(astar.find_smallest(openl))
+        closedl[q.x][q.y] = True
+        nexts = (
+            astar.Cell(q.x, q.y-1, q.g+1, x2, y2, q), astar.Cell(q.x+1, q.y, q.g+1, x2, y2, q),
+            astar.Cell(q.x, q.y-1, q.g+1, x2, y2, q), astar.Cell(q.x-1, q.y, q.g+1, x2, y2, q),
+            astar.Cell(q.x+1, q.y-1, q.g+1.4142135623730951, x2, y2, q), astar.Cell(q.x+1, q.y+1, q.g+1.4142135623730951, x2, y2, q),
+            astar.Cell(q.x-1, q.y+1, q.g+1.4142135623730951, x2, y2, q), astar.Cell(q.x-1, q.y-1, q.g+1.4142135623730951, x2, y2, q)
+        )
+        for cell in nexts:
+            if cell.x == x2 and cell.y == y2:
+                return cell
+            if astar.inside(grid, cell.x, cell.y) and not grid[cell.x][cell.y] and not closedl[cell.x][cell.y]:
+                if opena[cell.x][cell.y] == float('inf') or opena[cell.x][cell.y] > cell.f:
+                    opena[cell.x][cell.y] = cell.f
+                    openl.append(cell)
+    return False
+
+
+def cell_chain_to_array(cell):
+    """
+    Convertit une chaîne de Cell en tableau de cases, du départ à l'arrivée.
+
+    Parameters
+    ----------
+    cell : Cell or bool
+        Dernière cellule du chemin, False si aucun chemin.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Tableau d'entiers (n, 2) des cases du chemin, None si aucun chemin.
+    """
+    if not cell:
+        return None
+    path = []
+    while cell != None:
+        path.append((cell.x, cell.y))
+        cell = cell.parent
+    return np.array(path[::-1], dtype=np.int32)
+
+
+def solve_cells(solver):
+    """
+    Adapte un solveur renvoyant des Cell au format des autres solveurs.
+
+    Parameters
+    ----------
+    solver : function
+        Solveur de même signature que astar.find_path.
+
+    Returns
+    -------
+    function
+        Solveur renvoyant (chemin, cases développées).
+    """
+    def solve(grid, x1, y1, x2, y2):
+        return cell_chain_to_array(solver(grid, x1, y1, x2, y2)), None
+    return solve
+
+
+def solve_array(method):
+    """
+    Adapte find_path_array au format des solveurs du banc d'essai.
+
+    Parameters
+    ----------
+    method : str
+        Méthode de recherche ("astar" ou "jps").
+
+    Returns
+    -------
+    function
+        Solveur renvoyant (chemin, cases développées).
+    """
+    def solve(grid, x1, y1, x2, y2):
+        path = astar.find_path_array(grid, x1, y1, x2, y2, method)
+        return path, astar.get_grid_search(grid).expanded
+    return solve
+
+
+def solve_incremental(grid, x1, y1, x2, y2):
+    """
+    Lance un planificateur incrémental neuf, c'est-à-dire une recherche
+    complète de D* Lite.
+
+    Parameters
+    ----------
+    grid : numpy.ndarray
+        Grille représentant la carte.
+    x1 : int
+        Position x du point de départ.
+    y1 : int
+        Position y du point de départ.
+    x2 : int
+        Position x du point de destination.
+    y2 : int
+        Position y du point de destination.
+
+    Returns
+    -------
+    tuple
+        Chemin (ou None) et nombre de cases développées.
+    """
+    planner = astar.IncrementalPlanner(len(grid), len(grid[0]))
+    path = planner.update(grid, 0, 0, x1, y1, x2, y2)
+    return path, planner.expanded
+
+
+SOLVERS = {
+    "linear": solve_cells(find_path_linear),
+    "heap": solve_cells(astar.find_path),
+    "array": solve_array("astar"),
+    "jps": solve_array("jps"),
+    "dstar": solve_incremental,
+}
+# Solveurs gardés pour comparaison, trop lents pour les grandes grilles et
+# dont les chemins ne sont pas garantis optimaux
+LEGACY_SOLVERS = ("linear",)
+LEGACY_MAX_CELLS = 100*100
+
+
+def path_cost(grid, path, goal):
+    """
+    Vérifie un chemin et calcule son coût.
+
+    Parameters
+    ----------
+    grid : numpy.ndarray
+        Grille représentant la carte.
+    path : numpy.ndarray
+        Tableau (n, 2) des cases du chemin.
+    goal : tuple
+        Case d'arrivée attendue.
+
+    Returns
+    -------
+    float or None
+        Coût du chemin, None s'il n'est pas valide (pas de plus d'une case,
+        case occupée traversée ou mauvaise arrivée).
+    """
+    if tuple(path[-1]) != tuple(goal):
+        return None
+    steps = np.abs(np.diff(path, axis=0))
+    if len(steps) > 0 and steps.max() > 1:
+        return None
+    for x, y in path[1:-1]:
+        if grid[x][y]:
+            return None
+    diagonals = int(np.sum(steps.sum(axis=1) == 2))
+    return (len(steps)-diagonals) + diagonals*astar.SQRT2
+
+
+def reference_cost(grid, x1, y1, x2, y2):
+    """
+    Calcule le coût optimal entre deux cases par une recherche de Dijkstra
+    complète depuis l'arrivée.
+
+    Parameters
+    ----------
+    grid : numpy.ndarray
+        Grille représentant la carte.
+    x1 : int
+        Position x du point de départ.
+    y1 : int
+        Position y du point de départ.
+    x2 : int
+        Position x du point de destination.
+    y2 : int
+        Position y du point de destination.
+
+    Returns
+    -------
+    float
+        Coût optimal, inf si l'arrivée est inatteignable.
+    """
+    if (x1, y1) == (x2, y2):
+        return 0.0
+    distances = astar.get_grid_search(grid).distance_map(grid, x2, y2)
+    # La case de départ n'est pas testée : on peut en sortir même occupée
+    best = float('inf')
+    for dx, dy, cost in astar.NEIGHBOURS:
+        x, y = x1+dx, y1+dy
+        if astar.inside(grid, x, y) and ((x, y) == (x2, y2) or not grid[x][y]):
+            best = min(best, cost+distances[x][y])
+    return best
+
+
+def random_grid(size, density, rng):
+    """
+    Génère une grille d'occupation aléatoire.
+
+    Parameters
+    ----------
+    size : int
+        Taille de la grille (size x size).
+    density : float
+        Proportion de cellules occupées.
+    rng : numpy.random.Generator
+        Générateur aléatoire.
+
+    Returns
+    -------
+    numpy.ndarray
+        Grille d'occupation.
+    """
+    return (rng.random((size, size)) < density).astype(float)
+
+
+def city_grid(city, size):
+    """
+    Génère la fenêtre d'occupation centrée sur une ville.
+
+    Parameters
+    ----------
+    city : City
+        Ville au centre de la fenêtre.
+    size : int
+        Taille de la fenêtre.
+
+    Returns
+    -------
+    numpy.ndarray
+        Grille d'occupation.
+    """
+    x = city.x + len(city.data[0])//2 - size//2
+    y = city.y + len(city.data)//2 - size//2
+    return worldmap.obstacle_block(x, y, size, size).astype(float)
+
+
+def scenarios(sizes, densities, queries, city_size, rng):
+    """
+    Construit les cas de test : grilles aléatoires et fenêtres des villes,
+    avec des couples départ/arrivée tirés au hasard.
+
+    Parameters
+    ----------
+    sizes : list
+        Tailles de grilles aléatoires.
+    densities : list
+        Densités d'obstacles des grilles aléatoires.
+    queries : int
+        Nombre de couples départ/arrivée par grille.
+    city_size : int
+        Taille des fenêtres centrées sur les villes.
+    rng : numpy.random.Generator
+        Générateur aléatoire.
+
+    Returns
+    -------
+    list
+        Liste de (nom, grille, liste de requêtes (x1, y1, x2, y2)).
+    """
+    grids = [(f"random-{size}-{density}", random_grid(size, density, rng)) for size in sizes for density in densities]
+    grids += [(f"city-{city.name}", city_grid(city, city_size)) for city in cities]
+    cases = []
+    for name, grid in grids:
+        size_x, size_y = grid.shape
+        # Toujours une traversée d'un coin à l'autre, puis des requêtes au hasard
+        requests = [(0, 0, size_x-1, size_y-1)]
+        for _ in range(queries-1):
+            requests.append((int(rng.integers(size_x)), int(rng.integers(size_y)), int(rng.integers(size_x)), int(rng.integers(size_y))))
+        cases.append((name, grid, requests))
+    return cases
+
+
+def run(sizes, densities, queries, city_size, repeat, seed, solvers):
+    """
+    Lance les solveurs sur tous les cas de test et vérifie leurs chemins.
+
+    Parameters
+    ----------
+    sizes : list
+        Tailles de grilles aléatoires.
+    densities : list
+        Densités d'obstacles des grilles aléatoires.
+    queries : int
+        Nombre de couples départ/arrivée par grille.
+    city_size : int
+        Taille des fenêtres centrées sur les villes.
+    repeat : int
+        Nombre de répétitions de chaque mesure de temps.
+    seed : int
+        Graine des grilles aléatoires.
+    solvers : list
+        Noms des solveurs à tester.
+
+    Returns
+    -------
+    list
+        Un dictionnaire de résultats par couple (cas, solveur).
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for name, grid, requests in scenarios(sizes, densities, queries, city_size, rng):
+        references = [reference_cost(grid, *request) for request in requests]
+        for solver_name in solvers:
+            if solver_name in LEGACY_SOLVERS and grid.size > LEGACY_MAX_CELLS:
+                continue
+            solver = SOLVERS[solver_name]
+            wall_time = 0.0
+            expanded = 0
+            total_cost = 0.0
+            found = 0
+            invalid = 0
+            suboptimal = 0
+            for request, reference in zip(requests, references):
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    path, request_expanded = solver(grid, *request)
+                wall_time += (time.perf_counter()-start)/repeat
+                if request_expanded == None:
+                    expanded = None
+                elif expanded != None:
+                    expanded += request_expanded
+                if path is None:
+                    if np.isfinite(reference):
+                        invalid += 1
+                    continue
+                cost = path_cost(grid, path, request[2:])
+                if cost == None or not np.isfinite(reference):
+                    invalid += 1
+                    continue
+                found += 1
+                total_cost += cost
+                if cost > reference + 1e-9:
+                    suboptimal += 1
+            results.append({
+                "case": name,
+                "size": list(grid.shape),
+                "density": float(grid.mean()),
+                "solver": solver_name,
+                "queries": len(requests),
+                "found": found,
+                "wall_time": wall_time,
+                "expanded": expanded,
+                "expanded_per_second": expanded/wall_time if expanded else None,
+                "path_cost": total_cost,
+                "invalid": invalid,
+                "suboptimal": suboptimal,
+            })
+    return results
+
+
+def run_repair(densities, window, steps, seed):
+    """
+    Compare, pendant que la fenêtre défile, la réparation de D* Lite et une
+    recherche find_path_array complète. Le départ avance case par case le
+    long du chemin vers une arrivée fixe et la fenêtre le suit d'une case
+    tous les deux pas, comme la carte de tuilage suit la caméra.
+
+    Parameters
+    ----------
+    densities : list
+        Densités d'obstacles des mondes aléatoires.
+    window : int
+        Taille de la fenêtre.
+    steps : int
+        Nombre maximal de pas par cas.
+    seed : int
+        Graine des mondes aléatoires.
+
+    Returns
+    -------
+    list
+        Un dictionnaire de résultats par cas.
+    """
+    rng = np.random.default_rng(seed)
+    worlds = [(f"random-{density}", random_grid(window+steps, density, rng)) for density in densities]
+    worlds += [(f"city-{city.name}", city_grid(city, window+steps)) for city in cities]
+    results = []
+    for name, world in worlds:
+        origin_x, origin_y = 0, steps//2
+        x1, y1 = 1, origin_y+window//2
+        x2, y2 = window-2, origin_y+window//3
+        world[x1][y1] = world[x2][y2] = 0
+        planner = astar.IncrementalPlanner(window, window)
+        first_time = None
+        repair_time = 0.0
+        fresh_time = 0.0
+        repairs = 0
+        shifts = 0
+        mismatches = 0
+        for step in range(steps):
+            grid = world[origin_x:origin_x+window, origin_y:origin_y+window]
+            start = time.perf_counter()
+            repaired = planner.update(grid, origin_x, origin_y, x1, y1, x2, y2)
+            elapsed = time.perf_counter()-start
+            start = time.perf_counter()
+            fresh = astar.find_path_array(grid, x1-origin_x, y1-origin_y, x2-origin_x, y2-origin_y)
+            fresh_elapsed = time.perf_counter()-start
+            if first_time == None:
+                first_time = elapsed
+            else:
+                repair_time += elapsed
+                fresh_time += fresh_elapsed
+                repairs += 1
+            if (repaired is None) != (fresh is None):
+                mismatches += 1
+            if fresh is None or len(fresh) < 2:
+                break
+            if repaired is not None and path_cost(grid, repaired, (x2-origin_x, y2-origin_y)) > path_cost(grid, fresh, (x2-origin_x, y2-origin_y)) + 1e-9:
+                mismatches += 1
+            x1, y1 = int(fresh[1][0])+origin_x, int(fresh[1][1])+origin_y
+            # La fenêtre suit le départ tant que l'arrivée y reste
+            if step % 2 == 1 and x2-origin_x > 1 and x1-origin_x > 1:
+                origin_x += 1
+                shifts += 1
+        if repairs == 0:
+            continue
+        results.append({
+            "case": name,
+            "size": [window, window],
+            "steps": repairs,
+            "shifts": shifts,
+            "first_time": first_time,
+            "repair_time": repair_time/repairs,
+            "fresh_time": fresh_time/repairs,
+            # Nombre de pas après lesquels D* Lite a rattrapé sa première recherche
+            "break_even": first_time/(fresh_time/repairs - repair_time/repairs) if repair_time < fresh_time else None,
+            "mismatches": mismatches,
+        })
+    return results
+
+
+def print_repair_results(results):
+    """
+    Affiche les résultats de run_repair sous forme de tableau.
+
+    Parameters
+    ----------
+    results : list
+        Résultats renvoyés par run_repair.
+
+    Returns
+    -------
+    None.
+    """
+    print(f"{'cas':<24} {'pas':>5} {'défil.':>6} {'1re D* (ms)':>12} {'réparation (ms)':>16} {'complète (ms)':>14} {'rentable après':>15} {'écarts':>7}")
+    for result in results:
+        break_even = f"{result['break_even']:.0f}" if result["break_even"] != None else "-"
+        print(f"{result['case']:<24} {result['steps']:>5} {result['shifts']:>6} {result['first_time']*1000:>12.3f} {result['repair_time']*1000:>16.3f} {result['fresh_time']*1000:>14.3f} {break_even:>15} {result['mismatches']:>7}")
+
+
+def print_results(results):
+    """
+    Affiche les résultats sous forme de tableau.
+
+    Parameters
+    ----------
+    results : list
+        Résultats renvoyés par run.
+
+    Returns
+    -------
+    None.
+    """
+    print(f"{'cas':<24} {'solveur':<8} {'temps (ms)':>11} {'cases':>8} {'cases/s':>10} {'coût':>9} {'invalides':>10} {'sous-opt.':>10}")
+    for result in results:
+        expanded = result["expanded"] if result["expanded"] != None else "-"
+        per_second = f"{result['expanded_per_second']:.0f}" if result["expanded_per_second"] else "-"
+        print(f"{result['case']:<24} {result['solver']:<8} {result['wall_time']*1000:>11.3f} {expanded:>8} {per_second:>10} {result['path_cost']:>9.2f} {result['invalid']:>10} {result['suboptimal']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="bench_astar")
+
+    parser.add_argument('--sizes', type=int, nargs="+", default=[30, 100, 200])
+    parser.add_argument('--densities', type=float, nargs="+", default=[0.0, 0.01, 0.2, 0.4])
+    parser.add_argument('--queries', type=int, default=5)
+    parser.add_argument('--city-size', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--solvers', type=str, nargs="+", default=list(SOLVERS.keys()), choices=list(SOLVERS.keys()))
+    parser.add_argument('--output', type=str, default="bench_astar.json")
+    parser.add_argument('--repair', action="store_true")
+    parser.add_argument('--steps', type=int, default=60)
+
+    args = parser.parse_args()
+
+    if args.repair:
+        results = run_repair(args.densities, args.city_size, args.steps, args.seed)
+        print_repair_results(results)
+        with open(args.output, "w") as file:
+            json.dump({"seed": args.seed, "results": results}, file, indent=4)
+        if sum(result["mismatches"] for result in results) > 0:
+            print("chemins réparés non optimaux")
+            raise SystemExit(1)
+        raise SystemExit(0)
+
+    results = run(args.sizes, args.densities, args.queries, args.city_size, args.repeat, args.seed, args.solvers)
+    print_results(results)
+    with open(args.output, "w") as file:
+        json.dump({"seed": args.seed, "repeat": args.repeat, "results": results}, file, indent=4)
+    failures = sum(result["invalid"]+result["suboptimal"] for result in results if result["solver"] not in LEGACY_SOLVERS)
+    if failures > 0:
+        print(f"{failures} chemins invalides ou non optimaux")
+        raise SystemExit(1)
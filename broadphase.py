@@ -0,0 +1,151 @@
+"""
+Module pour la recherche des cibles touchées par les balles.
+
+Les boîtes des cibles sont rangées, à chaque mise à jour, dans une grille
+uniforme de cellules du monde, les mêmes cellules que celles des obstacles.
+Le trajet d'une balle est parcouru une seule fois : la même traversée
+cherche la première cellule occupée et ramasse les cibles des cellules
+croisées. Les tests segment-boîte de toutes les balles sont ensuite faits en
+une seule passe NumPy.
+"""
+
+import numpy as np
+import gridaddress
+import raycast
+
+
+class TargetGrid:
+    """
+    Classe représentant une grille uniforme de cibles, reconstruite à chaque
+    mise à jour.
+    """
+
+    def __init__(self, boxes):
+        """
+        Range les boîtes des cibles dans les cellules qu'elles recouvrent.
+
+        Parameters
+        ----------
+        boxes : list
+            Boîtes (x, y, largeur, hauteur) des cibles.
+
+        Returns
+        -------
+        None.
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.cells = {}
+        # Nombre de tests segment-boîte effectués
+        self.narrow_tests = 0
+        if len(self.boxes) == 0:
+            return
+        low_x, low_y = gridaddress.world_cell(self.boxes[:, 0], self.boxes[:, 1])
+        high_x, high_y = gridaddress.world_cell(self.boxes[:, 0]+self.boxes[:, 2], self.boxes[:, 1]+self.boxes[:, 3])
+        for index, (x0, y0, x1, y1) in enumerate(zip(low_x.tolist(), low_y.tolist(), high_x.tolist(), high_y.tolist())):
+            for cell_x in range(x0, x1+1):
+                for cell_y in range(y0, y1+1):
+                    self.cells.setdefault((cell_x, cell_y), []).append(index)
+        # Cellules extrêmes occupées, pour ignorer les balles loin de toute cible
+        self.low = (int(low_x.min()), int(low_y.min()))
+        self.high = (int(high_x.max()), int(high_y.max()))
+
+    def near(self, starts, ends):
+        """
+        Indique quelles balles ont un trajet dont la boîte englobante touche
+        des cellules occupées par des cibles.
+
+        Parameters
+        ----------
+        starts : numpy.ndarray
+            Débuts des segments, de forme (n, 2).
+        ends : numpy.ndarray
+            Fins des segments, de forme (n, 2).
+
+        Returns
+        -------
+        numpy.ndarray
+            Tableau booléen, vrai pour les balles qui peuvent toucher une cible.
+        """
+        if len(self.cells) == 0:
+            return np.zeros(len(starts), dtype=bool)
+        low_x, low_y = gridaddress.world_cell(np.minimum(starts[:, 0], ends[:, 0]), np.minimum(starts[:, 1], ends[:, 1]))
+        high_x, high_y = gridaddress.world_cell(np.maximum(starts[:, 0], ends[:, 0]), np.maximum(starts[:, 1], ends[:, 1]))
+        return (low_x <= self.high[0]) & (high_x >= self.low[0]) & (low_y <= self.high[1]) & (high_y >= self.low[1])
+
+    def sweep(self, x1, y1, x2, y2, blocked, near=True):
+        """
+        Parcourt une seule fois les cellules traversées par un segment, jusqu'à
+        la première cellule occupée, en ramassant les cibles des cellules
+        croisées.
+
+        Parameters
+        ----------
+        x1 : float
+            Position x du début du segment.
+        y1 : float
+            Position y du début du segment.
+        x2 : float
+            Position x de la fin du segment.
+        y2 : float
+            Position y de la fin du segment.
+        blocked : function
+            Fonction (cellule x, cellule y) -> bool, vraie pour les cellules
+            occupées.
+        near : bool, optional
+            Si faux, les cibles ne sont pas cherchées. The default is True.
+
+        Returns
+        -------
+        tuple
+            Cellule occupée (None si aucune), paramètre t de son point
+            d'entrée (1.0 si aucune) et liste des indices des cibles candidates.
+        """
+        candidates = []
+        cells = self.cells if near else {}
+        for cell, t in raycast.traverse(x1, y1, x2, y2):
+            found = cells.get(cell)
+            if found != None:
+                candidates.extend(found)
+            if blocked(cell[0], cell[1]):
+                return cell, t, candidates
+        return None, 1.0, candidates
+
+    def hits(self, starts, ends, limits, bullets, candidates):
+        """
+        Fait les tests segment-boîte de toutes les balles avec leurs cibles
+        candidates et garde la première cible touchée par chaque balle.
+
+        Parameters
+        ----------
+        starts : numpy.ndarray
+            Débuts des segments, de forme (n, 2).
+        ends : numpy.ndarray
+            Fins des segments, de forme (n, 2).
+        limits : numpy.ndarray
+            Paramètres t au-delà desquels une cible n'est plus touchée (entrée
+            dans un obstacle), de forme (n,).
+        bullets : numpy.ndarray
+            Indices des balles correspondant aux segments.
+        candidates : list
+            Pour chaque segment, liste des indices des cibles candidates.
+
+        Returns
+        -------
+        list
+            Couples (indice de la balle, indice de la cible).
+        """
+        counts = [len(found) for found in candidates]
+        if sum(counts) == 0:
+            return []
+        rows = np.repeat(np.arange(len(candidates)), counts)
+        targets = np.fromiter((index for found in candidates for index in found), dtype=np.int64, count=len(rows))
+        self.narrow_tests += len(rows)
+        t = raycast.segments_boxes(starts[rows, 0], starts[rows, 1], ends[rows, 0], ends[rows, 1], self.boxes[targets])
+        touched = t <= limits[rows]
+        rows, targets, t = rows[touched], targets[touched], t[touched]
+        # Pour chaque balle, la cible au plus petit t (puis au plus petit indice)
+        order = np.lexsort((targets, t, rows))
+        rows, targets = rows[order], targets[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        return list(zip(bullets[rows[first]].tolist(), targets[first].tolist()))
@@ -0,0 +1,140 @@
+"""
+Module pour la mise en cache des blocs du monde déjà générés.
+
+Le monde est découpé en blocs carrés. Le contenu d'un bloc (valeurs des
+cellules et apparitions des PNJ) est calculé la première fois qu'on le
+demande puis gardé en mémoire. Quand la taille du cache dépasse sa limite,
+les blocs utilisés le moins récemment sont oubliés.
+"""
+
+from collections import OrderedDict
+import numpy as np
+
+
+CHUNK_SIZE = 16
+CHUNK_CACHE_BYTES = 4*1024*1024
+
+
+class ChunkCache:
+    """
+    Classe pour le cache des blocs du monde.
+    """
+
+    def __init__(self, generate, chunk_size=CHUNK_SIZE, max_bytes=CHUNK_CACHE_BYTES):
+        """
+        Initialise un cache vide.
+
+        Parameters
+        ----------
+        generate : function
+            Fonction calculant le contenu d'un bloc de cellules, de même
+            signature que worldmap.tile_block, et renvoyant un tuple de
+            tableaux (size_x, size_y).
+        chunk_size : int, optional
+            Taille d'un bloc, en cellules. The default is CHUNK_SIZE.
+        max_bytes : int, optional
+            Taille maximale des blocs gardés en mémoire, en octets.
+            The default is CHUNK_CACHE_BYTES.
+
+        Returns
+        -------
+        None.
+        """
+        self.generate = generate
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        # (bloc x, bloc y) -> tuple de tableaux, le plus récent en dernier
+        self.chunks = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_chunk(self, cx, cy):
+        """
+        Renvoie le contenu d'un bloc, en le calculant s'il n'est pas en cache.
+
+        Parameters
+        ----------
+        cx : int
+            Position x du bloc, en blocs.
+        cy : int
+            Position y du bloc, en blocs.
+
+        Returns
+        -------
+        tuple
+            Tableaux (chunk_size, chunk_size) du contenu du bloc.
+        """
+        key = (cx, cy)
+        if key in self.chunks:
+            self.hits += 1
+            self.chunks.move_to_end(key)
+            return self.chunks[key]
+        self.misses += 1
+        chunk = self.generate(cx*self.chunk_size, cy*self.chunk_size, self.chunk_size, self.chunk_size)
+        self.put_chunk(cx, cy, chunk)
+        return chunk
+
+    def put_chunk(self, cx, cy, chunk):
+        """
+        Ajoute un bloc calculé ailleurs au cache.
+
+        Parameters
+        ----------
+        cx : int
+            Position x du bloc, en blocs.
+        cy : int
+            Position y du bloc, en blocs.
+        chunk : tuple
+            Tableaux (chunk_size, chunk_size) du contenu du bloc.
+
+        Returns
+        -------
+        None.
+        """
+        key = (cx, cy)
+        if key in self.chunks:
+            self.nbytes -= sum(array.nbytes for array in self.chunks[key])
+        self.chunks[key] = chunk
+        self.chunks.move_to_end(key)
+        self.nbytes += sum(array.nbytes for array in chunk)
+        # On garde toujours au moins le dernier bloc ajouté
+        while self.nbytes > self.max_bytes and len(self.chunks) > 1:
+            _, evicted = self.chunks.popitem(last=False)
+            self.nbytes -= sum(array.nbytes for array in evicted)
+            self.evictions += 1
+
+    def block(self, x, y, size_x, size_y):
+        """
+        Renvoie le contenu d'un bloc quelconque de cellules du monde, assemblé
+        à partir des blocs du cache.
+
+        Parameters
+        ----------
+        x : int
+            Position x de la première cellule du bloc.
+        y : int
+            Position y de la première cellule du bloc.
+        size_x : int
+            Largeur du bloc.
+        size_y : int
+            Hauteur du bloc.
+
+        Returns
+        -------
+        tuple
+            Tableaux (size_x, size_y) du contenu du bloc.
+        """
+        size = self.chunk_size
+        result = None
+        for cx in range(x//size, (x+size_x-1)//size+1):
+            for cy in range(y//size, (y+size_y-1)//size+1):
+                chunk = self.get_chunk(cx, cy)
+                if result == None:
+                    result = tuple(np.empty((size_x, size_y), dtype=array.dtype) for array in chunk)
+                x0, x1 = max(x, cx*size), min(x+size_x, (cx+1)*size)
+                y0, y1 = max(y, cy*size), min(y+size_y, (cy+1)*size)
+                for target, array in zip(result, chunk):
+                    target[x0-x:x1-x, y0-y:y1-y] = array[x0-cx*size:x1-cx*size, y0-cy*size:y1-cy*size]
+        return result
@@ -0,0 +1,203 @@
+"""
+Module pour la conversion entre positions en pixels, cellules du monde et
+cellules de la fenêtre de simulation.
+
+La fenêtre de simulation est le carré de cellules autour de l'écran dans
+lequel la carte est générée et les PNJ sont simulés. Toutes les conversions
+passent par ce module et acceptent indifféremment des nombres ou des tableaux
+NumPy.
+"""
+
+import numpy as np
+
+
+CELL_SIZE = 256
+DEFAULT_WINDOW_SIZE = 30
+# Les PNJ n'apparaissent pas sur les cellules à moins de SPAWN_MARGIN du bord
+SPAWN_MARGIN = 2
+# Taille minimale de la fenêtre : l'écran et la zone d'apparition doivent y tenir
+MIN_WINDOW_SIZE = 8
+
+
+def to_int(value):
+    """
+    Convertit un nombre ou un tableau en entier(s).
+
+    Parameters
+    ----------
+    value : float or numpy.ndarray
+        Valeur à convertir.
+
+    Returns
+    -------
+    int or numpy.ndarray
+        Entier, ou tableau d'entiers.
+    """
+    if np.ndim(value) == 0:
+        return int(value)
+    return np.asarray(value).astype(np.int64)
+
+
+def world_cell(x, y):
+    """
+    Convertit une position en pixels en cellule du monde.
+
+    Parameters
+    ----------
+    x : float or numpy.ndarray
+        Position x en pixels.
+    y : float or numpy.ndarray
+        Position y en pixels.
+
+    Returns
+    -------
+    tuple
+        Cellule (x, y) du monde.
+    """
+    return to_int(np.floor_divide(x, CELL_SIZE)), to_int(np.floor_divide(y, CELL_SIZE))
+
+
+class GridAddress:
+    """
+    Classe représentant la fenêtre de simulation et ses conversions de
+    coordonnées.
+    """
+
+    def __init__(self, size=DEFAULT_WINDOW_SIZE, screen_x=640, screen_y=360, spawn_margin=SPAWN_MARGIN):
+        """
+        Initialise la fenêtre de simulation.
+
+        Parameters
+        ----------
+        size : int, optional
+            Taille de la fenêtre, en cellules. The default is DEFAULT_WINDOW_SIZE.
+        screen_x : int, optional
+            Largeur de l'écran, en pixels. The default is 640.
+        screen_y : int, optional
+            Hauteur de l'écran, en pixels. The default is 360.
+        spawn_margin : int, optional
+            Largeur du bord de la fenêtre sans apparition de PNJ.
+            The default is SPAWN_MARGIN.
+
+        Returns
+        -------
+        None.
+        """
+        self.size = max(size, MIN_WINDOW_SIZE)
+        # La fenêtre est centrée sur la cellule du centre de l'écran
+        self.offset_x = self.size//2 - int((screen_x/2)//CELL_SIZE)
+        self.offset_y = self.size//2 - int((screen_y/2)//CELL_SIZE)
+        self.spawn_low = spawn_margin
+        self.spawn_high = self.size - spawn_margin
+
+    def origin(self, cam_x, cam_y):
+        """
+        Renvoie la cellule du monde correspondant à la cellule (0, 0) de la
+        fenêtre.
+
+        Parameters
+        ----------
+        cam_x : float
+            Position x de la caméra.
+        cam_y : float
+            Position y de la caméra.
+
+        Returns
+        -------
+        tuple
+            Cellule (x, y) du monde.
+        """
+        cell_x, cell_y = world_cell(cam_x, cam_y)
+        return cell_x - self.offset_x, cell_y - self.offset_y
+
+    def pixel_to_grid(self, x, y, cam_x, cam_y):
+        """
+        Convertit une position en pixels en cellule de la fenêtre.
+
+        Parameters
+        ----------
+        x : float or numpy.ndarray
+            Position x en pixels.
+        y : float or numpy.ndarray
+            Position y en pixels.
+        cam_x : float
+            Position x de la caméra.
+        cam_y : float
+            Position y de la caméra.
+
+        Returns
+        -------
+        tuple
+            Cellule (grid_x, grid_y) de la fenêtre, éventuellement hors de la
+            fenêtre.
+        """
+        cell_x, cell_y = world_cell(x, y)
+        origin_x, origin_y = self.origin(cam_x, cam_y)
+        return cell_x - origin_x, cell_y - origin_y
+
+    def grid_to_pixel(self, grid_x, grid_y, cam_x, cam_y):
+        """
+        Convertit une cellule de la fenêtre en position en pixels, décalée
+        de la caméra comme dans l'ancienne conversion des PNJ.
+
+        Parameters
+        ----------
+        grid_x : int or numpy.ndarray
+            Coordonnée x dans la fenêtre.
+        grid_y : int or numpy.ndarray
+            Coordonnée y dans la fenêtre.
+        cam_x : float
+            Position x de la caméra.
+        cam_y : float
+            Position y de la caméra.
+
+        Returns
+        -------
+        tuple
+            Position (x, y) en pixels.
+        """
+        return CELL_SIZE*(grid_x-self.offset_x) + cam_x, CELL_SIZE*(grid_y-self.offset_y) + cam_y
+
+    def inside(self, grid_x, grid_y):
+        """
+        Indique si une cellule appartient à la fenêtre.
+
+        Parameters
+        ----------
+        grid_x : int or numpy.ndarray
+            Coordonnée x dans la fenêtre.
+        grid_y : int or numpy.ndarray
+            Coordonnée y dans la fenêtre.
+
+        Returns
+        -------
+        bool or numpy.ndarray
+            Vrai pour les cellules de la fenêtre.
+        """
+        return (0 <= grid_x) & (grid_x < self.size) & (0 <= grid_y) & (grid_y < self.size)
+
+    def world_inside(self, cell_x, cell_y, origin_x, origin_y):
+        """
+        Indique si une cellule du monde appartient à la fenêtre d'origine
+        donnée.
+
+        Parameters
+        ----------
+        cell_x : int or numpy.ndarray
+            Position x de la cellule du monde.
+        cell_y : int or numpy.ndarray
+            Position y de la cellule du monde.
+        origin_x : int
+            Position x de la cellule (0, 0) de la fenêtre.
+        origin_y : int
+            Position y de la cellule (0, 0) de la fenêtre.
+
+        Returns
+        -------
+        bool or numpy.ndarray
+            Vrai pour les cellules de la fenêtre.
+        """
+        return self.inside(cell_x-origin_x, cell_y-origin_y)
+
+
+DEFAULT_ADDRESS = GridAddress()
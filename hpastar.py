@@ -0,0 +1,613 @@
+"""
+Module pour le calcul de chemin à longue distance dans le monde (HPA*).
+
+Le monde est découpé en blocs carrés. Les entrées entre blocs voisins et les
+coûts entre les entrées d'un même bloc sont calculés une seule fois, quand
+la recherche en a besoin pour la première fois, puis gardés en mémoire. Un
+chemin à longue distance ne demande alors qu'une recherche sur le graphe des
+entrées et deux petites recherches dans les blocs de départ et d'arrivée.
+
+Une recherche peut aussi être menée par morceaux avec RouteSearch, pour ne
+pas dépasser le temps accordé à une image.
+"""
+
+import heapq
+import time
+import numpy as np
+import astar
+import worldmap
+
+
+CLUSTER_SIZE = 32
+MAX_EXPANSIONS = 20000
+# Longueur à partir de laquelle une ouverture entre deux blocs a deux entrées
+LONG_ENTRANCE = 6
+# Nombre de cases développées entre deux lectures de l'horloge dans
+# DistanceSearch
+CHECK_INTERVAL = 64
+# Poids de l'heuristique : le chemin par les entrées est déjà approché, on
+# accepte un léger surcoût en échange de beaucoup moins de blocs explorés
+HEURISTIC_WEIGHT = 1.2
+
+
+def octile(x1, y1, x2, y2):
+    """
+    Calcule la distance entre deux cellules sur une grille à 8 voisins
+    sans obstacle.
+
+    Parameters
+    ----------
+    x1 : int
+        Position x de la première cellule.
+    y1 : int
+        Position y de la première cellule.
+    x2 : int
+        Position x de la seconde cellule.
+    y2 : int
+        Position y de la seconde cellule.
+
+    Returns
+    -------
+    float
+        La distance entre les deux cellules.
+    """
+    dx, dy = abs(x1-x2), abs(y1-y2)
+    return max(dx, dy) + (astar.SQRT2-1)*min(dx, dy)
+
+
+class DistanceSearch:
+    """
+    Classe représentant un calcul de distances en cours dans un bloc
+    (algorithme de Dijkstra), qui peut être interrompu et repris.
+    """
+
+    def __init__(self, grid, x, y):
+        """
+        Prépare le calcul des distances jusqu'à une cellule du bloc.
+
+        Comme pour GridSearch.distance_map, la cellule cible est atteignable
+        même si elle est occupée.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Occupation du bloc.
+        x : int
+            Position x de la cellule cible dans le bloc.
+        y : int
+            Position y de la cellule cible dans le bloc.
+
+        Returns
+        -------
+        None.
+        """
+        self.size_x, self.size_y = grid.shape
+        self.width = self.size_y+2
+        blocked = np.ones((self.size_x+2, self.size_y+2), dtype=bool)
+        blocked[1:-1, 1:-1] = grid != 0
+        self.blocked = blocked.ravel().tolist()
+        self.g = [float('inf')]*len(self.blocked)
+        self.closed = [False]*len(self.blocked)
+        self.offsets = tuple((dx*self.width + dy, cost) for dx, dy, cost in astar.NEIGHBOURS)
+        target = (x+1)*self.width + (y+1)
+        self.blocked[target] = False
+        self.g[target] = 0.0
+        self.openl = [(0.0, target)]
+
+    def run(self, deadline):
+        """
+        Avance le calcul jusqu'à sa fin ou jusqu'à une date limite. Au moins
+        CHECK_INTERVAL cellules sont développées à chaque appel.
+
+        Parameters
+        ----------
+        deadline : float
+            Date limite, au sens de time.perf_counter.
+
+        Returns
+        -------
+        bool
+            True si le calcul est terminé, le résultat est alors donné par
+            distances.
+        """
+        openl, g, blocked, closed, offsets = self.openl, self.g, self.blocked, self.closed, self.offsets
+        count = 0
+        while len(openl) > 0:
+            g_index, index = heapq.heappop(openl)
+            if closed[index]:
+                continue
+            closed[index] = True
+            for offset, cost in offsets:
+                neighbour = index+offset
+                if blocked[neighbour] or closed[neighbour]:
+                    continue
+                new_g = g_index+cost
+                if new_g < g[neighbour]:
+                    g[neighbour] = new_g
+                    heapq.heappush(openl, (new_g, neighbour))
+            count += 1
+            if count%CHECK_INTERVAL == 0 and time.perf_counter() > deadline:
+                return len(openl) == 0
+        return True
+
+    def distances(self):
+        """
+        Renvoie les distances calculées.
+
+        Returns
+        -------
+        numpy.ndarray
+            Distances (size_x, size_y), inf pour les cellules inatteignables.
+        """
+        return np.array(self.g).reshape(self.size_x+2, self.size_y+2)[1:-1, 1:-1]
+
+
+class Cluster:
+    """
+    Classe représentant un bloc du monde et ses entrées.
+    """
+
+    def __init__(self, cx, cy, size, occupancy):
+        """
+        Calcule l'occupation du bloc, ses entrées et les coûts entre elles.
+
+        Parameters
+        ----------
+        cx : int
+            Position x du bloc, en blocs.
+        cy : int
+            Position y du bloc, en blocs.
+        size : int
+            Taille d'un bloc, en cellules.
+        occupancy : function
+            Fonction renvoyant l'occupation d'un bloc de cellules du monde,
+            de même signature que worldmap.obstacle_block.
+
+        Returns
+        -------
+        None.
+        """
+        self.cx = cx
+        self.cy = cy
+        self.size = size
+        self.x = cx*size
+        self.y = cy*size
+        self.grid = occupancy(self.x, self.y, size, size)
+        self.entrances = set()
+        # Entrée -> entrée du bloc voisin qui lui fait face
+        self.links = {}
+        self.find_entrances(occupancy)
+        # Entrée -> liste de (entrée du même bloc, coût), rempli à la demande
+        self.edges = {}
+        # Entrée -> DistanceSearch pas encore terminé
+        self.searches = {}
+
+    def find_entrances(self, occupancy):
+        """
+        Cherche les entrées sur les quatre bords du bloc.
+
+        Une ouverture est une suite de cellules libres des deux côtés du bord.
+        Les ouvertures courtes ont une entrée en leur milieu, les longues une
+        entrée à chaque extrémité. Le résultat ne dépend que du bord, si bien
+        que deux blocs voisins trouvent les mêmes entrées.
+
+        Parameters
+        ----------
+        occupancy : function
+            Fonction d'occupation des cellules du monde.
+
+        Returns
+        -------
+        None.
+        """
+        size = self.size
+        sides = (
+            # (cellules du bord, cellules en face, pas vers le voisin)
+            (self.grid[0, :], occupancy(self.x-1, self.y, 1, size)[0, :], (-1, 0)),
+            (self.grid[-1, :], occupancy(self.x+size, self.y, 1, size)[0, :], (1, 0)),
+            (self.grid[:, 0], occupancy(self.x, self.y-1, size, 1)[:, 0], (0, -1)),
+            (self.grid[:, -1], occupancy(self.x, self.y+size, size, 1)[:, 0], (0, 1)),
+        )
+        for border, facing, step in sides:
+            free = ~border & ~facing
+            start = None
+            for k in range(size+1):
+                if k < size and free[k]:
+                    if start == None:
+                        start = k
+                    continue
+                if start == None:
+                    continue
+                if k-start < LONG_ENTRANCE:
+                    positions = ((start+k-1)//2,)
+                else:
+                    positions = (start, k-1)
+                for position in positions:
+                    self.add_entrance(position, step)
+                start = None
+
+    def add_entrance(self, position, step):
+        """
+        Ajoute une entrée sur un bord du bloc.
+
+        Parameters
+        ----------
+        position : int
+            Position de l'entrée le long du bord.
+        step : tuple
+            Pas (dx, dy) vers le bloc voisin, qui désigne le bord.
+
+        Returns
+        -------
+        None.
+        """
+        if step[0] == -1:
+            entrance = (self.x, self.y+position)
+        elif step[0] == 1:
+            entrance = (self.x+self.size-1, self.y+position)
+        elif step[1] == -1:
+            entrance = (self.x+position, self.y)
+        else:
+            entrance = (self.x+position, self.y+self.size-1)
+        self.entrances.add(entrance)
+        self.links[entrance] = (entrance[0]+step[0], entrance[1]+step[1])
+
+    def get_edges(self, entrance):
+        """
+        Renvoie les coûts entre une entrée et les autres entrées du bloc,
+        calculés au premier appel puis gardés en mémoire.
+
+        Parameters
+        ----------
+        entrance : tuple
+            Entrée (x, y) du bloc.
+
+        Returns
+        -------
+        list
+            Liste de (entrée du même bloc, coût).
+        """
+        self.prepare_edges(entrance, float('inf'))
+        return self.edges[entrance]
+
+    def prepare_edges(self, entrance, deadline):
+        """
+        Calcule les coûts entre une entrée et les autres entrées du bloc,
+        en s'arrêtant à la date limite si le calcul n'est pas fini.
+
+        Parameters
+        ----------
+        entrance : tuple
+            Entrée (x, y) du bloc.
+        deadline : float
+            Date limite, au sens de time.perf_counter.
+
+        Returns
+        -------
+        bool
+            True si les coûts sont disponibles dans edges.
+        """
+        if entrance in self.edges:
+            return True
+        if entrance not in self.searches:
+            self.searches[entrance] = self.distance_search(entrance[0], entrance[1])
+        search = self.searches[entrance]
+        if not search.run(deadline):
+            return False
+        del self.searches[entrance]
+        self.edges[entrance] = self.costs_to_entrances(search, exclude=entrance)
+        return True
+
+    def distance_search(self, x, y):
+        """
+        Prépare le calcul des distances de chaque cellule du bloc jusqu'à
+        une cellule.
+
+        Parameters
+        ----------
+        x : int
+            Position x de la cellule dans le monde.
+        y : int
+            Position y de la cellule dans le monde.
+
+        Returns
+        -------
+        DistanceSearch
+            Le calcul, à mener avec DistanceSearch.run.
+        """
+        return DistanceSearch(self.grid, x-self.x, y-self.y)
+
+    def costs_to_entrances(self, search, exclude=None):
+        """
+        Lit dans un calcul terminé les coûts vers les entrées atteignables.
+
+        Parameters
+        ----------
+        search : DistanceSearch
+            Calcul de distances terminé dans ce bloc.
+        exclude : tuple, optional
+            Entrée à ignorer. The default is None.
+
+        Returns
+        -------
+        list
+            Liste de (entrée, coût).
+        """
+        distances = search.distances()
+        costs = []
+        for other in self.entrances:
+            cost = distances[other[0]-self.x][other[1]-self.y]
+            if other != exclude and np.isfinite(cost):
+                costs.append((other, float(cost)))
+        return costs
+
+
+class HierarchicalPlanner:
+    """
+    Classe pour le calcul de chemin entre deux cellules éloignées du monde.
+    """
+
+    def __init__(self, occupancy=worldmap.obstacle_block, cluster_size=CLUSTER_SIZE):
+        """
+        Initialise le planificateur, sans calculer aucun bloc.
+
+        Parameters
+        ----------
+        occupancy : function, optional
+            Fonction d'occupation des cellules du monde.
+            The default is worldmap.obstacle_block.
+        cluster_size : int, optional
+            Taille d'un bloc, en cellules. The default is CLUSTER_SIZE.
+
+        Returns
+        -------
+        None.
+        """
+        self.occupancy = occupancy
+        self.cluster_size = cluster_size
+        self.clusters = {}
+
+    def get_cluster(self, x, y):
+        """
+        Renvoie le bloc contenant une cellule, en le calculant si besoin.
+
+        Parameters
+        ----------
+        x : int
+            Position x de la cellule.
+        y : int
+            Position y de la cellule.
+
+        Returns
+        -------
+        Cluster
+            Le bloc contenant la cellule.
+        """
+        key = (x//self.cluster_size, y//self.cluster_size)
+        if key not in self.clusters:
+            self.clusters[key] = Cluster(key[0], key[1], self.cluster_size, self.occupancy)
+        return self.clusters[key]
+
+    def find_path(self, x1, y1, x2, y2, max_expansions=MAX_EXPANSIONS):
+        """
+        Trouve un chemin entre deux cellules du monde.
+
+        Parameters
+        ----------
+        x1 : int
+            Position x de la cellule de départ.
+        y1 : int
+            Position y de la cellule de départ.
+        x2 : int
+            Position x de la cellule d'arrivée.
+        y2 : int
+            Position y de la cellule d'arrivée.
+        max_expansions : int, optional
+            Nombre maximal d'entrées explorées avant d'abandonner.
+            The default is MAX_EXPANSIONS.
+
+        Returns
+        -------
+        list or None
+            Liste de cellules (x, y) à rejoindre dans l'ordre, la dernière
+            étant l'arrivée, ou None si aucun chemin n'a été trouvé.
+        """
+        search = RouteSearch(self, x1, y1, x2, y2, max_expansions)
+        search.step(float('inf'))
+        return search.path
+
+    def get_edges(self, node, start, start_edges, goal, goal_costs):
+        """
+        Renvoie les arêtes du graphe des entrées partant d'un nœud.
+
+        Parameters
+        ----------
+        node : tuple
+            Nœud (x, y) dont on veut les arêtes.
+        start : tuple
+            Cellule de départ de la recherche.
+        start_edges : list
+            Arêtes (entrée, coût) partant du départ.
+        goal : tuple
+            Cellule d'arrivée de la recherche.
+        goal_costs : dict
+            Coût de chaque entrée du bloc d'arrivée jusqu'à l'arrivée.
+
+        Returns
+        -------
+        list
+            Liste de (nœud voisin, coût).
+        """
+        cluster = self.get_cluster(node[0], node[1])
+        edges = list(start_edges) if node == start else []
+        if node not in cluster.entrances:
+            return edges
+        # Le départ atteint déjà les entrées de son bloc par start_edges,
+        # mais s'il est lui-même une entrée il garde le passage vers le voisin
+        if node != start:
+            edges += cluster.get_edges(node)
+        if node in cluster.links:
+            edges.append((cluster.links[node], 1.0))
+        if node in goal_costs:
+            edges.append((goal, goal_costs[node]))
+        return edges
+
+    def build_path(self, parents, goal):
+        """
+        Reconstruit la liste des cellules du chemin trouvé.
+
+        Parameters
+        ----------
+        parents : dict
+            Parent de chaque nœud visité.
+        goal : tuple
+            Cellule d'arrivée.
+
+        Returns
+        -------
+        list
+            Liste des cellules à rejoindre, sans le départ.
+        """
+        path = []
+        node = goal
+        while parents[node] != None:
+            path.append(node)
+            node = parents[node]
+        return path[::-1]
+
+
+class RouteSearch:
+    """
+    Classe représentant une recherche de chemin en cours, qui peut être
+    interrompue et reprise d'une image à l'autre.
+    """
+
+    def __init__(self, planner, x1, y1, x2, y2, max_expansions=MAX_EXPANSIONS):
+        """
+        Prépare la recherche, sans rien calculer.
+
+        Parameters
+        ----------
+        planner : HierarchicalPlanner
+            Planificateur dont les blocs sont utilisés.
+        x1 : int
+            Position x de la cellule de départ.
+        y1 : int
+            Position y de la cellule de départ.
+        x2 : int
+            Position x de la cellule d'arrivée.
+        y2 : int
+            Position y de la cellule d'arrivée.
+        max_expansions : int, optional
+            Nombre maximal d'entrées explorées avant d'abandonner.
+            The default is MAX_EXPANSIONS.
+
+        Returns
+        -------
+        None.
+        """
+        self.planner = planner
+        self.start = (x1, y1)
+        self.goal = (x2, y2)
+        self.max_expansions = max_expansions
+        self.expansions = 0
+        self.done = False
+        # Liste de cellules à rejoindre, None si aucun chemin n'a été trouvé
+        self.path = None
+        self.openl = None
+        # Calculs de distances du départ et de l'arrivée, menés par begin
+        self.start_search = None
+        self.goal_search = None
+
+    def begin(self, deadline):
+        """
+        Calcule les arêtes du départ et de l'arrivée et ouvre la recherche,
+        en s'arrêtant à la date limite si les calculs ne sont pas finis.
+
+        Parameters
+        ----------
+        deadline : float
+            Date limite, au sens de time.perf_counter.
+
+        Returns
+        -------
+        bool
+            True si la recherche est ouverte ou déjà terminée.
+        """
+        (x1, y1), (x2, y2) = self.start, self.goal
+        start_cluster = self.planner.get_cluster(x1, y1)
+        goal_cluster = self.planner.get_cluster(x2, y2)
+        # Coûts entre les entrées du bloc d'arrivée et l'arrivée
+        if self.goal_search == None:
+            self.goal_search = goal_cluster.distance_search(x2, y2)
+            self.start_search = start_cluster.distance_search(x1, y1)
+        if not self.goal_search.run(deadline):
+            return False
+        if start_cluster is goal_cluster:
+            distances = self.goal_search.distances()
+            if np.isfinite(distances[x1-start_cluster.x][y1-start_cluster.y]):
+                self.path = [self.goal]
+                self.done = True
+                return True
+        # Coûts entre le départ et les entrées de son bloc
+        if not self.start_search.run(deadline):
+            return False
+        self.start_edges = start_cluster.costs_to_entrances(self.start_search)
+        self.goal_costs = dict(goal_cluster.costs_to_entrances(self.goal_search))
+        self.start_search = self.goal_search = None
+        self.g = {self.start: 0.0}
+        self.parents = {self.start: None}
+        self.closed = set()
+        self.openl = [(HEURISTIC_WEIGHT*octile(x1, y1, x2, y2), self.start)]
+
+    def step(self, deadline):
+        """
+        Avance la recherche jusqu'à sa fin ou jusqu'à une date limite.
+
+        Les coûts entre les entrées d'un bloc sont calculés à l'intérieur du
+        temps accordé, quitte à reprendre leur calcul à l'appel suivant : seul
+        le calcul de l'occupation d'un nouveau bloc n'est pas interrompu.
+
+        Parameters
+        ----------
+        deadline : float
+            Date limite, au sens de time.perf_counter.
+
+        Returns
+        -------
+        bool
+            True si la recherche est terminée, le résultat est alors dans path.
+        """
+        if self.done:
+            return True
+        if self.openl == None:
+            if not self.begin(deadline) or self.done or time.perf_counter() > deadline:
+                return self.done
+        planner, goal = self.planner, self.goal
+        while len(self.openl) > 0 and self.expansions < self.max_expansions:
+            node = self.openl[0][1]
+            if node in self.closed:
+                heapq.heappop(self.openl)
+                continue
+            if node == goal:
+                self.path = planner.build_path(self.parents, goal)
+                self.done = True
+                return True
+            # Le nœud reste en tête de la file tant que les coûts de son bloc
+            # ne sont pas calculés
+            cluster = planner.get_cluster(node[0], node[1])
+            if node != self.start and node in cluster.entrances and not cluster.prepare_edges(node, deadline):
+                return False
+            heapq.heappop(self.openl)
+            self.closed.add(node)
+            self.expansions += 1
+            for neighbour, cost in planner.get_edges(node, self.start, self.start_edges, goal, self.goal_costs):
+                new_g = self.g[node]+cost
+                if neighbour not in self.closed and new_g < self.g.get(neighbour, float('inf')):
+                    self.g[neighbour] = new_g
+                    self.parents[neighbour] = node
+                    heapq.heappush(self.openl, (new_g+HEURISTIC_WEIGHT*octile(neighbour[0], neighbour[1], goal[0], goal[1]), neighbour))
+            if time.perf_counter() > deadline:
+                return False
+        self.done = True
+        return True
@@ -7,6 +7,7 @@ import numpy as np
 from dataclasses import dataclass
 import json
 from worldsprite import WorldSprite
+import gridaddress
 
 
 ITEM_IMAGES = (
@@ -104,6 +105,8 @@ class WeaponModel:
         self.accuracy = modelinfo["accuracy"]
         self.damage = modelinfo["damage"]
         self.price = modelinfo["price"]
+        # Tir résolu instantanément plutôt que simulé balle par balle
+        self.hitscan = modelinfo.get("hitscan", False)
 
 
 class Weapon(Item):
@@ -144,6 +147,7 @@ class Weapon(Item):
         self.damage = model.damage - model.damage*damage_dmg
         self.loaded = loaded
         self.price = model.price
+        self.hitscan = model.hitscan
 
 
 class BulletBox(Item):
@@ -1135,7 +1139,7 @@ class GroundItemManager:
     """
     Classe pour gérer les objets dans le monde.
     """
-    def __init__(self, batch):
+    def __init__(self, batch, grid_address=gridaddress.DEFAULT_ADDRESS):
         """
         Initialise le gestionnaire des objets dans le monde.
 
@@ -1143,6 +1147,8 @@ class GroundItemManager:
         ----------
         batch : pyglet.graphics.Batch
             Groupe de batch pyglet pour l'affichage des objets.
+        grid_address : GridAddress, optional
+            Fenêtre de simulation. The default is gridaddress.DEFAULT_ADDRESS.
 
         Returns
         -------
@@ -1150,6 +1156,7 @@ class GroundItemManager:
         """
 
         self.batch = batch
+        self.grid_address = grid_address
         self.groud_item_list = []#[GroundItem(Weapon(WEAPON_MODELS[0], 0, 0, 0, 0, 0), 100*256, -300*256)]
         #self.groud_item_list[0].item.sprite.batch = self.batch
         self.pickup_sound = pyglet.media.load("snd/pickup.mp3", streaming=False)
@@ -1199,7 +1206,7 @@ class GroundItemManager:
             La position convertie en pixels (x, y).
         """
 
-        return (256*grid_x) + cam_x - (14*256), (256*grid_y) + cam_y - (15*256)
+        return self.grid_address.grid_to_pixel(grid_x, grid_y, cam_x, cam_y)
 
     def pixel_to_grid_cos(self, x, y, cam_x, cam_y):
         """
@@ -1222,7 +1229,7 @@ class GroundItemManager:
             La position convertie dans la grille (x, y).
         """
 
-        return int((x//256) - (cam_x//256)) + 14, int((y//256) - (cam_y//256)) + 15
+        return self.grid_address.pixel_to_grid(x, y, cam_x, cam_y)
 
     def check_npc_seller(self, npc_x, npc_y, npc_health):
         """
@@ -1281,7 +1288,7 @@ class GroundItemManager:
         new_item_list = []
         for item in self.groud_item_list:
             grid_x, grid_y = self.pixel_to_grid_cos(item.pos_x, item.pos_y, cam_x, cam_y)
-            if not 1 <= grid_x < 29 or not 1 <= grid_y < 29:
+            if not 1 <= grid_x < self.grid_address.size-1 or not 1 <= grid_y < self.grid_address.size-1:
                 continue
             item.item.sprite.set_relative_pos(item.pos_x, item.pos_y, cam_x, cam_y)
             if item.pos_x <= player_x < item.pos_x+64 and item.pos_y <= player_y < item.pos_y+64:
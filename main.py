@@ -10,13 +10,15 @@ from scene import Scene, MainGameScene, TitleScreen
 from world_gen import WorldGen
 from keyinput import Input 
 from keymap import Keymap
+import worldmap
+import gridaddress
 
 
 class Game(pyglet.window.Window):
     """
     Classe principale gérant le jeu.
     """
-    def __init__(self, scale=3, keymap="qwerty"):
+    def __init__(self, scale=3, keymap="qwerty", seed=worldmap.DEFAULT_SEED, window_size=gridaddress.DEFAULT_WINDOW_SIZE):
         """
         Initialise la fenêtre de jeu.
 
@@ -26,6 +28,11 @@ class Game(pyglet.window.Window):
             Échelle de la fenêtre. The default is 3.
         keymap : str, optional
             Mappage des touches. The default is "qwerty".
+        seed : int, optional
+            Graine du monde. The default is worldmap.DEFAULT_SEED.
+        window_size : int, optional
+            Taille de la zone simulée autour de l'écran, en cellules.
+            The default is gridaddress.DEFAULT_WINDOW_SIZE.
 
         Returns
         -------
@@ -34,6 +41,8 @@ class Game(pyglet.window.Window):
         self._SIZE_X = 640
         self._SIZE_Y = 360
         self._window_scale = scale
+        self.seed = seed
+        self.window_size = window_size
         self.keymap = Keymap(keymap)
         self._inputo = Input()
         self._fps_display = pyglet.window.FPSDisplay(window=self)
@@ -55,13 +64,14 @@ class Game(pyglet.window.Window):
         None.
         """
         pyglet.clock.unschedule(self.scene.update)
+        self.scene.close()
         match new_scene:
             case -1:
                 self.close()
             case 0:
                 self.scene = TitleScreen(self._window_scale, self._SIZE_X, self._SIZE_Y, self._inputo, self)
             case 1:
-                self.scene = MainGameScene(self._window_scale, self._SIZE_X, self._SIZE_Y, self._inputo, self, self.worldgen)
+                self.scene = MainGameScene(self._window_scale, self._SIZE_X, self._SIZE_Y, self._inputo, self, self.worldgen, self.seed, self.window_size)
 
     def on_draw(self):
         """
@@ -248,10 +258,12 @@ if __name__ == "__main__":
 
     parser.add_argument('--scale',type=int, default=3)
     parser.add_argument('--keymap',type=str, default="qwerty")
+    parser.add_argument('--seed',type=int, default=worldmap.DEFAULT_SEED)
+    parser.add_argument('--window-size',type=int, default=gridaddress.DEFAULT_WINDOW_SIZE)
 
     args = parser.parse_args()
 
     pyglet.image.Texture.default_min_filter = GL_NEAREST
     pyglet.image.Texture.default_mag_filter = GL_NEAREST
-    window = Game(scale=args.scale,keymap=args.keymap)
+    window = Game(scale=args.scale,keymap=args.keymap,seed=args.seed,window_size=args.window_size)
     pyglet.app.run(1/60)
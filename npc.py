@@ -2,6 +2,7 @@
 Module de gestion des personnages non-joueurs (NPC) comprenant les marcheurs et les véhicules.
 """
 
+import functools
 import pyglet
 import random
 import numpy as np
@@ -11,6 +12,10 @@ from inventory import Weapon, WEAPON_MODELS
 from city import City, cities
 from inventory import GroundItemManager, BulletBox
 import astar
+import hpastar
+import pathservice
+import worldmap
+import gridaddress
 
 
 NPC_IMAGES = [pyglet.image.load("img/npc0.png"), pyglet.image.load("img/npc1.png"), pyglet.image.load("img/npc2.png"), pyglet.image.load("img/npc3.png"), pyglet.image.load("img/vendeur.png")]
@@ -33,18 +38,258 @@ NPC_CARS = tuple(NPC_CARS)
 
 
 BULLETS_TYPES = ("9mm", "7.62mm", "20mm")
+# Distance (en cellules) à partir de laquelle un NPC planifie son trajet
+ROUTE_MIN_DISTANCE = 15
+# Distance (en cellules) au prochain point de passage au-delà de laquelle un
+# NPC écarté de son trajet le recalcule
+ROUTE_REPLAN_DISTANCE = 48
+# Nombre de processus pour les calculs de chemin, 0 pour rester dans le jeu
+PATH_WORKERS = 0
+
+
+# Colonnes de NpcStore : nom, type et valeur par défaut
+NPC_COLUMNS = (
+    ("x", np.float64, 0), ("y", np.float64, 0), ("health", np.float64, 0), ("stress", np.int64, 0),
+    ("npctype", np.int64, 0), ("ideal_x", np.float64, 0), ("ideal_y", np.float64, 0),
+    ("rotation", np.float64, 0),
+    ("armed", bool, False), ("loaded", np.int64, 0), ("capacity", np.int64, 0), ("loadtime", np.float64, 0),
+    ("rate", np.float64, 0), ("last_shot", np.float64, 0), ("time_since_load", np.float64, 0),
+    ("dead", bool, False), ("has_path_goal", bool, False), ("path_goal_x", np.int64, 0), ("path_goal_y", np.int64, 0)
+)
+# Nombre de NPC que peuvent contenir les tableaux de NpcStore à leur création
+NPC_CAPACITY = 64
+# Vitesse de marche d'un NPC, et d'un NPC stressé, en pixels par seconde
+WALK_SPEED = 90
+STRESSED_SPEED = 180
+# Distance au joueur (en pixels) en deçà de laquelle un NPC ne le suit plus
+FOLLOW_DISTANCE = 200
+# En deçà de cette vie, un NPC hostile retourne à son objectif idéal
+FLEE_HEALTH = 25
+
+
+class NpcStore:
+    """
+    Classe rangeant l'état de tous les NPC dans des tableaux parallèles, une
+    case par NPC, pour les mettre à jour en quelques passes NumPy. Chaque
+    NpcWalker garde son indice dans ces tableaux.
+
+    Les colonnes sont des vues sur les NPC vivants de tampons dont la taille
+    double quand ils sont pleins : ajouter un NPC ne recopie pas les tableaux.
+    """
+    def __init__(self):
+        """
+        Initialise des tableaux vides.
+
+        Returns
+        -------
+        None.
+        """
+        # Nombre de cases des tampons (la colonne capacity est celle des armes)
+        self.allocated = NPC_CAPACITY
+        self.buffers = {name: np.zeros(self.allocated, dtype=dtype) for name, dtype, _ in NPC_COLUMNS}
+        self.walkers = []
+        self.refresh_views()
+
+    def __len__(self):
+        """
+        Renvoie le nombre de NPC.
+
+        Returns
+        -------
+        int
+            Nombre de NPC.
+        """
+        return len(self.walkers)
+
+    def refresh_views(self):
+        """
+        Recrée les colonnes comme vues sur les cases des NPC dans les tampons.
+
+        Returns
+        -------
+        None.
+        """
+        for name, _, _ in NPC_COLUMNS:
+            setattr(self, name, self.buffers[name][:len(self.walkers)])
+
+    def add(self, walker, **values):
+        """
+        Ajoute une ligne aux tableaux pour un NPC.
+
+        Parameters
+        ----------
+        walker : NpcWalker
+            NPC correspondant à la ligne.
+        **values : dict
+            Valeurs des colonnes, les autres colonnes prennent leur valeur
+            par défaut.
+
+        Returns
+        -------
+        int
+            Indice de la ligne.
+        """
+        index = len(self.walkers)
+        if index == self.allocated:
+            self.allocated *= 2
+            for name, buffer in self.buffers.items():
+                self.buffers[name] = np.zeros(self.allocated, dtype=buffer.dtype)
+                self.buffers[name][:index] = buffer[:index]
+        for name, _, default in NPC_COLUMNS:
+            self.buffers[name][index] = values.get(name, default)
+        self.walkers.append(walker)
+        self.refresh_views()
+        return index
+
+    def compact(self, keep):
+        """
+        Ne garde que certains NPC et renumérote les NPC restants.
+
+        Parameters
+        ----------
+        keep : numpy.ndarray
+            Tableau booléen, vrai pour les NPC à garder.
+
+        Returns
+        -------
+        None.
+        """
+        if keep.all():
+            return
+        count = int(keep.sum())
+        for name, buffer in self.buffers.items():
+            buffer[:count] = buffer[:len(self.walkers)][keep]
+        self.walkers = [walker for walker, kept in zip(self.walkers, keep) if kept]
+        for index, walker in enumerate(self.walkers):
+            walker.index = index
+        self.refresh_views()
+
+    def choose_objectives(self, player_x, player_y):
+        """
+        Indique pour chaque NPC s'il se dirige vers le joueur ou vers son
+        objectif idéal.
+
+        Parameters
+        ----------
+        player_x : float
+            Position x du joueur.
+        player_y : float
+            Position y du joueur.
+
+        Returns
+        -------
+        numpy.ndarray
+            Tableau booléen, vrai pour les NPC qui suivent le joueur.
+        """
+        far = np.hypot(self.x-player_x, self.y-player_y) > FOLLOW_DISTANCE
+        return np.select(
+            (self.npctype == 1, self.npctype == 2, self.npctype == 3),
+            (far & (self.health >= FLEE_HEALTH) & (self.stress != 0), far & (self.health >= FLEE_HEALTH), far),
+            False
+        )
+
+    def straight_moves(self, target_x, target_y, delta_t):
+        """
+        Calcule les directions vers des cibles et le mouvement en ligne
+        droite de chaque NPC.
+
+        Parameters
+        ----------
+        target_x : numpy.ndarray
+            Positions x des cibles.
+        target_y : numpy.ndarray
+            Positions y des cibles.
+        delta_t : float
+            Temps écoulé depuis la dernière mise à jour.
+
+        Returns
+        -------
+        tuple
+            Directions (dir_x, dir_y) unitaires, nulles pour un NPC déjà sur sa
+            cible, et mouvements (mov_x, mov_y).
+        """
+        dir_x, dir_y = target_x-self.x, target_y-self.y
+        dir_inten = np.hypot(dir_x, dir_y)
+        dir_inten[dir_inten == 0] = np.inf
+        dir_x, dir_y = dir_x/dir_inten, dir_y/dir_inten
+        speed = np.where(self.stress > 1, STRESSED_SPEED, WALK_SPEED)*delta_t
+        return dir_x, dir_y, dir_x*speed, dir_y*speed
+
+    def fire_weapons(self, alive, delta_t):
+        """
+        Avance les minuteurs des armes, recharge les armes vides et choisit
+        les NPC qui tirent.
+
+        Parameters
+        ----------
+        alive : numpy.ndarray
+            Tableau booléen, vrai pour les NPC vivants.
+        delta_t : float
+            Temps écoulé depuis la dernière mise à jour.
+
+        Returns
+        -------
+        numpy.ndarray
+            Indices des NPC qui tirent.
+        """
+        # Les NPC de type 1 ne tirent qu'une fois stressés, ceux de type 2 toujours
+        shooters = alive & self.armed & ((self.npctype == 2) | ((self.npctype == 1) & (self.stress > 0)))
+        self.last_shot[shooters] += delta_t
+        self.time_since_load[shooters] += delta_t
+        empty = shooters & (self.loaded <= 0)
+        reload = empty & (self.time_since_load > self.loadtime)
+        self.loaded[reload] = self.capacity[reload]
+        self.time_since_load[reload & (self.capacity > 0)] = 0
+        fire = shooters & ~empty & (self.time_since_load >= self.loadtime) & (self.last_shot*self.rate > 1)
+        self.last_shot[fire] = 0
+        self.loaded[fire] -= 1
+        return np.nonzero(fire)[0]
+
+
+def store_column(name):
+    """
+    Crée une propriété lisant et écrivant une colonne de NpcStore à la ligne
+    du NPC.
+
+    Parameters
+    ----------
+    name : str
+        Nom de la colonne.
+
+    Returns
+    -------
+    property
+        Propriété de la colonne.
+    """
+    def get_value(walker):
+        return getattr(walker.store, name)[walker.index]
+
+    def set_value(walker, value):
+        getattr(walker.store, name)[walker.index] = value
+    return property(get_value, set_value)
 
 
 class NpcWalker:
     """
-    Classe pour gérer les personnages non-joueurs (NPC) marcheurs.
+    Classe pour gérer les personnages non-joueurs (NPC) marcheurs. L'état
+    simulé du NPC est rangé dans un NpcStore, le NPC garde son sprite, son
+    arme et ses trajets.
     """
-    def __init__(self, x, y, health, npctype, weapon, incar, batch):
+    x = store_column("x")
+    y = store_column("y")
+    health = store_column("health")
+    stress = store_column("stress")
+    npctype = store_column("npctype")
+    dead = store_column("dead")
+
+    def __init__(self, store, x, y, health, npctype, weapon, incar, batch, grid_address=gridaddress.DEFAULT_ADDRESS):
         """
-        Initialise un NPC marcheur.
+        Initialise un NPC marcheur et l'ajoute au stockage des NPC.
 
         Parameters
         ----------
+        store : NpcStore
+            Stockage des NPC.
         x : float
             Position horizontale du NPC.
         y : float
@@ -59,34 +304,83 @@ class NpcWalker:
             Indique si le NPC est dans un véhicule.
         batch : pyglet.graphics.Batch
             Groupe de batch pyglet pour l'affichage.
+        grid_address : GridAddress, optional
+            Fenêtre de simulation. The default is gridaddress.DEFAULT_ADDRESS.
 
         Returns
         -------
         None.
         """
-        self.x = x
-        self.y = y
-        self.npctype = npctype
+        self.store = store
+        self.index = store.add(self, x=x, y=y, health=health, npctype=npctype)
+        self.grid_address = grid_address
         self.chosen_image = random.randint(0, 3)
-        if self.npctype == 3:
+        if npctype == 3:
             self.chosen_image = 4
         self.sprite = WorldSprite(batch=batch, img=NPC_IMAGES[self.chosen_image], x=0, y=0)
-        self.stress = 0
-        self.speed_objective = 90
-        self.health = health
         if weapon != None:
             self.weapon = weapon
         else:
             self.weapon = self.choose_weapon()
+        if self.weapon != None:
+            store.armed[self.index] = True
+            store.loaded[self.index] = self.weapon.loaded
+            store.capacity[self.index] = self.weapon.capacity
+            store.loadtime[self.index] = self.weapon.loadtime
+            store.rate[self.index] = self.weapon.rate
         self.incar = incar
-        self.last_shot = 0
-        self.time_since_load = 0
-        self.ideal_objective = self.choose_objective()
-        self.objective = self.ideal_objective
-        self.dead = False
+        store.ideal_x[self.index], store.ideal_y[self.index] = self.choose_objective()
+        self.route = None
+        self.route_key = None
+        self.local_planner = None
+        self.path_dir = None
         self.batch = batch
         self.shot_sound = pyglet.media.load("snd/gun.mp3", streaming=False)
 
+    @property
+    def ideal_objective(self):
+        """
+        Renvoie l'objectif idéal du NPC.
+
+        Returns
+        -------
+        tuple
+            Coordonnées de l'objectif (x, y).
+        """
+        return self.store.ideal_x[self.index], self.store.ideal_y[self.index]
+
+    @property
+    def path_goal(self):
+        """
+        Renvoie l'arrivée de la recherche de chemin locale du NPC.
+
+        Returns
+        -------
+        tuple or None
+            Cellule du monde (x, y), None s'il n'y en a pas.
+        """
+        if not self.store.has_path_goal[self.index]:
+            return None
+        return int(self.store.path_goal_x[self.index]), int(self.store.path_goal_y[self.index])
+
+    @path_goal.setter
+    def path_goal(self, value):
+        """
+        Change l'arrivée de la recherche de chemin locale du NPC.
+
+        Parameters
+        ----------
+        value : tuple or None
+            Cellule du monde (x, y), None pour l'oublier.
+
+        Returns
+        -------
+        None.
+        """
+        self.store.has_path_goal[self.index] = value != None
+        if value != None:
+            self.store.path_goal_x[self.index], self.store.path_goal_y[self.index] = value
+
     def choose_weapon(self):
         """
         Choisis aléatoirement une arme pour le NPC.
@@ -112,26 +406,72 @@ class NpcWalker:
         distances = []
         for city in cities:
             distances.append(np.sqrt((self.x-(city.x*256))**2 + (self.y-(city.y*256))**2))
-        min_city = distances.index(min(distances))
-        return cities[min_city].x*256 + random.uniform(-1, 1)*256, cities[min_city].y*256 + random.uniform(-1, 1)*256
+        min_city = cities[distances.index(min(distances))]
+        # L'objectif est une rue de la ville, jamais l'intérieur d'un bâtiment
+        street_x, street_y = random.choice(worldmap.CITY_STREETS[min_city])
+        return street_x*256 + random.uniform(0, 1)*256, street_y*256 + random.uniform(0, 1)*256
 
-    def check_bullet_hit(self, bullet):
+    def next_waypoint(self, path_service):
         """
-        Vérifie si le NPC a été touché par une balle.
+        Renvoie le prochain point de passage vers l'objectif idéal du NPC.
+
+        Le trajet est demandé au service de calcul de chemin ; en attendant
+        son arrivée, le NPC marche droit vers son objectif idéal. Les points
+        de passage déjà dépassés sont retirés, et le trajet est recalculé si
+        le NPC s'en est trop écarté (détour, poursuite du joueur).
 
         Parameters
         ----------
-        bullet : Bullet
-            Balle tirée.
+        path_service : PathService
+            Service de calcul des trajets à longue distance.
+
+        Returns
+        -------
+        tuple
+            Coordonnées du prochain point de passage (x, y).
+        """
+        cell_x, cell_y = gridaddress.world_cell(self.x, self.y)
+        cell_x, cell_y = int(cell_x), int(cell_y)
+        if self.route == None:
+            goal_x, goal_y = gridaddress.world_cell(*self.ideal_objective)
+            goal_x, goal_y = int(goal_x), int(goal_y)
+            if max(abs(goal_x-cell_x), abs(goal_y-cell_y)) < ROUTE_MIN_DISTANCE:
+                self.route = []
+            else:
+                # Le départ de la demande reste celui du premier appel
+                if self.route_key == None:
+                    self.route_key = ((cell_x, cell_y), (goal_x, goal_y))
+                ready, route = path_service.poll(path_service.submit_route(*self.route_key))
+                if not ready:
+                    return self.ideal_objective
+                self.route = [] if route == None else list(route)
+                self.route_key = None
+        # Un point est dépassé quand le NPC est plus près du suivant que lui
+        while len(self.route) > 0 and (self.route[0] == (cell_x, cell_y) or (len(self.route) > 1 and
+                hpastar.octile(cell_x, cell_y, *self.route[1]) <= hpastar.octile(*self.route[0], *self.route[1]))):
+            self.route.pop(0)
+        if len(self.route) == 0:
+            return self.ideal_objective
+        if max(abs(self.route[0][0]-cell_x), abs(self.route[0][1]-cell_y)) > ROUTE_REPLAN_DISTANCE:
+            self.route = None
+            return self.ideal_objective
+        return self.route[0][0]*gridaddress.CELL_SIZE + gridaddress.CELL_SIZE//2, self.route[0][1]*gridaddress.CELL_SIZE + gridaddress.CELL_SIZE//2
+
+    def hit_by_bullet(self, damage):
+        """
+        Applique les dégâts d'une balle qui a touché le NPC.
+
+        Parameters
+        ----------
+        damage : float
+            Dommage de la balle qui a touché le NPC.
 
         Returns
         -------
         None.
         """
-        if self.x < bullet.pos_x < self.x+32:
-            if self.y < bullet.pos_y < self.y+32:
-                self.health -= bullet.damage
-                self.stress += 1
+        self.health -= damage
+        self.stress += 1
 
     def grid_cos_to_pixel(self, grid_x, grid_y, cam_x, cam_y):
         """
@@ -153,7 +493,7 @@ class NpcWalker:
         tuple
             Coordonnées pixel converties (x, y).
         """
-        return (256*grid_x) + cam_x - (14*256), (256*grid_y) + cam_y - (15*256)
+        return self.grid_address.grid_to_pixel(grid_x, grid_y, cam_x, cam_y)
 
     def pixel_to_grid_cos(self, x, y, cam_x, cam_y):
         """
@@ -175,7 +515,7 @@ class NpcWalker:
         tuple
             Coordonnées de la grille (grid_x, grid_y).
         """
-        return int((x//256) - (cam_x//256)) + 14, int((y//256) - (cam_y//256)) + 15
+        return self.grid_address.pixel_to_grid(x, y, cam_x, cam_y)
 
     def find_grid_side_from_dir(self, x, y, cam_x, cam_y, dir_x, dir_y):
         """
@@ -206,7 +546,7 @@ class NpcWalker:
             pos_x += dir_x
             pos_y += dir_y
             grid_x, grid_y = self.pixel_to_grid_cos(pos_x, pos_y, cam_x, cam_y)
-            if 0 <= grid_x < 30 and 0 <= grid_y < 30:
+            if self.grid_address.inside(grid_x, grid_y):
                 continue
             else:
                 return self.pixel_to_grid_cos(pos_x-dir_x, pos_y-dir_y, cam_x, cam_y)
@@ -230,24 +570,20 @@ class NpcWalker:
         tuple
             Mouvement (mov_x, mov_y).
         """
-        mov_x, mov_y = dir_x, dir_y
-        self.speed_objective = 90
-        if self.stress > 1:
-            self.speed_objective = 180
-        mov_x *= self.speed_objective*delta_t
-        mov_y *= self.speed_objective*delta_t
-        return mov_x, mov_y
+        speed = STRESSED_SPEED if self.stress > 1 else WALK_SPEED
+        return dir_x*speed*delta_t, dir_y*speed*delta_t
 
-    def get_mov_to_point(self, x2, y2, obstacle_map, cam_x, cam_y, delta_t):
+    def get_detour(self, dir_x, dir_y, obstacle_map, cam_x, cam_y, delta_t, flow_field=None, connectivity=None, path_service=None):
         """
-        Obtient le mouvement vers un point donné.
+        Obtient le mouvement d'un NPC dont le chemin direct vers sa
+        destination est bloqué.
 
         Parameters
         ----------
-        x2 : float
-            Coordonnée x de la destination.
-        y2 : float
-            Coordonnée y de la destination.
+        dir_x : float
+            Direction x unitaire vers la destination.
+        dir_y : float
+            Direction y unitaire vers la destination.
         obstacle_map : array
             Carte des obstacles.
         cam_x : float
@@ -256,193 +592,144 @@ class NpcWalker:
             Position y de la caméra.
         delta_t : float
             Temps écoulé depuis la dernière mise à jour.
+        flow_field : FlowField, optional
+            Champ de direction vers la destination, utilisé à la place d'une
+            recherche A* quand le chemin direct est bloqué. The default is None.
+        connectivity : ConnectivityIndex, optional
+            Zones connexes de la carte des obstacles, pour remplacer une
+            destination inatteignable. The default is None.
+        path_service : PathService, optional
+            Service auquel confier la recherche de chemin. En attendant le
+            résultat, le NPC garde sa dernière direction, ou la direction
+            directe s'il n'en a pas encore. The default is None.
 
         Returns
         -------
         tuple
             Mouvement (mov_x, mov_y).
         """
-        dir_x, dir_y = x2-self.x, y2-self.y
-        dir_inten = np.sqrt(dir_x**2+dir_y**2)
-        dir_x, dir_y = dir_x/dir_inten, dir_y/dir_inten
-        mov_x, mov_y = self.get_mov_from_dir(dir_x, dir_y, delta_t)
-        grid_x, grid_y = self.pixel_to_grid_cos(self.x+mov_x, self.y+mov_y, cam_x, cam_y)
-        #print(grid_x, grid_y)
-        if not obstacle_map[grid_x][grid_y]:
-            return mov_x, mov_y
-        grid_x2, grid_y2 = self.find_grid_side_from_dir(self.x, self.y, cam_x, cam_y, dir_x, dir_y)
-        cell0, cell1 = astar.get_last_two_cells(astar.find_path(obstacle_map, grid_x, grid_y, grid_x2, grid_y2))
-        dest_x1, dest_y1 = self.pixel_to_grid_cos(cell0.x, cell0.y, cam_x, cam_y)
-        dest_x2, dest_y2 = self.pixel_to_grid_cos(cell1.x, cell1.y, cam_x, cam_y)
-        dir_x, dir_y = dest_x2-dest_x1, dest_y2
+        start_x, start_y = self.pixel_to_grid_cos(self.x, self.y, cam_x, cam_y)
+        if flow_field != None:
+            dir_x, dir_y = flow_field.direction(start_x, start_y)
+            if dir_x == 0 and dir_y == 0:
+                return 0, 0
+        else:
+            # L'arrivée est gardée en coordonnées du monde tant qu'elle reste
+            # dans la fenêtre, pour que la recherche soit réparée et non refaite
+            origin_x, origin_y = self.grid_address.origin(cam_x, cam_y)
+            if self.path_goal == None or not self.grid_address.world_inside(self.path_goal[0], self.path_goal[1], origin_x, origin_y):
+                grid_x2, grid_y2 = self.find_grid_side_from_dir(self.x, self.y, cam_x, cam_y, dir_x, dir_y)
+                if connectivity != None:
+                    substitute = connectivity.nearest_reachable(start_x, start_y, grid_x2, grid_y2)
+                    if substitute == None:
+                        return 0, 0
+                    grid_x2, grid_y2 = substitute
+                self.path_goal = (grid_x2+origin_x, grid_y2+origin_y)
+            if path_service != None:
+                key = path_service.submit(obstacle_map, origin_x, origin_y, (start_x+origin_x, start_y+origin_y), self.path_goal)
+                ready, path = path_service.poll(key)
+                if ready and path is not None and len(path) >= 2:
+                    self.path_dir = path[1]-path[0]
+                if self.path_dir is not None:
+                    dir_x, dir_y = self.path_dir
+            else:
+                if self.local_planner == None:
+                    self.local_planner = astar.IncrementalPlanner(len(obstacle_map), len(obstacle_map[0]))
+                path = self.local_planner.update(obstacle_map, origin_x, origin_y, start_x+origin_x, start_y+origin_y, self.path_goal[0], self.path_goal[1])
+                if path is None or len(path) < 2:
+                    return 0, 0
+                dir_x, dir_y = path[1]-path[0]
         dir_inten = np.sqrt(dir_x**2+dir_y**2)
         dir_x, dir_y = dir_x/dir_inten, dir_y/dir_inten
         mov_x, mov_y = self.get_mov_from_dir(dir_x, dir_y, delta_t)
         return mov_x, mov_y
 
-    def update_sprite(self, cam_x, cam_y):
-        """
-        Met à jour le sprite du NPC.
-
-        Parameters
-        ----------
-        cam_x : float
-            Position x de la caméra.
-        cam_y : float
-            Position y de la caméra.
 
-        Returns
-        -------
-        None.
-        """
-        self.sprite.rotation = np.degrees(np.arctan2(self.mov_y, self.mov_x)*(-1) + (np.pi/2))
-        self.sprite.set_relative_pos(self.x, self.y, cam_x, cam_y)
-    
-    def get_distance_to_player(self, player_x, player_y):
+class NpcManager:
+    """
+    Classe pour gérer les NPC.
+    """
+    def __init__(self, batch, seed=worldmap.DEFAULT_SEED, baked_world=None, grid_address=gridaddress.DEFAULT_ADDRESS):
         """
-        Obtient la distance jusqu'au joueur.
+        Initialise le gestionnaire de NPC.
 
         Parameters
         ----------
-        player_x : float
-            Position x du joueur.
-        player_y : float
-            Position y du joueur.
+        batch : pyglet.graphics.Batch
+            Groupe de batch pyglet pour l'affichage.
+        seed : int, optional
+            Graine du monde, pour que les trajets longs voient les mêmes
+            obstacles que la carte de tuilage. The default is worldmap.DEFAULT_SEED.
+        baked_world : BakedWorld, optional
+            Occupation précalculée du monde, utilisée par les trajets longs
+            à la place du calcul des blocs. The default is None.
+        grid_address : GridAddress, optional
+            Fenêtre de simulation. The default is gridaddress.DEFAULT_ADDRESS.
 
         Returns
         -------
-        float
-            Distance jusqu'au joueur.
+        None.
         """
-        dist_x = self.x-player_x
-        dist_y = self.y-player_y
-        return np.sqrt(dist_x**2 + dist_y**2)
+        self.batch = batch
+        self.grid_address = grid_address
+        self.store = NpcStore()
+        self.add_npc(0, 0, 100, 0, Weapon(WEAPON_MODELS[0], 0, 0, 0, 0, 0))
+        #self.npcs_cars = []
+        self.scream_sound = pyglet.media.load("snd/scream.mp3", streaming=False)
+        self.scream_player = pyglet.media.Player()
+        if baked_world != None:
+            self.planner = hpastar.HierarchicalPlanner(baked_world.block)
+        else:
+            self.planner = hpastar.HierarchicalPlanner(functools.partial(worldmap.obstacle_block, seed=seed))
+        self.path_service = pathservice.PathService(workers=PATH_WORKERS, planner=self.planner)
 
-    def weapon_update(self, player_x, player_y, delta_t):
+    def close(self):
         """
-        Met à jour l'agissement au niveau des armes du NPC.
-
-        Parameters
-        ----------
-        player_x : float
-            Position x du joueur.
-        player_y : float
-            Position y du joueur.
-        delta_t : float
-            Temps écoulé depuis la dernière mise à jour.
+        Libère les processus du service de calcul de chemin.
 
         Returns
         -------
-        Bullet or None
-            Balle tirée ou None.
+        None.
         """
-        self.last_shot += delta_t
-        self.time_since_load += delta_t
-        if self.weapon == None:
-            return None
-        if self.weapon.loaded <= 0:
-            if self.time_since_load > self.weapon.loadtime:
-                self.weapon.loaded = self.weapon.capacity
-                if self.weapon.loaded > 0:
-                    self.time_since_load = 0
-            return None
-        if self.time_since_load < self.weapon.loadtime:
-            return None
-        if self.last_shot > 1/self.weapon.rate:
-            self.shot_sound.play()
-            self.last_shot = 0
-            self.weapon.loaded -= 1
-            dir_x, dir_y = player_x-self.x, player_y-self.y
-            dir_inten = np.sqrt(dir_x**2+dir_y**2)
-            dir_x, dir_y = dir_x/dir_inten, dir_y/dir_inten
-            return Bullet(self.x, self.y, dir_x, dir_y, self.weapon.reach, self.weapon.damage, self.weapon.accuracy, self.batch)
-        return None
+        self.path_service.close()
 
-    def update(self, player_x, player_y, cam_x, cam_y, obstacle_map, delta_t):
+    @property
+    def npcs(self):
         """
-        Met à jour le NPC.
-
-        Parameters
-        ----------
-        player_x : float
-            Position x du joueur.
-        player_y : float
-            Position y du joueur.
-        cam_x : float
-            Position x de la caméra.
-        cam_y : float
-            Position y de la caméra.
-        obstacle_map : array
-            Carte des obstacles.
-        delta_t : float
-            Temps écoulé depuis la dernière mise à jour.
+        Renvoie la liste des NPC, dans l'ordre des lignes du stockage.
 
         Returns
         -------
-        Bullet or None
-            Balle tirée ou None.
+        list
+            Liste des NpcWalker.
         """
-        if self.health <= 0:
-            self.sprite.image = NPC_MORT_IMAGES[self.chosen_image]
-            self.update_sprite(cam_x, cam_y)
-            return None
-        match(self.npctype):
-            case 1:
-                if self.health < 25 or self.stress == 0:
-                    self.objective = self.ideal_objective
-                else:
-                    if self.get_distance_to_player(player_x, player_y) > 200:
-                        self.objective = (player_x, player_y)
-                    else:
-                        self.objective = self.ideal_objective
-            case 2:
-                if self.health < 25:
-                    self.objective = self.ideal_objective
-                else:
-                    if self.get_distance_to_player(player_x, player_y) > 200:
-                        self.objective = (player_x, player_y)
-                    else:
-                        self.objective = self.ideal_objective
-            case 3:
-                if self.get_distance_to_player(player_x, player_y) > 200:
-                    self.objective = (player_x, player_y)
-                else:
-                    self.objective = self.ideal_objective
-        self.mov_x, self.mov_y = self.get_mov_to_point(self.objective[0], self.objective[1], obstacle_map, cam_x, cam_y, delta_t)
-        self.x += self.mov_x
-        self.y += self.mov_y
-        self.update_sprite(cam_x, cam_y)
-        if self.npctype == 1 and self.stress > 0:
-            return self.weapon_update(player_x, player_y, delta_t)
-        if self.npctype == 2:
-            return self.weapon_update(player_x, player_y, delta_t)
-        return None
+        return self.store.walkers
 
-
-class NpcManager:
-    """
-    Classe pour gérer les NPC.
-    """
-    def __init__(self, batch):
+    def add_npc(self, x, y, health, npctype, weapon=None):
         """
-        Initialise le gestionnaire de NPC.
+        Crée un NPC et l'ajoute au stockage.
 
         Parameters
         ----------
-        batch : pyglet.graphics.Batch
-            Groupe de batch pyglet pour l'affichage.
+        x : float
+            Position horizontale du NPC.
+        y : float
+            Position verticale du NPC.
+        health : int
+            Points de vie du NPC.
+        npctype : int
+            Type du NPC.
+        weapon : Weapon, optional
+            Arme du NPC, choisie selon le type si None. The default is None.
 
         Returns
         -------
-        None.
+        NpcWalker
+            NPC créé.
         """
-        self.batch = batch
-        self.npcs = [NpcWalker(0, 0, 100, 0, Weapon(WEAPON_MODELS[0], 0, 0, 0, 0, 0), False, self.batch)]
-        #self.npcs_cars = []
-        self.scream_sound = pyglet.media.load("snd/scream.mp3", streaming=False)
-        self.scream_player = pyglet.media.Player()
-    
-    def update(self, bullet_manager, item_manager, player_x, player_y, heal_player, cam_x, cam_y, obstacle_map, bullet_list_player, bullet_list_ennemy, delta_t):
+        return NpcWalker(self.store, x, y, health, npctype, weapon, False, self.batch, self.grid_address)
+
+    def update(self, bullet_manager, item_manager, player_x, player_y, heal_player, cam_x, cam_y, obstacle_map, delta_t, connectivity=None):
         """
         Met à jour le gestionnaire de NPC.
 
@@ -462,39 +749,70 @@ class NpcManager:
             Position y de la caméra.
         obstacle_map : array
             Carte des obstacles.
-        bullet_list_player : list
-            Liste des balles du joueur.
-        bullet_list_ennemy : list
-            Liste des balles ennemies.
         delta_t : float
             Temps écoulé depuis la dernière mise à jour.
+        connectivity : ConnectivityIndex, optional
+            Zones connexes de la carte des obstacles. The default is None.
 
         Returns
         -------
         float
             Argent total collecté.
         """
-        new_npcs = []
+        store = self.store
         total_money = 0
-        for npc in self.npcs:
-            grid_x, grid_y = npc.pixel_to_grid_cos(npc.x, npc.y, cam_x, cam_y)
-            if not 0 <= grid_x < 30 or not 0 <= grid_y < 30:
-                continue
-            new_npcs.append(npc)
-            if npc.npctype == 3:
-                total_money += item_manager.check_npc_seller(npc.x, npc.y, npc.health)
-            for bullet in bullet_list_player:
-                npc.check_bullet_hit(bullet)
-                if npc.health <= 0 and not npc.dead:
-                    self.scream_player.queue(self.scream_sound)
-                    self.scream_player.play()
-                    npc.dead = True
-                    heal_player(20)
-                    item_manager.add_item(npc.weapon, npc.x, npc.y)
-                    if npc.npctype == 3:
-                        item_manager.add_item(BulletBox(BULLETS_TYPES[random.randint(0, 2)], random.randint(1, 20)), npc.x, npc.y)
-            bullet = npc.update(player_x, player_y, cam_x, cam_y, obstacle_map, delta_t)
-            if bullet != None:
-                bullet_manager.add_bullet(bullet, False)
-        self.npcs = new_npcs
+        self.path_service.process(len(obstacle_map), len(obstacle_map[0]))
+        grid_x, grid_y = self.grid_address.pixel_to_grid(store.x, store.y, cam_x, cam_y)
+        store.compact(self.grid_address.inside(grid_x, grid_y))
+        for i in np.nonzero(store.npctype == 3)[0]:
+            total_money += item_manager.check_npc_seller(store.x[i], store.y[i], store.health[i])
+        # Les balles sont appliquées par BulletManager.update
+        for i in np.nonzero((store.health <= 0) & ~store.dead)[0]:
+            npc = store.walkers[i]
+            self.scream_player.queue(self.scream_sound)
+            self.scream_player.play()
+            store.dead[i] = True
+            npc.sprite.image = NPC_MORT_IMAGES[npc.chosen_image]
+            heal_player(20)
+            if npc.weapon != None:
+                npc.weapon.loaded = int(store.loaded[i])
+            item_manager.add_item(npc.weapon, store.x[i], store.y[i])
+            if store.npctype[i] == 3:
+                item_manager.add_item(BulletBox(BULLETS_TYPES[random.randint(0, 2)], random.randint(1, 20)), store.x[i], store.y[i])
+        alive = store.health > 0
+        chase = store.choose_objectives(player_x, player_y)
+        target_x = np.where(chase, player_x, store.ideal_x)
+        target_y = np.where(chase, player_y, store.ideal_y)
+        # Les NPC qui vont vers leur objectif idéal suivent le trajet long
+        for i in np.nonzero(alive & ~chase)[0]:
+            target_x[i], target_y[i] = store.walkers[i].next_waypoint(self.path_service)
+        dir_x, dir_y, mov_x, mov_y = store.straight_moves(target_x, target_y, delta_t)
+        grid_x, grid_y = self.grid_address.pixel_to_grid(store.x+mov_x, store.y+mov_y, cam_x, cam_y)
+        inside = self.grid_address.inside(grid_x, grid_y)
+        blocked = np.zeros(len(store), dtype=bool)
+        blocked[inside] = obstacle_map[grid_x[inside], grid_y[inside]] != 0
+        blocked &= alive & ((dir_x != 0) | (dir_y != 0))
+        store.has_path_goal[~blocked] = False
+        # Seuls les NPC dont le chemin direct est bloqué cherchent un détour
+        flow_field = None
+        for i in np.nonzero(blocked)[0]:
+            if chase[i] and flow_field == None:
+                # Un seul champ de direction vers le joueur pour tous les NPC qui le suivent
+                player_grid_x, player_grid_y = self.grid_address.pixel_to_grid(player_x, player_y, cam_x, cam_y)
+                flow_field = astar.FlowField(obstacle_map, player_grid_x, player_grid_y)
+            mov_x[i], mov_y[i] = store.walkers[i].get_detour(
+                dir_x[i], dir_y[i], obstacle_map, cam_x, cam_y, delta_t, flow_field if chase[i] else None, connectivity, self.path_service
+            )
+        store.x[alive] += mov_x[alive]
+        store.y[alive] += mov_y[alive]
+        store.rotation[alive] = np.degrees(np.arctan2(mov_y[alive], mov_x[alive])*(-1) + (np.pi/2))
+        for npc, rotation, x, y in zip(store.walkers, store.rotation.tolist(), store.x.tolist(), store.y.tolist()):
+            npc.sprite.rotation = rotation
+            npc.sprite.set_relative_pos(x, y, cam_x, cam_y)
+        shooters = store.fire_weapons(alive, delta_t)
+        aim_x, aim_y = player_x-store.x[shooters], player_y-store.y[shooters]
+        for i, dir_x, dir_y in zip(shooters, aim_x.tolist(), aim_y.tolist()):
+            npc = store.walkers[i]
+            npc.shot_sound.play()
+            bullet_manager.add_bullet(Bullet(store.x[i], store.y[i], dir_x, dir_y, npc.weapon.reach, npc.weapon.damage, npc.weapon.accuracy, npc.weapon.hitscan), False)
         return total_money
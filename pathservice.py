@@ -0,0 +1,323 @@
+"""
+Module pour le traitement différé des demandes de chemin des NPC.
+
+Les NPC déposent leurs demandes auprès du service, qui les traite dans la
+limite d'un budget de temps par image. Un NPC continue dans sa dernière
+direction connue (la direction directe s'il n'en a pas encore) tant que son
+résultat n'est pas arrivé. Les gros lots de
+demandes peuvent être confiés à des processus séparés.
+
+Les trajets à longue distance sont aussi mis en file. Leurs recherches
+hiérarchiques avancent par morceaux avec le temps qui reste dans le budget de
+l'image, toujours dans le processus du jeu, qui garde en mémoire les blocs
+déjà calculés.
+"""
+
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import astar
+import hpastar
+
+
+PATH_BUDGET = 0.002
+# Nombre de demandes en attente à partir duquel elles partent aux processus
+WORKER_BATCH = 16
+MAX_PLANNERS = 32
+
+
+def solve_requests(requests):
+    """
+    Calcule un lot de chemins, dans un processus séparé.
+
+    Parameters
+    ----------
+    requests : list
+        Liste de (clé, grille, origine x, origine y).
+
+    Returns
+    -------
+    list
+        Liste de (clé, chemin en cases du monde ou None).
+    """
+    results = []
+    for key, grid, origin_x, origin_y in requests:
+        results.append((key, solve(grid, origin_x, origin_y, key)))
+    return results
+
+
+def solve(grid, origin_x, origin_y, key, planner=None):
+    """
+    Calcule un chemin de la fenêtre et le convertit en cases du monde.
+
+    Parameters
+    ----------
+    grid : numpy.ndarray
+        Grille de la fenêtre.
+    origin_x : int
+        Position x dans le monde de la case (0, 0) de la fenêtre.
+    origin_y : int
+        Position y dans le monde de la case (0, 0) de la fenêtre.
+    key : tuple
+        Départ et arrivée ((x1, y1), (x2, y2)) dans le monde.
+    planner : IncrementalPlanner, optional
+        Planificateur à réutiliser, recherche complète si None.
+        The default is None.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Tableau d'entiers (n, 2) des cases du monde du chemin, ou None si
+        aucun chemin n'existe.
+    """
+    (x1, y1), (x2, y2) = key
+    if planner != None:
+        path = planner.update(grid, origin_x, origin_y, x1, y1, x2, y2)
+    else:
+        path = astar.find_path_array(grid, x1-origin_x, y1-origin_y, x2-origin_x, y2-origin_y)
+    if path is None:
+        return None
+    path = path.copy()
+    path[:, 0] += origin_x
+    path[:, 1] += origin_y
+    return path
+
+
+class PathService:
+    """
+    Classe pour gérer la file des demandes de chemin.
+    """
+
+    def __init__(self, budget=PATH_BUDGET, workers=0, planner=None):
+        """
+        Initialise le service de calcul de chemin.
+
+        Parameters
+        ----------
+        budget : float, optional
+            Temps de calcul accordé par image, en secondes.
+            The default is PATH_BUDGET.
+        workers : int, optional
+            Nombre de processus pour les gros lots, 0 pour tout calculer
+            dans le processus du jeu. The default is 0.
+        planner : HierarchicalPlanner, optional
+            Planificateur des trajets à longue distance, nécessaire pour
+            submit_route. The default is None.
+
+        Returns
+        -------
+        None.
+        """
+        self.budget = budget
+        self.frame = 0
+        # Clé -> [grille, origine x, origine y, dernière image demandée]
+        self.pending = OrderedDict()
+        # Clé -> [chemin, image de calcul]
+        self.results = {}
+        self.futures = []
+        # Clés des demandes confiées aux processus et pas encore revenues
+        self.in_flight = set()
+        self.executor = None
+        if workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        # Clé de demande -> planificateur incrémental, le plus récent en dernier
+        self.planners = OrderedDict()
+        self.planner = planner
+        # Clé -> [recherche en cours, dernière image demandée], pour les
+        # trajets à longue distance
+        self.routes = OrderedDict()
+        self.solved = 0
+        self.deduplicated = 0
+
+    def submit(self, grid, origin_x, origin_y, start, goal):
+        """
+        Dépose une demande de chemin. Une demande de même départ et de même
+        arrivée qu'une demande en cours ou déjà résolue n'est pas recalculée.
+
+        Parameters
+        ----------
+        grid : numpy.ndarray
+            Grille de la fenêtre.
+        origin_x : int
+            Position x dans le monde de la case (0, 0) de la fenêtre.
+        origin_y : int
+            Position y dans le monde de la case (0, 0) de la fenêtre.
+        start : tuple
+            Case de départ (x, y) dans le monde.
+        goal : tuple
+            Case d'arrivée (x, y) dans le monde.
+
+        Returns
+        -------
+        tuple
+            Clé de la demande, à passer à poll.
+        """
+        key = (start, goal)
+        if key in self.results:
+            self.deduplicated += 1
+        elif key in self.in_flight:
+            self.deduplicated += 1
+        elif key in self.pending:
+            self.deduplicated += 1
+            self.pending[key][3] = self.frame
+        else:
+            self.pending[key] = [np.array(grid), origin_x, origin_y, self.frame]
+        return key
+
+    def submit_route(self, start, goal):
+        """
+        Dépose une demande de trajet à longue distance. Le départ doit rester
+        le même d'une image à l'autre tant que le résultat n'est pas arrivé.
+
+        Parameters
+        ----------
+        start : tuple
+            Cellule de départ (x, y) dans le monde.
+        goal : tuple
+            Cellule d'arrivée (x, y) dans le monde.
+
+        Returns
+        -------
+        tuple
+            Clé de la demande, à passer à poll.
+        """
+        key = ("route", start, goal)
+        if key in self.results:
+            self.deduplicated += 1
+        elif key in self.routes:
+            self.deduplicated += 1
+            self.routes[key][1] = self.frame
+        else:
+            self.routes[key] = [None, self.frame]
+        return key
+
+    def poll(self, key):
+        """
+        Renvoie le résultat d'une demande s'il est disponible.
+
+        Parameters
+        ----------
+        key : tuple
+            Clé de la demande.
+
+        Returns
+        -------
+        tuple
+            (prêt, chemin) : prêt vaut False tant que le calcul n'est pas
+            fait, le chemin est None si aucun chemin n'existe.
+        """
+        if key in self.results:
+            return True, self.results[key][0]
+        return False, None
+
+    def get_planner(self, key):
+        """
+        Renvoie le planificateur associé à un départ et une arrivée, pour que
+        la même demande renouvelée pendant que la fenêtre défile répare la
+        recherche précédente. Un planificateur n'est pas partagé entre
+        plusieurs départs, qui le forceraient à chercher à chaque fois loin
+        de sa dernière recherche.
+
+        Parameters
+        ----------
+        key : tuple
+            Départ et arrivée ((x1, y1), (x2, y2)) dans le monde.
+
+        Returns
+        -------
+        IncrementalPlanner or None
+            Le planificateur, None s'il faut en créer un.
+        """
+        if key in self.planners:
+            self.planners.move_to_end(key)
+            return self.planners[key]
+        return None
+
+    def process(self, size_x, size_y):
+        """
+        Traite les demandes en attente dans la limite du budget de l'image.
+
+        Parameters
+        ----------
+        size_x : int
+            Nombre de lignes des grilles de fenêtre.
+        size_y : int
+            Nombre de colonnes des grilles de fenêtre.
+
+        Returns
+        -------
+        None.
+        """
+        self.frame += 1
+        # Les résultats restent disponibles pendant une image
+        self.results = {key: value for key, value in self.results.items() if value[1] >= self.frame-1}
+        # Les demandes qui ne sont plus renouvelées sont abandonnées
+        for key in [key for key, value in self.pending.items() if value[3] < self.frame-2]:
+            del self.pending[key]
+        for key in [key for key, value in self.routes.items() if value[1] < self.frame-2]:
+            del self.routes[key]
+        self.collect()
+        end = time.perf_counter() + self.budget
+        if self.executor != None and len(self.pending) >= WORKER_BATCH:
+            batch = [(key, value[0], value[1], value[2]) for key, value in self.pending.items()]
+            self.pending.clear()
+            self.in_flight.update(key for key, _, _, _ in batch)
+            self.futures.append(self.executor.submit(solve_requests, batch))
+        while len(self.pending) > 0:
+            key, (grid, origin_x, origin_y, _) = self.pending.popitem(last=False)
+            planner = self.get_planner(key)
+            if planner == None:
+                planner = astar.IncrementalPlanner(size_x, size_y)
+                self.planners[key] = planner
+                if len(self.planners) > MAX_PLANNERS:
+                    self.planners.popitem(last=False)
+            self.results[key] = [solve(grid, origin_x, origin_y, key, planner), self.frame]
+            self.solved += 1
+            if time.perf_counter() > end:
+                break
+        # Les trajets longs avancent avec le temps restant, d'au moins une
+        # étape par image pour que la file avance
+        while len(self.routes) > 0:
+            key, value = next(iter(self.routes.items()))
+            if value[0] == None:
+                _, (x1, y1), (x2, y2) = key
+                value[0] = hpastar.RouteSearch(self.planner, x1, y1, x2, y2)
+            if not value[0].step(end):
+                break
+            del self.routes[key]
+            self.results[key] = [value[0].path, self.frame]
+            self.solved += 1
+
+    def close(self):
+        """
+        Arrête les processus de calcul et abandonne les lots en attente.
+
+        Returns
+        -------
+        None.
+        """
+        if self.executor != None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+        self.futures = []
+        self.in_flight.clear()
+
+    def collect(self):
+        """
+        Récupère les résultats des lots terminés par les processus.
+
+        Returns
+        -------
+        None.
+        """
+        running = []
+        for future in self.futures:
+            if not future.done():
+                running.append(future)
+                continue
+            for key, path in future.result():
+                self.in_flight.discard(key)
+                self.results[key] = [path, self.frame]
+                self.solved += 1
+        self.futures = running
@@ -7,6 +7,8 @@ import random as r
 import numpy as np
 from worldsprite import WorldSprite
 import os
+import raycast
+import broadphase
 
 
 SENSI = np.pi/2
@@ -17,21 +19,69 @@ FRONT_SPEED_L = 12
 BACK_SPEED_L = 2
 
 
+# Vitesse des balles, en pixels par seconde
+BULLET_SPEED = 1860
+# Temps avant que la traînée de la balle ne quitte le canon, en secondes
+TAIL_DELAY = 0.1
+# Taille des boîtes de collision des PNJ et du joueur, en pixels
+TARGET_SIZE = 32
+# Taille de la boîte de collision de la voiture avec les obstacles, en pixels
+CAR_SIZE = 64
+# Modes des balles : balle simulée, tir instantané pas encore résolu, traînée d'un tir résolu
+BULLET = 0
+HITSCAN = 1
+TRACER = 2
+# Durée d'affichage de la traînée d'un tir instantané, en secondes
+HITSCAN_TRACER_TIME = 0.05
+
+
 class BulletManager:
     """
     Gère les balles tirées par les joueurs et les ennemis.
+
+    Les balles sont rangées dans des tableaux NumPy (une ligne par balle) pour
+    être avancées toutes à la fois. Les balles ajoutées pendant une image sont
+    mises en attente et fusionnées au début de la mise à jour suivante.
     """
 
-    def __init__(self):
+    def __init__(self, tracers=None):
         """
-        Initialise les listes de balles pour le joueur et les ennemis.
+        Initialise les tableaux de balles vides.
+
+        Parameters
+        ----------
+        tracers : TracerRenderer, optional
+            Afficheur des traînées des balles. Si None, les balles ne sont
+            pas affichées. The default is None.
 
         Returns
         -------
         None.
         """
-        self.bullet_list_player = []
-        self.bullet_list_ennemy = []
+        self.pos = np.zeros((0, 2))
+        self.origin = np.zeros((0, 2))
+        self.dir = np.zeros((0, 2))
+        self.alive_time = np.zeros(0)
+        self.destroy_time = np.zeros(0)
+        self.damage = np.zeros(0)
+        # Vrai pour les balles du joueur, faux pour celles des ennemis
+        self.owner = np.zeros(0, dtype=bool)
+        self.mode = np.zeros(0, dtype=np.int8)
+        self.tracers = tracers
+        self.pending = []
+        # Nombre total de tests balle-cible après la grille de cibles
+        self.narrow_tests = 0
+
+    def __len__(self):
+        """
+        Renvoie le nombre de balles en jeu, en attente comprises.
+
+        Returns
+        -------
+        int
+            Nombre de balles.
+        """
+        return len(self.alive_time) + len(self.pending)
 
     def add_bullet(self, bullet, btype):
         """
@@ -48,14 +98,84 @@ class BulletManager:
         -------
         None.
         """
-        if btype:
-            self.bullet_list_player.append(bullet)
-        else:
-            self.bullet_list_ennemy.append(bullet)
+        self.pending.append((bullet, btype))
 
-    def update(self, delta_t, player, obstacles, cam_x, cam_y):
+    def merge_pending(self):
         """
-        Met à jour les balles en jeu.
+        Ajoute aux tableaux les balles en attente.
+
+        Returns
+        -------
+        None.
+        """
+        if len(self.pending) == 0:
+            return
+        bullets = [bullet for bullet, _ in self.pending]
+        pos = np.array([(bullet.pos_x, bullet.pos_y) for bullet in bullets], dtype=np.float64)
+        angle = np.array([bullet.angle for bullet in bullets])
+        self.pos = np.concatenate((self.pos, pos))
+        self.origin = np.concatenate((self.origin, pos))
+        self.dir = np.concatenate((self.dir, np.stack((np.cos(angle), np.sin(angle)), axis=1)))
+        self.alive_time = np.concatenate((self.alive_time, np.zeros(len(bullets))))
+        self.destroy_time = np.concatenate((self.destroy_time, [bullet.reach/BULLET_SPEED for bullet in bullets]))
+        self.damage = np.concatenate((self.damage, [bullet.damage for bullet in bullets]))
+        self.owner = np.concatenate((self.owner, [btype for _, btype in self.pending]))
+        self.mode = np.concatenate((self.mode, [HITSCAN if bullet.hitscan else BULLET for bullet in bullets])).astype(np.int8)
+        self.pending = []
+
+    def collide(self, indices, ends, obstacles, grids):
+        """
+        Cherche le premier obstacle ou la première cible touchés par des
+        balles entre leur position et une position de fin, et applique les
+        dégâts aux cibles touchées.
+
+        Parameters
+        ----------
+        indices : numpy.ndarray
+            Indices des balles à tester.
+        ends : numpy.ndarray
+            Positions de fin des balles, de forme (n, 2).
+        obstacles : TilingMap
+            Carte de tuilage, interrogée pour les collisions.
+        grids : dict
+            Pour chaque propriétaire de balle (True pour le joueur), couple
+            (cibles, TargetGrid des boîtes des cibles).
+
+        Returns
+        -------
+        tuple
+            Paramètre t du point d'arrêt de chaque balle (1 si rien n'est
+            touché) et tableau booléen, vrai pour les balles arrêtées.
+        """
+        starts = self.pos[indices]
+        owners = self.owner[indices]
+        stop_t = np.ones(len(indices))
+        stopped = np.zeros(len(indices), dtype=bool)
+        near = np.zeros(len(indices), dtype=bool)
+        for owner, (_, grid) in grids.items():
+            near[owners == owner] = grid.near(starts[owners == owner], ends[owners == owner])
+        # Seul le parcours de la grille reste balle par balle : une seule traversée
+        # jusqu'à la première cellule occupée, qui ramasse aussi les cibles candidates
+        candidates = []
+        for k, (x1, y1, x2, y2, owner, close) in enumerate(zip(starts[:, 0].tolist(), starts[:, 1].tolist(), ends[:, 0].tolist(), ends[:, 1].tolist(), owners.tolist(), near.tolist())):
+            cell, stop_t[k], found = grids[owner][1].sweep(x1, y1, x2, y2, obstacles.is_cell_blocked, close)
+            stopped[k] = cell != None
+            candidates.append(found)
+        for owner, (targets, grid) in grids.items():
+            selected = np.nonzero(owners == owner)[0]
+            for k, target in grid.hits(starts[selected], ends[selected], stop_t[selected], selected, [candidates[k] for k in selected]):
+                targets[target].hit_by_bullet(self.damage[indices[k]])
+                box = grid.boxes[target]
+                stop_t[k] = raycast.segment_box(starts[k, 0], starts[k, 1], ends[k, 0], ends[k, 1], box[0], box[1], box[2], box[3])
+                stopped[k] = True
+            self.narrow_tests += grid.narrow_tests
+        return stop_t, stopped
+
+    def update(self, delta_t, player, obstacles, cam_x, cam_y, npcs=()):
+        """
+        Met à jour les balles en jeu. Tout le trajet parcouru depuis la
+        dernière mise à jour est testé, pour qu'une balle ne traverse pas un
+        obstacle ou une cible entre deux images.
 
         Parameters
         ----------
@@ -63,43 +183,68 @@ class BulletManager:
             Temps écoulé depuis la dernière mise à jour.
         player : Player
             Instance du joueur.
-        obstacles : dict
-            Dictionnaire contenant les obstacles.
+        obstacles : TilingMap
+            Carte de tuilage, interrogée pour les collisions.
         cam_x : int
             Position x de la caméra.
         cam_y : int
             Position y de la caméra.
+        npcs : list, optional
+            PNJ pouvant être touchés par les balles du joueur.
+            The default is ().
 
         Returns
         -------
         None.
         """
-        bullet_player_to_remove = []
-        bullet_ennemy_to_remove = []
-        for i in range(len(self.bullet_list_player)):
-            if self.bullet_list_player[i].update(delta_t, obstacles, cam_x, cam_y):
-                bullet_player_to_remove.append(i)
-        for i in range(len(self.bullet_list_ennemy)):
-            if self.bullet_list_ennemy[i].update(delta_t, obstacles, cam_x, cam_y):
-                bullet_ennemy_to_remove.append(i)
-            player.check_bullet_hit(self.bullet_list_ennemy[i])
-        new_bullet_list_player = []
-        new_bullet_list_ennemy = []
-        for i in range(len(self.bullet_list_player)):
-            if not i in bullet_player_to_remove:
-                new_bullet_list_player.append(self.bullet_list_player[i])
-        for i in range(len(self.bullet_list_ennemy)):
-            if not i in bullet_ennemy_to_remove:
-                new_bullet_list_ennemy.append(self.bullet_list_ennemy[i])
-        self.bullet_list_player = new_bullet_list_player
-        self.bullet_list_ennemy = new_bullet_list_ennemy
+        self.merge_pending()
+        if len(self.alive_time) == 0:
+            if self.tracers != None:
+                self.tracers.update(self.pos, self.pos, cam_x, cam_y)
+            return
+        alive_npcs = [npc for npc in npcs if npc.health > 0]
+        grids = {
+            True: (alive_npcs, broadphase.TargetGrid([(npc.x, npc.y, TARGET_SIZE, TARGET_SIZE) for npc in alive_npcs])),
+            False: ([player], broadphase.TargetGrid([(player.playerwalker.x, player.playerwalker.y, TARGET_SIZE, TARGET_SIZE)]))
+        }
+        # Les tirs instantanés sont testés sur toute leur portée, les balles sur le trajet de l'image
+        shots = self.mode == HITSCAN
+        step = np.where(shots, self.destroy_time, delta_t)*BULLET_SPEED
+        ends = self.pos + self.dir*step[:, None]
+        indices = np.nonzero(self.mode != TRACER)[0]
+        stop_t, stopped = self.collide(indices, ends[indices], obstacles, grids)
+        # Un tir instantané devient une traînée immobile du canon au point d'impact
+        impacts = self.pos[indices] + (ends[indices]-self.pos[indices])*stop_t[:, None]
+        resolved = shots[indices]
+        self.pos[indices[resolved]] = impacts[resolved]
+        self.dir[shots] = 0
+        self.destroy_time[shots] = HITSCAN_TRACER_TIME
+        self.mode[shots] = TRACER
+        moving = self.mode == BULLET
+        self.pos[moving] = ends[moving]
+        self.alive_time += delta_t
+        tail = self.origin + self.dir*(np.maximum(self.alive_time-TAIL_DELAY, 0)*BULLET_SPEED)[:, None]
+        dead = (self.alive_time >= self.destroy_time) & ~shots
+        dead[indices[stopped & ~resolved]] = True
+        keep = ~dead
+        self.pos = self.pos[keep]
+        self.origin = self.origin[keep]
+        self.dir = self.dir[keep]
+        self.alive_time = self.alive_time[keep]
+        self.destroy_time = self.destroy_time[keep]
+        self.damage = self.damage[keep]
+        self.owner = self.owner[keep]
+        self.mode = self.mode[keep]
+        if self.tracers != None:
+            self.tracers.update(tail[keep], self.pos, cam_x, cam_y)
 
 
 class Bullet:
     """
-    Représente une balle tirée par le joueur.
+    Représente une balle au moment du tir. Elle est ensuite avancée par
+    BulletManager.
     """
-    def __init__(self, pos_x, pos_y, dir_x, dir_y, reach, damage, accuracy, batch):
+    def __init__(self, pos_x, pos_y, dir_x, dir_y, reach, damage, accuracy, hitscan=False):
         """
         Initialise une instance de balle.
 
@@ -119,8 +264,9 @@ class Bullet:
             Dommage infligé par la balle.
         accuracy : float
             Précision de la balle.
-        batch : pyglet.graphics.Batch
-            Groupe de batch pyglet pour l'affichage.
+        hitscan : bool, optional
+            Si vrai, le tir est résolu en entier dès la mise à jour suivante
+            et seule une courte traînée est affichée. The default is False.
 
         Returns
         -------
@@ -128,72 +274,11 @@ class Bullet:
         """
         self.pos_x = pos_x
         self.pos_y = pos_y
-        self.og_x = pos_x
-        self.og_y = pos_y
-        angle = np.arctan2(dir_y, dir_x)
-        self.dir_x = np.cos(angle+np.radians(r.uniform(accuracy, -accuracy)))
-        self.dir_y = np.sin(angle+np.radians(r.uniform(accuracy, -accuracy)))
-        dir_inten = np.sqrt(self.dir_x**2 + self.dir_y**2)
-        self.dir_x /= dir_inten
-        self.dir_y /= dir_inten
-        self.line = pyglet.shapes.Line(0, 0, 100, 100, 1, (255, 255, 255, 200), batch=batch)
-        self.destroy_time = reach/1860
-        self.alive_time = 0.0
+        # Angle du tir, dispersé selon la précision de l'arme
+        self.angle = np.arctan2(dir_y, dir_x) + np.radians(r.uniform(accuracy, -accuracy))
+        self.reach = reach
         self.damage = damage
-
-    def find_x1_y1(self, dt):
-        """
-        Calcule la position de départ de la ligne représentant la balle.
-
-        Parameters
-        ----------
-        dt : float
-            Temps écoulé depuis la dernière mise à jour.
-
-        Returns
-        -------
-        tuple
-            Coordonnées (x, y) de la position de départ de la ligne.
-        """
-        if self.alive_time < 0.1:
-            return self.og_x, self.og_y
-        return self.og_x + self.dir_x*(self.alive_time-0.1)*1860, self.og_y + self.dir_y*(self.alive_time-0.1)*1860
-
-    def update(self, dt, obstacles, cam_x, cam_y):
-        """
-        Met à jour la position de la balle.
-
-        Parameters
-        ----------
-        dt : float
-            Temps écoulé depuis la dernière mise à jour.
-        obstacles : dict
-            Dictionnaire contenant les obstacles.
-        cam_x : int
-            Position x de la caméra.
-        cam_y : int
-            Position y de la caméra.
-
-        Returns
-        -------
-        bool
-            True si la balle doit être détruite, False sinon.
-        """
-        self.alive_time += dt
-        self.pos_x += self.dir_x*dt*1860
-        self.pos_y += self.dir_y*dt*1860
-        self.line.x, self.line.y = self.find_x1_y1(dt)
-        self.line.x2, self.line.y2 = self.pos_x, self.pos_y
-        self.line.x = self.line.x - cam_x
-        self.line.y = self.line.y - cam_y
-        self.line.x2 = self.line.x2 - cam_x
-        self.line.y2 = self.line.y2 - cam_y
-        if self.alive_time >= self.destroy_time:
-            return True
-        for obstacle in obstacles.values():
-            if obstacle.x <= self.line.x2 < obstacle.x+256 and obstacle.y <= self.line.y2 < obstacle.y+256:
-                return True
-        return False
+        self.hitscan = hitscan
 
 
 class WeaponControl:
@@ -277,7 +362,7 @@ class WeaponControl:
                 self.last_shot = 0
                 self.weapon.loaded -= 1
                 self.shot_sound.play()
-                return Bullet(pos_x, pos_y, dir_x, dir_y, self.weapon.reach, self.weapon.damage, self.weapon.accuracy, self.batch)
+                return Bullet(pos_x, pos_y, dir_x, dir_y, self.weapon.reach, self.weapon.damage, self.weapon.accuracy, self.weapon.hitscan)
         return None
 
 
@@ -480,8 +565,8 @@ class PlayerCar:
             Entrées du joueur.
         delta_t : float
             Intervalle de temps depuis la dernière mise à jour.
-        obstacles : dict
-            Dictionnaire des obstacles.
+        obstacles : TilingMap
+            Carte de tuilage, interrogée pour les collisions.
         cam_x : float
             Position x de la caméra.
         cam_y : float
@@ -499,13 +584,7 @@ class PlayerCar:
         self.speed_y += (4/(self.speed_intensity+1))*self.dir_y*accel_intensity
         self.pos_x += self.speed_x
         self.pos_y += self.speed_y
-        spr_x, spr_y = self.pos_x - cam_x, self.pos_y - cam_y
-        touch = False
-        for obstacle in obstacles.values():
-            if obstacle.x <= spr_x < obstacle.x+256 and obstacle.y <= spr_y < obstacle.y+256:
-                touch = True
-                break
-        if touch:
+        if obstacles.is_rect_blocked(self.pos_x-CAR_SIZE/2, self.pos_y-CAR_SIZE/2, CAR_SIZE, CAR_SIZE):
             self.pos_x -= self.speed_x
             self.pos_y -= self.speed_y
             self.speed_x = 0
@@ -552,8 +631,8 @@ class PlayerCar:
             Entrées du joueur.
         delta_t : float
             Intervalle de temps depuis la dernière mise à jour.
-        obstacles : dict
-            Dictionnaire des obstacles.
+        obstacles : TilingMap
+            Carte de tuilage, interrogée pour les collisions.
         cam_x : float
             Position x de la caméra.
         cam_y : float
@@ -703,8 +782,8 @@ class PlayerWalker:
             Entrées du joueur.
         delta_t : float
             Intervalle de temps depuis la dernière mise à jour.
-        obstacles : dict
-            Dictionnaire des obstacles.
+        obstacles : TilingMap
+            Carte de tuilage, interrogée pour les collisions.
         cam_x : float
             Position x de la caméra.
         cam_y : float
@@ -755,13 +834,7 @@ class PlayerWalker:
             self.speed_y *= 3
         self.pos_x += self.speed_x
         self.pos_y += self.speed_y
-        spr_x, spr_y = self.pos_x - cam_x, self.pos_y - cam_y
-        touch = False
-        for obstacle in obstacles.values():
-            if obstacle.x <= spr_x < obstacle.x+256 and obstacle.y <= spr_y < obstacle.y+256:
-                touch = True
-                break
-        if touch:
+        if obstacles.is_rect_blocked(self.pos_x-TARGET_SIZE/2, self.pos_y-TARGET_SIZE/2, TARGET_SIZE, TARGET_SIZE):
             self.pos_x -= self.speed_x
             self.pos_y -= self.speed_y
             self.speed_x = 0
@@ -834,22 +907,20 @@ class Player:
         self.music_folder = "snd/radio-wc"
         self.mplayer = pyglet.media.Player()
 
-    def check_bullet_hit(self, bullet):
+    def hit_by_bullet(self, damage):
         """
-        Vérifie si une balle a touché le joueur.
+        Applique les dégâts d'une balle qui a touché le joueur.
 
         Parameters
         ----------
-        bullet : Bullet
-            Balle à vérifier.
+        damage : float
+            Dommage de la balle qui a touché le joueur.
 
         Returns
         -------
         None.
         """
-        if self.playerwalker.x < bullet.pos_x < self.playerwalker.x+32:
-            if self.playerwalker.y < bullet.pos_y < self.playerwalker.y+32:
-                self.health -= bullet.damage/4
+        self.health -= damage/4
 
     def radio(self):
         """
@@ -897,8 +968,8 @@ class Player:
             Entrées du joueur.
         delta_t : float
             Intervalle de temps depuis la dernière mise à jour.
-        obstacles : dict
-            Dictionnaire des obstacles.
+        obstacles : TilingMap
+            Carte de tuilage, interrogée pour les collisions.
 
         Returns
         -------
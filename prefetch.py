@@ -0,0 +1,104 @@
+"""
+Module pour le calcul à l'avance des blocs du monde dans la direction du
+déplacement.
+
+La position de la caméra est extrapolée à partir de la vitesse de la voiture.
+Les blocs de la fenêtre prévue qui ne sont pas encore en cache sont calculés
+par un fil d'exécution séparé, et les résultats sont ajoutés au cache au début
+de l'image suivante, sur le fil principal.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Nombre d'images d'avance de la position prévue de la caméra
+PREFETCH_FRAMES = 60
+
+
+class ChunkPrefetcher:
+    """
+    Classe pour le calcul à l'avance des blocs du monde.
+    """
+
+    def __init__(self, chunk_cache, window_size, workers=1):
+        """
+        Initialise le calcul à l'avance.
+
+        Parameters
+        ----------
+        chunk_cache : ChunkCache
+            Cache des blocs du monde à remplir.
+        window_size : int
+            Taille de la fenêtre de la carte de tuilage, en cellules.
+        workers : int, optional
+            Nombre de fils d'exécution. The default is 1.
+
+        Returns
+        -------
+        None.
+        """
+        self.chunk_cache = chunk_cache
+        self.window_size = window_size
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # (bloc x, bloc y) -> calcul en cours
+        self.futures = {}
+        self.last_request = None
+        self.prefetched = 0
+
+    def request(self, origin_x, origin_y, speed_x, speed_y):
+        """
+        Lance le calcul des blocs de la fenêtre prévue qui ne sont ni en
+        cache ni déjà en cours de calcul.
+
+        Parameters
+        ----------
+        origin_x : int
+            Position x de la première cellule de la fenêtre actuelle.
+        origin_y : int
+            Position y de la première cellule de la fenêtre actuelle.
+        speed_x : float
+            Vitesse x de la caméra, en pixels par image.
+        speed_y : float
+            Vitesse y de la caméra, en pixels par image.
+
+        Returns
+        -------
+        None.
+        """
+        x = origin_x + int(speed_x*PREFETCH_FRAMES//256)
+        y = origin_y + int(speed_y*PREFETCH_FRAMES//256)
+        if self.last_request == (x, y):
+            return
+        self.last_request = (x, y)
+        size = self.chunk_cache.chunk_size
+        for cx in range(x//size, (x+self.window_size-1)//size+1):
+            for cy in range(y//size, (y+self.window_size-1)//size+1):
+                if (cx, cy) in self.chunk_cache.chunks or (cx, cy) in self.futures:
+                    continue
+                self.futures[(cx, cy)] = self.executor.submit(self.chunk_cache.generate, cx*size, cy*size, size, size)
+
+    def collect(self):
+        """
+        Ajoute au cache les blocs dont le calcul est terminé. À appeler sur le
+        fil principal, entre deux images.
+
+        Returns
+        -------
+        None.
+        """
+        for key in [key for key, future in self.futures.items() if future.done()]:
+            chunk = self.futures.pop(key).result()
+            if key not in self.chunk_cache.chunks:
+                self.chunk_cache.put_chunk(key[0], key[1], chunk)
+                self.prefetched += 1
+
+    def close(self):
+        """
+        Arrête le fil de calcul et abandonne les blocs pas encore commencés.
+
+        Returns
+        -------
+        None.
+        """
+        self.executor.shutdown(cancel_futures=True)
+        self.futures = {}
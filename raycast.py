@@ -0,0 +1,223 @@
+"""
+Module pour le test de collision continu d'un segment avec la grille des
+obstacles et avec des boîtes (PNJ, joueur).
+
+Les cellules traversées par le segment sont parcourues dans l'ordre (méthode
+DDA d'Amanatides et Woo) : le coût ne dépend que de la longueur du segment.
+"""
+
+import numpy as np
+import gridaddress
+
+
+def traverse(x1, y1, x2, y2, cell_size=gridaddress.CELL_SIZE):
+    """
+    Parcourt les cellules traversées par un segment, dans l'ordre.
+
+    Parameters
+    ----------
+    x1 : float
+        Position x du début du segment, en pixels.
+    y1 : float
+        Position y du début du segment, en pixels.
+    x2 : float
+        Position x de la fin du segment, en pixels.
+    y2 : float
+        Position y de la fin du segment, en pixels.
+    cell_size : int, optional
+        Taille d'une cellule, en pixels. The default is gridaddress.CELL_SIZE.
+
+    Yields
+    ------
+    tuple
+        Cellule (x, y) et paramètre t (entre 0 et 1) du point d'entrée du
+        segment dans la cellule.
+    """
+    cell_x, cell_y = int(x1//cell_size), int(y1//cell_size)
+    end_x, end_y = int(x2//cell_size), int(y2//cell_size)
+    dx, dy = x2-x1, y2-y1
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    # Paramètre t du prochain bord de cellule en x et en y, et pas entre deux bords
+    if dx != 0:
+        next_x = ((cell_x + (step_x > 0))*cell_size - x1)/dx
+        delta_x = cell_size/abs(dx)
+    else:
+        next_x, delta_x = float('inf'), float('inf')
+    if dy != 0:
+        next_y = ((cell_y + (step_y > 0))*cell_size - y1)/dy
+        delta_y = cell_size/abs(dy)
+    else:
+        next_y, delta_y = float('inf'), float('inf')
+    t = 0.0
+    yield (cell_x, cell_y), t
+    while (cell_x, cell_y) != (end_x, end_y):
+        if next_x < next_y:
+            t = next_x
+            cell_x += step_x
+            next_x += delta_x
+        else:
+            t = next_y
+            cell_y += step_y
+            next_y += delta_y
+        if t > 1:
+            return
+        yield (cell_x, cell_y), t
+
+
+def segment_box(x1, y1, x2, y2, box_x, box_y, width, height):
+    """
+    Calcule le point d'entrée d'un segment dans une boîte alignée sur les axes.
+
+    Parameters
+    ----------
+    x1 : float
+        Position x du début du segment.
+    y1 : float
+        Position y du début du segment.
+    x2 : float
+        Position x de la fin du segment.
+    y2 : float
+        Position y de la fin du segment.
+    box_x : float
+        Position x du coin inférieur gauche de la boîte.
+    box_y : float
+        Position y du coin inférieur gauche de la boîte.
+    width : float
+        Largeur de la boîte.
+    height : float
+        Hauteur de la boîte.
+
+    Returns
+    -------
+    float or None
+        Paramètre t (entre 0 et 1) du point d'entrée, 0 si le segment
+        commence dans la boîte, None si le segment ne la touche pas.
+    """
+    t_min, t_max = 0.0, 1.0
+    for start, delta, low, high in ((x1, x2-x1, box_x, box_x+width), (y1, y2-y1, box_y, box_y+height)):
+        if delta == 0:
+            if not low < start < high:
+                return None
+            continue
+        t1, t2 = (low-start)/delta, (high-start)/delta
+        if t1 > t2:
+            t1, t2 = t2, t1
+        t_min, t_max = max(t_min, t1), min(t_max, t2)
+        if t_min > t_max:
+            return None
+    return t_min
+
+
+def segments_boxes(x1, y1, x2, y2, boxes):
+    """
+    Calcule le point d'entrée de plusieurs segments dans plusieurs boîtes à
+    la fois. Les segments et les boîtes sont associés selon les règles de
+    diffusion de NumPy : des tableaux de même forme donnent un test par
+    couple, x1[:, None] ... donne tous les couples segment-boîte.
+
+    Parameters
+    ----------
+    x1 : numpy.ndarray
+        Positions x des débuts des segments.
+    y1 : numpy.ndarray
+        Positions y des débuts des segments.
+    x2 : numpy.ndarray
+        Positions x des fins des segments.
+    y2 : numpy.ndarray
+        Positions y des fins des segments.
+    boxes : numpy.ndarray
+        Boîtes (x, y, largeur, hauteur), de forme (..., 4).
+
+    Returns
+    -------
+    numpy.ndarray
+        Paramètres t d'entrée, inf pour les couples sans contact. Mêmes
+        règles que segment_box.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    shape = np.broadcast_shapes(np.shape(x1), boxes.shape[:-1])
+    t_min = np.zeros(shape)
+    t_max = np.ones(shape)
+    miss = np.zeros(shape, dtype=bool)
+    for start, end, low, size in ((x1, x2, boxes[..., 0], boxes[..., 2]), (y1, y2, boxes[..., 1], boxes[..., 3])):
+        start = np.asarray(start, dtype=np.float64)
+        delta = np.asarray(end, dtype=np.float64) - start
+        high = low + size
+        still = delta == 0
+        # Segment parallèle à l'axe : il doit être strictement entre les bords
+        miss |= still & ~((low < start) & (start < high))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t1 = np.where(still, -np.inf, (low-start)/delta)
+            t2 = np.where(still, np.inf, (high-start)/delta)
+        t_min = np.maximum(t_min, np.minimum(t1, t2))
+        t_max = np.minimum(t_max, np.maximum(t1, t2))
+    miss |= t_min > t_max
+    return np.where(miss, np.inf, t_min)
+
+
+def first_blocked(x1, y1, x2, y2, blocked):
+    """
+    Cherche la première cellule occupée traversée par un segment.
+
+    Parameters
+    ----------
+    x1 : float
+        Position x du début du segment.
+    y1 : float
+        Position y du début du segment.
+    x2 : float
+        Position x de la fin du segment.
+    y2 : float
+        Position y de la fin du segment.
+    blocked : function
+        Fonction (cellule x, cellule y) -> bool, vraie pour les cellules
+        occupées.
+
+    Returns
+    -------
+    tuple
+        Cellule et paramètre t de son point d'entrée, (None, 1.0) si aucune
+        cellule occupée n'est traversée.
+    """
+    for cell, t in traverse(x1, y1, x2, y2):
+        if blocked(cell[0], cell[1]):
+            return cell, t
+    return None, 1.0
+
+
+def cast(x1, y1, x2, y2, blocked, boxes=()):
+    """
+    Cherche la première cellule occupée et la première boîte touchées par un
+    segment.
+
+    Parameters
+    ----------
+    x1 : float
+        Position x du début du segment.
+    y1 : float
+        Position y du début du segment.
+    x2 : float
+        Position x de la fin du segment.
+    y2 : float
+        Position y de la fin du segment.
+    blocked : function
+        Fonction (cellule x, cellule y) -> bool, vraie pour les cellules
+        occupées.
+    boxes : list, optional
+        Boîtes (x, y, largeur, hauteur) à tester. The default is ().
+
+    Returns
+    -------
+    tuple
+        (cellule, t de la cellule, indice de la boîte, t de la boîte). La
+        cellule est None si aucune cellule occupée n'est traversée. L'indice
+        est None si aucune boîte n'est touchée avant la cellule occupée.
+    """
+    cell, cell_t = first_blocked(x1, y1, x2, y2, blocked)
+    hit, hit_t = None, cell_t
+    for index, box in enumerate(boxes):
+        t = segment_box(x1, y1, x2, y2, box[0], box[1], box[2], box[3])
+        if t != None and t <= hit_t:
+            hit, hit_t = index, t
+    return cell, cell_t, hit, hit_t
@@ -12,6 +12,10 @@ from player import Player, BulletManager
 from inventory import Inventory, Weapon, WEAPON_MODELS, GroundItemManager
 from hud import Hud
 from npc import NpcManager
+from tracer import TracerRenderer
+import worldmap
+import bakeworld
+import gridaddress
 
 
 class Scene(ABC):
@@ -37,6 +41,16 @@ class Scene(ABC):
         """
         pass
 
+    def close(self):
+        """
+        Libère les ressources de la scène quand elle est quittée.
+
+        Returns
+        -------
+        None.
+        """
+        pass
+
 class TitleScreen(Scene):
     """
     Classe pour représenter l'écran de titre du jeu.
@@ -130,7 +144,7 @@ class MainGameScene(Scene):
     """
     Classe pour représenter la scène principale du jeu.
     """
-    def __init__(self, scale, size_x, size_y, inputo, window, worldgen):
+    def __init__(self, scale, size_x, size_y, inputo, window, worldgen, seed=worldmap.DEFAULT_SEED, window_size=gridaddress.DEFAULT_WINDOW_SIZE):
         """
         Initialise la scène principale du jeu.
 
@@ -148,6 +162,11 @@ class MainGameScene(Scene):
             Fenêtre principale du jeu.
         worldgen : WorldGen
             Générateur de monde pour créer le monde du jeu.
+        seed : int, optional
+            Graine du monde. The default is worldmap.DEFAULT_SEED.
+        window_size : int, optional
+            Taille de la fenêtre de simulation, en cellules.
+            The default is gridaddress.DEFAULT_WINDOW_SIZE.
 
         Returns
         -------
@@ -162,13 +181,16 @@ class MainGameScene(Scene):
         self.sprite_batch = pyglet.graphics.Batch()
         self.cam_x = 0
         self.cam_y = 0
-        self.item_manager = GroundItemManager(self.sprite_batch)
+        self.grid_address = gridaddress.GridAddress(window_size, self._SIZE_X, self._SIZE_Y)
+        self.item_manager = GroundItemManager(self.sprite_batch, self.grid_address)
         self.inventory = Inventory(self._SIZE_X, self._SIZE_Y, self.item_manager)
         self.hud = Hud(self._SIZE_X, self._SIZE_Y, self._window_scale, self.sprite_batch)
-        self.npc_manager = NpcManager(self.sprite_batch)
-        self.tilingmap = TilingMap(self.cam_x, self.cam_y, self._SIZE_X, self._SIZE_Y, self.npc_manager, self.sprite_batch)
+        # Occupation précalculée par bakeworld.py, None si le fichier manque
+        self.baked_world = bakeworld.load_baked_world(bakeworld.BAKE_FILE, seed)
+        self.npc_manager = NpcManager(self.sprite_batch, seed, self.baked_world, self.grid_address)
+        self.tilingmap = TilingMap(self.cam_x, self.cam_y, self._SIZE_X, self._SIZE_Y, self.npc_manager, self.sprite_batch, seed, baked_world=self.baked_world, grid_address=self.grid_address)
         self.player = Player(self.sprite_batch, 100*256, -280*256, self._SIZE_X, self._SIZE_Y, self._window_scale, self.inventory)
-        self.bullet_manager = BulletManager()
+        self.bullet_manager = BulletManager(TracerRenderer(self.sprite_batch))
         self.overlay = pyglet.image.Texture.create(self._SIZE_X, self._SIZE_Y, internalformat=pyglet.gl.GL_RGBA8)
         self.fbo = pyglet.image.Framebuffer()
         self.fbo.attach_texture(self.overlay)
@@ -188,6 +210,18 @@ class MainGameScene(Scene):
 
         #self.inventory.pickup_item()
 
+    def close(self):
+        """
+        Arrête les processus de calcul de chemin des NPC et le fil de
+        préchargement des blocs.
+
+        Returns
+        -------
+        None.
+        """
+        self.npc_manager.close()
+        self.tilingmap.close()
+
     def draw(self):
         """
         Dessine la scène principale du jeu.
@@ -216,23 +250,23 @@ class MainGameScene(Scene):
         """
         self.time_of_day += dt
         self.time_of_day %= 1440
-        bullet = self.player.update(self._inputo, dt, self.tilingmap.sprite_dict)
+        bullet = self.player.update(self._inputo, dt, self.tilingmap)
         if bullet != None:
             self.bullet_manager.add_bullet(bullet, True)
         if self.player.death_time > 4:
             self._window.switch_scene(0)
         self.player.money += self.npc_manager.update(\
             self.bullet_manager, self.item_manager, self.player.playerwalker.pos_x, self.player.playerwalker.pos_y,\
-            self.player.heal, self.cam_x, self.cam_y, self.tilingmap.occupation_grid, self.bullet_manager.bullet_list_player,\
-            self.bullet_manager.bullet_list_ennemy, dt\
+            self.player.heal, self.cam_x, self.cam_y, self.tilingmap.occupation_grid, dt,\
+            self.tilingmap.connectivity\
         )
         self.item_manager.update(self.inventory, self.player.playerwalker.pos_x, self.player.playerwalker.pos_y, self.player.selection, self.cam_x, self.cam_y, dt)
-        self.bullet_manager.update(dt, self.player, self.tilingmap.sprite_dict, self.cam_x, self.cam_y)
+        self.bullet_manager.update(dt, self.player, self.tilingmap, self.cam_x, self.cam_y, self.npc_manager.npcs)
         self.cam_x = self.player.cam_x
         self.cam_y = self.player.cam_y
         self.hud.update(self._inputo, self.player.health, self.player.money, self.time_of_day, self.player.playercar.x, self.player.playercar.y, self.cam_x, self.cam_y)
         self.worldgen.group.update(self.time_of_day, self.cam_x, self.cam_y, self.player.playercar.x, self.player.playercar.y, -np.radians(self.player.playercar.sprite.rotation-90))
-        self.tilingmap.update(self.cam_x, self.cam_y)
+        self.tilingmap.update(self.cam_x, self.cam_y, self.player.playercar.speed_x, self.player.playercar.speed_y)
         if self._inputo.openinv:
             self._inputo.openinv = 0
             self.inventory.active = not self.inventory.active
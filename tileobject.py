@@ -2,16 +2,18 @@
 Module pour la gestion de la carte d'obstacles et le spawn des PNJ.
 """
 
+import functools
 import pyglet
-import random
 import numpy as np
-from worldsprite import WorldSprite
-from npc import NpcWalker
+from worldsprite import SpritePool
 from inventory import Weapon, WEAPON_MODELS
-from city import City, cities
+import astar
+import worldmap
+import chunkcache
+import prefetch
+import gridaddress
 
 
-MAP_SIZE = 30
 OBJECTS = (
     pyglet.image.load("img/house.png"), pyglet.image.load("img/house2.png"), pyglet.image.load("img/house3.png"), pyglet.image.load("img/bldng_g1.png"),
     pyglet.image.load("img/bldng_g2.png"), pyglet.image.load("img/bldng_g3.png"), pyglet.image.load("img/bldng_r1.png"), pyglet.image.load("img/bldng_r2.png"),
@@ -23,7 +25,7 @@ class TilingMap:
     """
     Classe pour gérer la carte de tuilage du jeu.
     """
-    def __init__(self, cam_x, cam_y, size_x, size_y, npc_manager, batch):
+    def __init__(self, cam_x, cam_y, size_x, size_y, npc_manager, batch, seed=worldmap.DEFAULT_SEED, cache_bytes=chunkcache.CHUNK_CACHE_BYTES, baked_world=None, grid_address=gridaddress.DEFAULT_ADDRESS):
         """
         Initialise la carte de tuilage.
 
@@ -41,6 +43,16 @@ class TilingMap:
             Gestionnaire des personnages non-joueurs.
         batch : pyglet.graphics.Batch
             Groupe de batch pyglet pour l'affichage.
+        seed : int, optional
+            Graine du monde. The default is worldmap.DEFAULT_SEED.
+        cache_bytes : int, optional
+            Taille maximale du cache des blocs du monde, en octets.
+            The default is chunkcache.CHUNK_CACHE_BYTES.
+        baked_world : BakedWorld, optional
+            Occupation précalculée du monde, d'où est lue la grille
+            d'occupation. Si None, elle est calculée. The default is None.
+        grid_address : GridAddress, optional
+            Fenêtre de simulation. The default is gridaddress.DEFAULT_ADDRESS.
 
         Returns
         -------
@@ -50,82 +62,263 @@ class TilingMap:
         self.cam_y = cam_y
         self._SIZE_X = size_x
         self._SIZE_Y = size_y
-        self.occupation_grid = np.zeros((MAP_SIZE, MAP_SIZE))
+        self.grid_address = grid_address
+        self.size = grid_address.size
+        self.occupation_grid = np.zeros((self.size, self.size))
+        self.connectivity = astar.ConnectivityIndex(self.occupation_grid)
         self.sprite_dict = {}
+        self.sprite_pool = SpritePool(OBJECTS, batch, size_x, size_y)
         self.npc_spawn = {}
+        # Position dans le monde de la première cellule de la fenêtre
+        self.origin = None
         self.npc_manager = npc_manager
         self.batch = batch
+        self.seed = seed
+        self.chunk_cache = chunkcache.ChunkCache(functools.partial(worldmap.tile_block, seed=seed), max_bytes=cache_bytes)
+        self.prefetcher = prefetch.ChunkPrefetcher(self.chunk_cache, self.size)
+        self.baked_world = baked_world
 
-    def noise_create(self, x, y, threshhold):
+    def exposed_blocks(self, dx, dy, low=0, high=None):
         """
-        Crée un tableau de bruit pour générer la carte des obstacles
-        ainsi que les ennemis
+        Renvoie les rectangles d'un carré de la fenêtre qui n'étaient pas dans
+        ce même carré avant un décalage de la fenêtre.
+
+        Parameters
+        ----------
+        dx : int
+            Décalage x de la fenêtre, en cellules.
+        dy : int
+            Décalage y de la fenêtre, en cellules.
+        low : int, optional
+            Premier indice du carré. The default is 0.
+        high : int, optional
+            Indice suivant le dernier indice du carré, la taille de la fenêtre
+            si None. The default is None.
+
+        Returns
+        -------
+        list
+            Liste de rectangles (i0, i1, j0, j1) de nouvelles cellules, bornes
+            de fin exclues.
+        """
+        if high == None:
+            high = self.size
+        if abs(dx) >= high-low or abs(dy) >= high-low:
+            return [(low, high, low, high)]
+        blocks = []
+        if dx != 0:
+            blocks.append((high-dx, high, low, high) if dx > 0 else (low, low-dx, low, high))
+        if dy != 0:
+            # Les colonnes exposées sans les cellules déjà comptées dans les lignes
+            i0, i1 = (low, high-dx) if dx > 0 else (low-dx, high)
+            blocks.append((i0, i1, high-dy, high) if dy > 0 else (i0, i1, low, low-dy))
+        return blocks
+
+    def exposed_cells(self, dx, dy, low=0, high=None):
+        """
+        Renvoie les cellules d'un carré de la fenêtre qui n'étaient pas dans
+        ce même carré avant un décalage de la fenêtre.
+
+        Parameters
+        ----------
+        dx : int
+            Décalage x de la fenêtre, en cellules.
+        dy : int
+            Décalage y de la fenêtre, en cellules.
+        low : int, optional
+            Premier indice du carré. The default is 0.
+        high : int, optional
+            Indice suivant le dernier indice du carré, la taille de la fenêtre
+            si None. The default is None.
+
+        Returns
+        -------
+        list
+            Liste des indices (i, j) des nouvelles cellules du carré.
+        """
+        return [(i, j) for i0, i1, j0, j1 in self.exposed_blocks(dx, dy, low, high) for i in range(i0, i1) for j in range(j0, j1)]
+
+    def create_block(self, i0, i1, j0, j1, x, y):
+        """
+        Calcule l'occupation d'un rectangle de la fenêtre et crée ses sprites.
+
+        Parameters
+        ----------
+        i0 : int
+            Premier indice x du rectangle dans la fenêtre.
+        i1 : int
+            Indice x suivant le dernier indice x du rectangle.
+        j0 : int
+            Premier indice y du rectangle dans la fenêtre.
+        j1 : int
+            Indice y suivant le dernier indice y du rectangle.
+        x : int
+            Position x de la première cellule de la fenêtre.
+        y : int
+            Position y de la première cellule de la fenêtre.
+
+        Returns
+        -------
+        None.
+        """
+        # Même codage que les bâtiments : l'image est OBJECTS[valeur-1]
+        if self.baked_world != None:
+            # Seules les cellules occupées d'après le fichier sont calculées
+            occupied = np.nonzero(self.baked_world.block(x+i0, y+j0, i1-i0, j1-j0))
+            values = np.zeros((i1-i0, j1-j0), dtype=np.int8)
+            values[occupied] = worldmap.tile_values(occupied[0]+x+i0, occupied[1]+y+j0, self.seed)
+        else:
+            values, _ = self.chunk_cache.block(x+i0, y+j0, i1-i0, j1-j0)
+        self.occupation_grid[i0:i1, j0:j1] = values
+        for i, j in zip(*np.nonzero(values)):
+            self.sprite_dict[(int(i0+i+x), int(j0+j+y))] = self.sprite_pool.acquire(int(values[i][j])-1)
+
+    def spawn_block(self, i0, i1, j0, j1, x, y):
+        """
+        Fait apparaître les PNJ d'un rectangle qui vient d'entrer dans la zone
+        d'apparition de la fenêtre.
+
+        Parameters
+        ----------
+        i0 : int
+            Premier indice x du rectangle dans la fenêtre.
+        i1 : int
+            Indice x suivant le dernier indice x du rectangle.
+        j0 : int
+            Premier indice y du rectangle dans la fenêtre.
+        j1 : int
+            Indice y suivant le dernier indice y du rectangle.
+        x : int
+            Position x de la première cellule de la fenêtre.
+        y : int
+            Position y de la première cellule de la fenêtre.
+
+        Returns
+        -------
+        None.
+        """
+        _, spawns = self.chunk_cache.block(x+i0, y+j0, i1-i0, j1-j0)
+        for i, j in zip(*np.nonzero(spawns != -2)):
+            selected_key = (int(i0+i+x), int(j0+j+y))
+            self.npc_spawn[selected_key] = int(spawns[i][j])
+            if self.npc_spawn[selected_key] != -1:
+                self.npc_manager.add_npc(selected_key[0]*gridaddress.CELL_SIZE, selected_key[1]*gridaddress.CELL_SIZE, 100, self.npc_spawn[selected_key])
+
+    def shift(self, x, y):
+        """
+        Décale la fenêtre pour que sa première cellule soit (x, y). La grille
+        est décalée sur place et seules les cellules exposées sont calculées,
+        les sprites et les points d'apparition des cellules sorties de la
+        fenêtre sont oubliés.
 
         Parameters
         ----------
         x : int
-            Position x de départ.
+            Position x de la nouvelle première cellule de la fenêtre.
         y : int
-            Position y de départ.
-        threshhold : float
-            Seuil de probabilité pour générer des obstacles.
+            Position y de la nouvelle première cellule de la fenêtre.
+
+        Returns
+        -------
+        None.
+        """
+        if self.origin == None:
+            dx, dy = self.size, self.size
+            old_x, old_y = x, y
+        else:
+            old_x, old_y = self.origin
+            dx, dy = x-old_x, y-old_y
+        for i, j in self.exposed_cells(-dx, -dy):
+            sprite = self.sprite_dict.pop((i+old_x, j+old_y), None)
+            if sprite != None:
+                self.sprite_pool.release(sprite)
+        for i, j in self.exposed_cells(-dx, -dy, self.grid_address.spawn_low, self.grid_address.spawn_high):
+            self.npc_spawn.pop((i+old_x, j+old_y), None)
+        size = self.size
+        if abs(dx) < size and abs(dy) < size:
+            self.occupation_grid[max(0, -dx):size-max(0, dx), max(0, -dy):size-max(0, dy)] = \
+                self.occupation_grid[max(0, dx):size-max(0, -dx), max(0, dy):size-max(0, -dy)]
+        self.origin = (x, y)
+        for i0, i1, j0, j1 in self.exposed_blocks(dx, dy):
+            self.create_block(i0, i1, j0, j1, x, y)
+        for i0, i1, j0, j1 in self.exposed_blocks(dx, dy, self.grid_address.spawn_low, self.grid_address.spawn_high):
+            self.spawn_block(i0, i1, j0, j1, x, y)
+
+    def close(self):
+        """
+        Arrête le fil de préchargement des blocs.
+
+        Returns
+        -------
+        None.
+        """
+        self.prefetcher.close()
+
+    def is_blocked(self, x, y):
+        """
+        Indique si un point du monde se trouve dans un obstacle.
+
+        Parameters
+        ----------
+        x : float
+            Position x du point, en pixels.
+        y : float
+            Position y du point, en pixels.
 
         Returns
         -------
-        tuple
-            Un tuple contenant le tableau de bruit, le dictionnaire des sprites
-            et le dictionnaire des points d'apparition des PNJ et de leur type.
-        """
-        pic = np.zeros((MAP_SIZE, MAP_SIZE))
-        new_sprite_dict = {}
-        new_npc_spawn = {}
-        for i in range(MAP_SIZE):
-            for j in range(MAP_SIZE):
-                is_city = False
-                for city in cities:
-                    if city.x <= i+x < city.x+len(city.data[0]) and city.y <= j+y < city.y+len(city.data):
-                        is_city = True
-                        co_x, co_y = city.x-(i+x), city.y-(j+y)
-                        pic[i][j] = city.data[co_y][co_x]
-                        selected_key = (i+x, j+y)
-                        if selected_key in self.sprite_dict.keys():
-                            new_sprite_dict[selected_key] = self.sprite_dict[selected_key]
-                        else:
-                            if pic[i][j] != 0:
-                                new_sprite_dict[selected_key] = WorldSprite(batch=self.batch, img=OBJECTS[int(pic[i][j])-1], x=self._SIZE_X, y=self._SIZE_Y)
-                        if i < 2 or i > 27 or j < 2 or j > 27:
-                            continue
-                        if selected_key in self.npc_spawn.keys():
-                            new_npc_spawn[selected_key] = self.npc_spawn[selected_key]
-                        else:
-                            if random.randint(0, 20) == 0:
-                                new_npc_spawn[selected_key] = random.randint(0, 2)
-                                if random.randint(0, 3) == 0:
-                                    new_npc_spawn[selected_key] = 3
-                                self.npc_manager.npcs.append(NpcWalker((i+x)*256, (j+y)*256, 100, new_npc_spawn[selected_key], None, False, self.batch))
-                            else:
-                                new_npc_spawn[selected_key] = -1
-                if is_city:
-                    continue
-                if random.Random((i+x) + (j+y)*7321).uniform(0, 1) > threshhold:
-                    chosen_obstacle = random.randint(0, 8)
-                    pic[i][j] = chosen_obstacle
-                    selected_key = (i+x, j+y)
-                    if selected_key in self.sprite_dict.keys():
-                        new_sprite_dict[selected_key] = self.sprite_dict[selected_key]
-                    else:
-                        new_sprite_dict[selected_key] = WorldSprite(batch=self.batch, img=OBJECTS[chosen_obstacle], x=self._SIZE_X, y=self._SIZE_Y)
-                    if i < 2 or i > 27 or j < 2 or j > 27:
-                        continue
-                    if selected_key in self.npc_spawn.keys():
-                        new_npc_spawn[selected_key] = self.npc_spawn[selected_key]
-                    else:
-                        if random.randint(0, 9) == 0:
-                            new_npc_spawn[selected_key] = random.randint(0, 2)
-                            self.npc_manager.npcs.append(NpcWalker((i+x)*256, (j+y)*256, 100, new_npc_spawn[selected_key], None, False, self.batch))
-                        else:
-                            new_npc_spawn[selected_key] = -1
-        return pic, new_sprite_dict, new_npc_spawn
+        bool
+            Vrai si la cellule du point contient un obstacle affiché.
+        """
+        return gridaddress.world_cell(x, y) in self.sprite_dict
+
+    def is_cell_blocked(self, cell_x, cell_y):
+        """
+        Indique si une cellule du monde contient un obstacle.
+
+        Parameters
+        ----------
+        cell_x : int
+            Position x de la cellule.
+        cell_y : int
+            Position y de la cellule.
+
+        Returns
+        -------
+        bool
+            Vrai si la cellule contient un obstacle affiché.
+        """
+        return (cell_x, cell_y) in self.sprite_dict
+
+    def is_rect_blocked(self, x, y, width, height):
+        """
+        Indique si un rectangle du monde touche un obstacle.
+
+        Parameters
+        ----------
+        x : float
+            Position x du coin inférieur gauche, en pixels.
+        y : float
+            Position y du coin inférieur gauche, en pixels.
+        width : float
+            Largeur du rectangle, en pixels.
+        height : float
+            Hauteur du rectangle, en pixels.
+
+        Returns
+        -------
+        bool
+            Vrai si une des cellules recouvertes contient un obstacle affiché.
+        """
+        low_x, low_y = gridaddress.world_cell(x, y)
+        # Bornes supérieures exclues : un rectangle qui s'arrête sur le bord
+        # d'une cellule ne la recouvre pas
+        high_x, high_y = gridaddress.world_cell(-(x+width), -(y+height))
+        for cell_x in range(low_x, -high_x):
+            for cell_y in range(low_y, -high_y):
+                if (cell_x, cell_y) in self.sprite_dict:
+                    return True
+        return False
 
     def update_sprites(self):
         """
@@ -136,9 +329,9 @@ class TilingMap:
         None.
         """
         for key, value in self.sprite_dict.items():
-            value.set_relative_pos(key[0]*256, key[1]*256, self.cam_x, self.cam_y)
+            value.set_relative_pos(key[0]*gridaddress.CELL_SIZE, key[1]*gridaddress.CELL_SIZE, self.cam_x, self.cam_y)
 
-    def update(self, cam_x, cam_y):
+    def update(self, cam_x, cam_y, speed_x=0, speed_y=0):
         """
         Met à jour la carte de tuilage en fonction de la position de la caméra.
 
@@ -148,6 +341,11 @@ class TilingMap:
             Position x de la caméra.
         cam_y : float
             Position y de la caméra.
+        speed_x : float, optional
+            Vitesse x de la caméra en pixels par image, pour calculer à
+            l'avance les blocs vers lesquels elle se dirige. The default is 0.
+        speed_y : float, optional
+            Vitesse y de la caméra en pixels par image. The default is 0.
 
         Returns
         -------
@@ -155,6 +353,11 @@ class TilingMap:
         """
         self.cam_x = cam_x
         self.cam_y = cam_y
-        x, y = (self.cam_x//256)-14, (self.cam_y//256)-15
-        self.occupation_grid, self.sprite_dict, self.npc_spawn = self.noise_create(x, y, 0.99)
+        x, y = self.grid_address.origin(self.cam_x, self.cam_y)
+        self.prefetcher.collect()
+        # La fenêtre n'est recalculée que lorsqu'elle change de cellule
+        if self.origin != (x, y):
+            self.shift(x, y)
+            self.connectivity = astar.ConnectivityIndex(self.occupation_grid)
         self.update_sprites()
+        self.prefetcher.request(x, y, speed_x, speed_y)
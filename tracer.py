@@ -0,0 +1,179 @@
+"""
+Module pour l'affichage des traînées des balles.
+
+Toutes les traînées sont des segments d'une seule liste de sommets GL_LINES,
+remplie depuis les tableaux de BulletManager en une seule copie par image et
+dessinée en un seul appel, quel que soit le nombre de balles en vol. La liste
+double de taille quand elle est pleine et est réduite de moitié quand moins
+d'un quart de ses segments servent : elle ne change pas de taille à chaque
+image, et le nombre de segments dessinés reste proportionnel au nombre de
+balles en vol. Les segments inutilisés ont une longueur nulle.
+"""
+
+import pyglet
+from pyglet.gl import *
+import numpy as np
+
+
+vertex_source = """#version 330 core
+    in vec2 position;
+
+    uniform WindowBlock
+    {
+        mat4 projection;
+        mat4 view;
+    } window;
+
+    uniform vec2 cam_coords;
+
+    void main()
+    {
+        gl_Position = window.projection * window.view * vec4(position - cam_coords, 0, 1);
+    }
+"""
+
+fragment_source = """#version 330 core
+    uniform vec4 color;
+    out vec4 fragColor;
+
+    void main()
+    {
+        fragColor = color;
+    }
+"""
+
+TRACER_COLOR = (255, 255, 255, 200)
+# Nombre de segments de la liste de sommets à sa création, et nombre minimal
+TRACER_CAPACITY = 16
+
+
+class TracerGroup(pyglet.graphics.Group):
+    """
+    Groupe de dessin des traînées des balles.
+    """
+    def __init__(self, shaderprogram, color=TRACER_COLOR, order=0, parent=None):
+        """
+        Initialise le groupe de dessin des traînées.
+
+        Parameters
+        ----------
+        shaderprogram : ShaderProgram
+            Programme de shader.
+        color : tuple, optional
+            Couleur RGBA des traînées. The default is TRACER_COLOR.
+        order : int, optional
+            Ordre de dessin du groupe. The default is 0.
+        parent : pyglet.graphics.Group, optional
+            Groupe parent. The default is None.
+
+        Returns
+        -------
+        None.
+        """
+        super().__init__(order, parent)
+        self.program = shaderprogram
+        self.color = color
+        self.cam_x = 0
+        self.cam_y = 0
+
+    def set_state(self):
+        """
+        Configure l'état pour le rendu.
+
+        Returns
+        -------
+        None.
+        """
+        self.program.use()
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        self.program["cam_coords"] = [self.cam_x, self.cam_y]
+        self.program["color"] = [channel/255 for channel in self.color]
+
+    def unset_state(self):
+        """
+        Restaure l'état après le rendu.
+
+        Returns
+        -------
+        None.
+        """
+        glDisable(GL_BLEND)
+        self.program.stop()
+
+
+class TracerRenderer:
+    """
+    Classe pour dessiner les traînées de toutes les balles avec une seule
+    liste de sommets.
+    """
+    def __init__(self, batch, group=None):
+        """
+        Initialise la liste de sommets des traînées.
+
+        Parameters
+        ----------
+        batch : pyglet.graphics.Batch
+            Groupe de batch pyglet pour l'affichage.
+        group : pyglet.graphics.Group, optional
+            Groupe parent du groupe des traînées. The default is None.
+
+        Returns
+        -------
+        None.
+        """
+        program = pyglet.gl.current_context.create_program((vertex_source, 'vertex'), (fragment_source, 'fragment'))
+        self.group = TracerGroup(program, parent=group)
+        self.capacity = TRACER_CAPACITY
+        self.vertex_list = program.vertex_list(self.capacity*2, GL_LINES, batch, self.group, position=('f', (0,)*self.capacity*4))
+        self.count = 0
+
+    def update(self, tails, heads, cam_x, cam_y):
+        """
+        Remplace les traînées affichées par celles des balles en vol.
+
+        Parameters
+        ----------
+        tails : numpy.ndarray
+            Positions des bouts arrière des traînées, en pixels du monde, de
+            forme (n, 2).
+        heads : numpy.ndarray
+            Positions des balles, en pixels du monde, de forme (n, 2).
+        cam_x : float
+            Position x de la caméra.
+        cam_y : float
+            Position y de la caméra.
+
+        Returns
+        -------
+        None.
+        """
+        self.group.cam_x = cam_x
+        self.group.cam_y = cam_y
+        count = len(heads)
+        capacity = self.capacity
+        while capacity < count:
+            capacity *= 2
+        while capacity > TRACER_CAPACITY and count < capacity//4:
+            capacity //= 2
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self.vertex_list.resize(capacity*2)
+            # Le contenu de la liste déplacée n'est pas garanti : elle est réécrite entièrement
+            self.count = capacity
+        vertices = np.zeros((min(max(count, self.count), capacity), 4), dtype=np.float32)
+        vertices[:count, 0:2] = tails
+        vertices[:count, 2:4] = heads
+        # Une seule copie dans le tampon, les segments des balles disparues deviennent nuls
+        np.frombuffer(self.vertex_list.position, dtype=np.float32)[:vertices.size] = vertices.ravel()
+        self.count = count
+
+    def delete(self):
+        """
+        Libère la liste de sommets.
+
+        Returns
+        -------
+        None.
+        """
+        self.vertex_list.delete()
@@ -0,0 +1,376 @@
+"""
+Module pour l'accès aux données du monde (occupation des cellules) en dehors
+de la fenêtre de la carte de tuilage.
+
+Le bruit des obstacles est un hachage de la position de chaque cellule : il
+se calcule pour un bloc entier en une opération NumPy et donne toujours le
+même résultat pour une cellule donnée, quel que soit le bloc demandé. Tout
+ce qui est tiré au hasard pour une cellule (obstacle, type d'obstacle,
+apparition d'un PNJ) ne dépend que de la graine du monde et de la position de
+la cellule.
+"""
+
+import numpy as np
+from city import cities
+
+
+OBSTACLE_THRESHHOLD = 0.99
+# Nombre d'images d'obstacles (hors bâtiments des villes)
+OBSTACLE_TYPES = 9
+DEFAULT_SEED = 0
+# Sels du hachage, pour tirer des valeurs indépendantes d'une même cellule
+SALT_PRESENCE = 0
+SALT_TYPE = 1
+SALT_SPAWN = 2
+SALT_NPC_TYPE = 3
+SALT_NPC_ARMED = 4
+# Probabilités d'apparition d'un PNJ sur une cellule de ville ou d'obstacle
+CITY_SPAWN_RATE = 1/21
+OBSTACLE_SPAWN_RATE = 1/10
+# Probabilité qu'un PNJ apparu en ville soit de type 3
+CITY_TYPE3_RATE = 1/4
+
+
+def build_city_index(cities):
+    """
+    Construit l'index des cellules des villes.
+
+    Parameters
+    ----------
+    cities : tuple
+        Liste des villes.
+
+    Returns
+    -------
+    tuple
+        Le dictionnaire cellule (x, y) -> (ville, identifiant du bâtiment) et
+        le dictionnaire ville -> liste des cellules de rue (sans bâtiment).
+        Si deux villes se recouvrent, la première de la liste l'emporte.
+    """
+    city_cells = {}
+    city_streets = {}
+    for city in cities:
+        city_streets[city] = []
+        for x in range(city.x, city.x+len(city.data[0])):
+            for y in range(city.y, city.y+len(city.data)):
+                if (x, y) in city_cells:
+                    continue
+                city_cells[(x, y)] = (city, city.data[city.y-y][city.x-x])
+                if city_cells[(x, y)][1] == 0:
+                    city_streets[city].append((x, y))
+    return city_cells, city_streets
+
+
+def build_city_blocks(city_cells, cities):
+    """
+    Construit le tableau des bâtiments de chaque ville, indexé comme les
+    blocs du monde.
+
+    Parameters
+    ----------
+    city_cells : dict
+        Index des cellules des villes renvoyé par build_city_index.
+    cities : tuple
+        Liste des villes.
+
+    Returns
+    -------
+    list
+        Liste de (ville, tableau booléen des cellules appartenant à la ville,
+        tableau des identifiants de bâtiment), dans l'ordre des villes.
+    """
+    city_blocks = []
+    for city in cities:
+        owned = np.zeros((len(city.data[0]), len(city.data)), dtype=bool)
+        buildings = np.zeros((len(city.data[0]), len(city.data)), dtype=np.int64)
+        for i in range(owned.shape[0]):
+            for j in range(owned.shape[1]):
+                owner, building = city_cells[(city.x+i, city.y+j)]
+                owned[i][j] = owner is city
+                buildings[i][j] = building
+        city_blocks.append((city, owned, buildings))
+    return city_blocks
+
+
+CITY_CELLS, CITY_STREETS = build_city_index(cities)
+CITY_BLOCKS = build_city_blocks(CITY_CELLS, cities)
+
+
+def city_building(x, y):
+    """
+    Trouve la ville et le bâtiment situés sur une cellule du monde.
+
+    Parameters
+    ----------
+    x : int
+        Position x de la cellule.
+    y : int
+        Position y de la cellule.
+
+    Returns
+    -------
+    tuple or None
+        La ville et l'identifiant du bâtiment (0 si pas de bâtiment),
+        None si la cellule n'appartient à aucune ville.
+    """
+    return CITY_CELLS.get((x, y))
+
+
+def hash_cells(x, y, salt=0, seed=DEFAULT_SEED):
+    """
+    Calcule un hachage 64 bits de positions de cellules (mélange splitmix64).
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Positions x des cellules.
+    y : numpy.ndarray
+        Positions y des cellules.
+    salt : int, optional
+        Sel du hachage. The default is 0.
+    seed : int, optional
+        Graine du monde. The default is DEFAULT_SEED.
+
+    Returns
+    -------
+    numpy.ndarray
+        Hachages des cellules, de type numpy.uint64.
+    """
+    h = np.asarray(x, dtype=np.int64).astype(np.uint64)*np.uint64(0x9E3779B97F4A7C15)
+    h ^= np.asarray(y, dtype=np.int64).astype(np.uint64)*np.uint64(0xC2B2AE3D27D4EB4F)
+    # Le sel et la graine sont mélangés en entiers Python, sans dépassement
+    h ^= np.uint64((salt*0x165667B19E3779F9 ^ seed*0xD6E8FEB86659FD93) & 0xFFFFFFFFFFFFFFFF)
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return h
+
+
+def cell_noise(x, y, size_x, size_y, salt=0, seed=DEFAULT_SEED):
+    """
+    Calcule un bruit uniforme entre 0 et 1 pour un bloc de cellules.
+
+    Parameters
+    ----------
+    x : int
+        Position x de la première cellule du bloc.
+    y : int
+        Position y de la première cellule du bloc.
+    size_x : int
+        Largeur du bloc.
+    size_y : int
+        Hauteur du bloc.
+    salt : int, optional
+        Sel du hachage. The default is 0.
+    seed : int, optional
+        Graine du monde. The default is DEFAULT_SEED.
+
+    Returns
+    -------
+    numpy.ndarray
+        Tableau (size_x, size_y) de flottants dans [0, 1).
+    """
+    grid_x, grid_y = np.meshgrid(np.arange(x, x+size_x), np.arange(y, y+size_y), indexing="ij")
+    return (hash_cells(grid_x, grid_y, salt, seed) >> np.uint64(11)).astype(np.float64) * 2.0**-53
+
+
+def obstacle_noise(x, y, size_x, size_y, threshhold=OBSTACLE_THRESHHOLD, seed=DEFAULT_SEED):
+    """
+    Calcule la présence et le type des obstacles d'un bloc de cellules,
+    sans tenir compte des villes.
+
+    Parameters
+    ----------
+    x : int
+        Position x de la première cellule du bloc.
+    y : int
+        Position y de la première cellule du bloc.
+    size_x : int
+        Largeur du bloc.
+    size_y : int
+        Hauteur du bloc.
+    threshhold : float, optional
+        Seuil de probabilité pour générer des obstacles.
+        The default is OBSTACLE_THRESHHOLD.
+    seed : int, optional
+        Graine du monde. The default is DEFAULT_SEED.
+
+    Returns
+    -------
+    tuple
+        Tableau booléen de présence des obstacles et tableau des types
+        d'obstacle (de 0 à OBSTACLE_TYPES-1), de forme (size_x, size_y).
+    """
+    presence = cell_noise(x, y, size_x, size_y, SALT_PRESENCE, seed) > threshhold
+    grid_x, grid_y = np.meshgrid(np.arange(x, x+size_x), np.arange(y, y+size_y), indexing="ij")
+    types = (hash_cells(grid_x, grid_y, SALT_TYPE, seed) % np.uint64(OBSTACLE_TYPES)).astype(np.int64)
+    return presence, types
+
+
+def city_block(x, y, size_x, size_y):
+    """
+    Calcule les cellules de villes et leurs bâtiments pour un bloc de
+    cellules du monde.
+
+    Parameters
+    ----------
+    x : int
+        Position x de la première cellule du bloc.
+    y : int
+        Position y de la première cellule du bloc.
+    size_x : int
+        Largeur du bloc.
+    size_y : int
+        Hauteur du bloc.
+
+    Returns
+    -------
+    tuple
+        Tableau booléen des cellules appartenant à une ville et tableau des
+        identifiants de bâtiment (0 hors bâtiment), de forme (size_x, size_y).
+    """
+    is_city = np.zeros((size_x, size_y), dtype=bool)
+    buildings = np.zeros((size_x, size_y), dtype=np.int64)
+    for city, owned, city_buildings in CITY_BLOCKS:
+        x0, x1 = max(x, city.x), min(x+size_x, city.x+owned.shape[0])
+        y0, y1 = max(y, city.y), min(y+size_y, city.y+owned.shape[1])
+        if x0 >= x1 or y0 >= y1:
+            continue
+        mask = owned[x0-city.x:x1-city.x, y0-city.y:y1-city.y]
+        is_city[x0-x:x1-x, y0-y:y1-y] |= mask
+        target = buildings[x0-x:x1-x, y0-y:y1-y]
+        target[mask] = city_buildings[x0-city.x:x1-city.x, y0-city.y:y1-city.y][mask]
+    return is_city, buildings
+
+
+def obstacle_block(x, y, size_x, size_y, threshhold=OBSTACLE_THRESHHOLD, seed=DEFAULT_SEED):
+    """
+    Calcule l'occupation d'un bloc de cellules du monde, avec les mêmes
+    règles que la carte de tuilage.
+
+    Parameters
+    ----------
+    x : int
+        Position x de la première cellule du bloc.
+    y : int
+        Position y de la première cellule du bloc.
+    size_x : int
+        Largeur du bloc.
+    size_y : int
+        Hauteur du bloc.
+    threshhold : float, optional
+        Seuil de probabilité pour générer des obstacles.
+        The default is OBSTACLE_THRESHHOLD.
+    seed : int, optional
+        Graine du monde. The default is DEFAULT_SEED.
+
+    Returns
+    -------
+    numpy.ndarray
+        Tableau booléen (size_x, size_y), vrai pour les cellules occupées.
+    """
+    is_city, buildings = city_block(x, y, size_x, size_y)
+    presence, _ = obstacle_noise(x, y, size_x, size_y, threshhold, seed)
+    return np.where(is_city, buildings != 0, presence)
+
+
+def tile_values(x, y, seed=DEFAULT_SEED):
+    """
+    Calcule, pour des cellules occupées du monde, la valeur que leur donne
+    tile_block, sans calculer le reste de leur bloc.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Positions x des cellules occupées.
+    y : numpy.ndarray
+        Positions y des cellules occupées.
+    seed : int, optional
+        Graine du monde. The default is DEFAULT_SEED.
+
+    Returns
+    -------
+    numpy.ndarray
+        Indice de l'image plus un de chaque cellule, de type numpy.int8.
+    """
+    values = (hash_cells(x, y, SALT_TYPE, seed) % np.uint64(OBSTACLE_TYPES)).astype(np.int8) + 1
+    for k, cell in enumerate(zip(np.asarray(x).tolist(), np.asarray(y).tolist())):
+        found = CITY_CELLS.get(cell)
+        if found != None:
+            values[k] = found[1]
+    return values
+
+
+def spawn_block(x, y, size_x, size_y, threshhold=OBSTACLE_THRESHHOLD, seed=DEFAULT_SEED):
+    """
+    Décide de l'apparition des PNJ sur un bloc de cellules du monde. Les PNJ
+    n'apparaissent que sur les cellules des villes et sur les obstacles.
+
+    Parameters
+    ----------
+    x : int
+        Position x de la première cellule du bloc.
+    y : int
+        Position y de la première cellule du bloc.
+    size_x : int
+        Largeur du bloc.
+    size_y : int
+        Hauteur du bloc.
+    threshhold : float, optional
+        Seuil de probabilité pour générer des obstacles.
+        The default is OBSTACLE_THRESHHOLD.
+    seed : int, optional
+        Graine du monde. The default is DEFAULT_SEED.
+
+    Returns
+    -------
+    numpy.ndarray
+        Tableau d'entiers (size_x, size_y) : type du PNJ qui apparaît, -1 sur
+        une cellule de ville ou d'obstacle sans PNJ, -2 sur les autres cellules.
+    """
+    is_city, _ = city_block(x, y, size_x, size_y)
+    presence, _ = obstacle_noise(x, y, size_x, size_y, threshhold, seed)
+    roll = cell_noise(x, y, size_x, size_y, SALT_SPAWN, seed)
+    types = (cell_noise(x, y, size_x, size_y, SALT_NPC_TYPE, seed)*3).astype(np.int64)
+    types[is_city & (cell_noise(x, y, size_x, size_y, SALT_NPC_ARMED, seed) < CITY_TYPE3_RATE)] = 3
+    spawns = np.full((size_x, size_y), -2, dtype=np.int64)
+    spawns[is_city | presence] = -1
+    spawned = np.where(is_city, roll < CITY_SPAWN_RATE, presence & (roll < OBSTACLE_SPAWN_RATE))
+    spawns[spawned] = types[spawned]
+    return spawns
+
+
+def tile_block(x, y, size_x, size_y, threshhold=OBSTACLE_THRESHHOLD, seed=DEFAULT_SEED):
+    """
+    Calcule le contenu d'un bloc de cellules du monde tel que l'affiche la
+    carte de tuilage.
+
+    Parameters
+    ----------
+    x : int
+        Position x de la première cellule du bloc.
+    y : int
+        Position y de la première cellule du bloc.
+    size_x : int
+        Largeur du bloc.
+    size_y : int
+        Hauteur du bloc.
+    threshhold : float, optional
+        Seuil de probabilité pour générer des obstacles.
+        The default is OBSTACLE_THRESHHOLD.
+    seed : int, optional
+        Graine du monde. The default is DEFAULT_SEED.
+
+    Returns
+    -------
+    tuple
+        Tableau des valeurs des cellules (0 si libre, sinon indice de l'image
+        plus un, même codage pour les bâtiments et les obstacles) et tableau
+        des apparitions de PNJ renvoyé par spawn_block, de type numpy.int8.
+    """
+    is_city, buildings = city_block(x, y, size_x, size_y)
+    presence, types = obstacle_noise(x, y, size_x, size_y, threshhold, seed)
+    values = np.where(is_city, buildings, np.where(presence, types+1, 0)).astype(np.int8)
+    return values, spawn_block(x, y, size_x, size_y, threshhold, seed).astype(np.int8)
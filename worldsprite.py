@@ -30,3 +30,82 @@ class WorldSprite(pyglet.sprite.Sprite):
         """
         self.x = x - cam_x
         self.y = y - cam_y
+
+
+class SpritePool:
+    """
+    Classe pour réutiliser les sprites du monde, avec une réserve par image.
+    Les sprites rendus à la réserve sont cachés au lieu d'être supprimés,
+    puis réaffichés pour une autre position.
+    """
+    def __init__(self, images, batch, x=0, y=0):
+        """
+        Initialise des réserves vides.
+
+        Parameters
+        ----------
+        images : tuple
+            Images des sprites, une réserve par image.
+        batch : pyglet.graphics.Batch
+            Groupe de batch pyglet pour l'affichage.
+        x : float, optional
+            Position x des nouveaux sprites. The default is 0.
+        y : float, optional
+            Position y des nouveaux sprites. The default is 0.
+
+        Returns
+        -------
+        None.
+        """
+        self.images = images
+        self.batch = batch
+        self.x = x
+        self.y = y
+        self.pools = [[] for _ in images]
+        self.live = 0
+        self.pooled = 0
+        self.total = 0
+
+    def acquire(self, index):
+        """
+        Renvoie un sprite visible de l'image demandée, pris dans la réserve
+        ou créé si la réserve est vide.
+
+        Parameters
+        ----------
+        index : int
+            Indice de l'image.
+
+        Returns
+        -------
+        WorldSprite
+            Le sprite.
+        """
+        if len(self.pools[index]) > 0:
+            sprite = self.pools[index].pop()
+            sprite.visible = True
+            self.pooled -= 1
+        else:
+            sprite = WorldSprite(batch=self.batch, img=self.images[index], x=self.x, y=self.y)
+            sprite.pool_index = index
+            self.total += 1
+        self.live += 1
+        return sprite
+
+    def release(self, sprite):
+        """
+        Cache un sprite et le rend à la réserve de son image.
+
+        Parameters
+        ----------
+        sprite : WorldSprite
+            Sprite obtenu par acquire.
+
+        Returns
+        -------
+        None.
+        """
+        sprite.visible = False
+        self.pools[sprite.pool_index].append(sprite)
+        self.live -= 1
+        self.pooled += 1